@@ -0,0 +1,290 @@
+"""
+Admission control for CodementorX Chatbot
+Bounds concurrent upstream calls per worker with an AIMD-adjusted limit and
+a bounded wait queue, shedding load early with 503 + Retry-After. Waiters
+are queued per user and dispatched by weighted fair queueing (fair_queue.py)
+"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Hashable, Optional
+
+from decouple import config
+
+import metrics
+from fair_queue import FairQueue, Flow, parse_role_settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot get an upstream slot in time"""
+
+    def __init__(self, reason: str, retry_after: int):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Service overloaded ({reason}), retry after {retry_after}s")
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """Upstream signals that should shrink the concurrency limit: 429, 5xx, timeouts"""
+    import openai  # Loaded by then (the service's client); kept off the import path
+    from resilience import UpstreamError
+
+    if isinstance(error, UpstreamError):
+        return error.overload
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and (status_code == 429 or status_code >= 500)
+
+
+class Slot:
+    """An acquired upstream slot; release() is idempotent"""
+
+    def __init__(self, controller: "AdmissionController", flow: Flow):
+        self.controller = controller
+        self.flow = flow
+        self.started = time.monotonic()
+        self.latency: Optional[float] = None
+        self.released = False
+
+    def mark_ready(self) -> None:
+        """Record upstream latency now (e.g. when a stream has opened)"""
+        self.latency = time.monotonic() - self.started
+
+    def release(self, error: Optional[BaseException] = None) -> None:
+        if self.released:
+            return
+        self.released = True
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            # Cancelled calls (and streams closed early) say nothing about upstream health
+            self.controller._release_slot(self.flow)
+            return
+        latency = self.latency if self.latency is not None else time.monotonic() - self.started
+        self.controller.release(latency, error, self.flow)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a per-user weighted fair wait queue
+
+    The limit grows additively (about +1 per limit's worth of fast,
+    successful calls) and shrinks multiplicatively on 429/5xx/timeouts or
+    when the latency EWMA exceeds the target, at most once per cooldown.
+    Waiters past the queue bound (overall or per user) or their deadline
+    are rejected.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 64,
+        max_user_queue: int = 16,
+        queue_timeout: float = 10.0,
+        latency_target: float = 30.0,
+        backoff: float = 0.7,
+        cooldown: float = 2.0,
+        fair_queue: Optional[FairQueue] = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_user_queue = max_user_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiters = fair_queue if fair_queue is not None else FairQueue()
+        self._last_decrease = 0.0
+        self._latency_ewma: Optional[float] = None
+
+        self.admitted = 0
+        self.coalesced = 0
+        self.queued = 0
+        self.rejected = 0
+        self.capped = 0
+        self.timeouts = 0
+        self.overload_errors = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    async def acquire(
+        self,
+        user: Hashable = None,
+        role: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Slot:
+        """
+        Wait for a slot for a call on behalf of `user` (with `role`'s weight
+        and in-flight cap); raises AdmissionRejected when the queue is full
+        or the wait times out
+        """
+        flow = self._waiters.flow(user, role)
+        if self._in_flight < self.limit and flow.has_capacity():
+            # Free slots imply no queued request could start: take one
+            self._waiters.admit(flow)
+            self._in_flight += 1
+            self.admitted += 1
+            metrics.ADMISSION_WAIT.labels(flow.role).observe(0.0)
+            return Slot(self, flow)
+
+        if not flow.has_capacity():
+            self.capped += 1
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            self._waiters.discard(flow)
+            raise AdmissionRejected("queue full", self.retry_after())
+        if len(flow.waiters) >= self.max_user_queue:
+            self.rejected += 1
+            self._waiters.discard(flow)
+            raise AdmissionRejected("too many queued requests for this user", self.retry_after())
+
+        queued = time.monotonic()
+        waiter = self._waiters.push(flow)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout or self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot as the wait timed out
+                self._release_slot(flow)
+            self.timeouts += 1
+            raise AdmissionRejected("queue timeout", self.retry_after())
+        except asyncio.CancelledError:
+            # A slot handed over just as the caller was cancelled goes back
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot(flow)
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                # Also forgets the flow once it is idle
+                self._waiters.remove(flow, waiter)
+        self.admitted += 1
+        metrics.ADMISSION_WAIT.labels(flow.role).observe(time.monotonic() - queued)
+        return Slot(self, flow)
+
+    def charge_coalesced(self, user: Hashable = None) -> None:
+        """
+        Charge `user` a nominal share (fair_queue.FOLLOWER_COST) for a request
+        that joined another's in-flight upstream call instead of taking a slot
+        """
+        self.coalesced += 1
+        self._waiters.charge(user)
+
+    def release(
+        self, latency: float, error: Optional[BaseException] = None, flow: Optional[Flow] = None
+    ) -> None:
+        """Return a slot and feed the call outcome into the limit"""
+        if error is None:
+            self._observe_latency(latency)
+            if self._latency_ewma > self.latency_target:
+                self._decrease("latency")
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+        elif is_overload_error(error):
+            self.overload_errors += 1
+            self._decrease(type(error).__name__)
+        self._release_slot(flow)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user: Hashable = None,
+        role: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[Slot]:
+        """Hold a slot for the duration of an upstream call"""
+        slot = await self.acquire(user, role, timeout)
+        try:
+            yield slot
+        except BaseException as e:
+            slot.release(e)
+            raise
+        else:
+            slot.release()
+
+    def retry_after(self) -> int:
+        """Seconds until queued work is expected to drain"""
+        latency = self._latency_ewma or 1.0
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / self.limit))
+
+    def _observe_latency(self, latency: float) -> None:
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma += 0.2 * (latency - self._latency_ewma)
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self._limit = max(float(self.min_limit), self._limit * self.backoff)
+        self.decreases += 1
+        logger.warning(f"Upstream concurrency limit reduced to {self.limit} ({reason})")
+
+    def _release_slot(self, flow: Optional[Flow] = None) -> None:
+        self._in_flight -= 1
+        if flow is not None:
+            self._waiters.release(flow)
+        # Hand freed slots to waiters in weighted fair order
+        while self._in_flight < self.limit and self._waiters.pop() is not None:
+            self._in_flight += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "coalesced": self.coalesced,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "capped": self.capped,
+            "timeouts": self.timeouts,
+            "overload_errors": self.overload_errors,
+            "limit_decreases": self.decreases,
+            "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma else None,
+            "fair_queue": self._waiters.stats(),
+        }
+
+
+def build_admission_controller() -> Optional[AdmissionController]:
+    """Create the admission controller from environment configuration"""
+    if not config("ADMISSION_ENABLED", default=True, cast=bool):
+        return None
+
+    controller = AdmissionController(
+        initial_limit=config("ADMISSION_INITIAL_LIMIT", default=16, cast=int),
+        min_limit=config("ADMISSION_MIN_LIMIT", default=1, cast=int),
+        max_limit=config("ADMISSION_MAX_LIMIT", default=64, cast=int),
+        max_queue=config("ADMISSION_MAX_QUEUE", default=64, cast=int),
+        max_user_queue=config("ADMISSION_USER_MAX_QUEUE", default=16, cast=int),
+        queue_timeout=config("ADMISSION_QUEUE_TIMEOUT", default=10.0, cast=float),
+        latency_target=config("ADMISSION_LATENCY_TARGET", default=30.0, cast=float),
+        fair_queue=FairQueue(
+            weights=parse_role_settings(
+                config("ADMISSION_ROLE_WEIGHTS", default="user=1,moderator=2,admin=4,background=0.5")
+            ),
+            max_in_flight=parse_role_settings(
+                config("ADMISSION_ROLE_MAX_IN_FLIGHT", default="user=4,moderator=8,admin=16,background=2")
+            ),
+        ),
+    )
+    logger.info(
+        f"Admission control: limit={controller.limit}, max_queue={controller.max_queue}"
+    )
+    return controller
@@ -0,0 +1,83 @@
+"""
+Authentication overhead benchmark
+
+Per-request cost of bearer token verification:
+  before  - two uncached verifications (router and handler dependencies),
+            each logging at INFO, as the service did previously
+  after   - one verification per request served from the verified-token
+            cache (steady state for a session), plus the cold first request
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_auth.py
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt  # noqa: E402
+
+from utils import TokenVerifier  # noqa: E402
+import utils  # noqa: E402
+
+SECRET_KEY = "bench-secret"
+
+
+def make_token() -> str:
+    return jwt.encode(
+        {
+            "user_id": 42,
+            "email": "bench@example.com",
+            "username": "bench",
+            "role": "user",
+            "token_type": "access",
+            "exp": int(time.time()) + 3600,
+        },
+        SECRET_KEY,
+        algorithm="HS256",
+    )
+
+
+def report(name: str, elapsed: float, requests: int) -> None:
+    print(f"{name:<40} {elapsed / requests * 1e6:8.2f} us/request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Authentication overhead benchmark")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Log records are formatted and written, as with the service's basicConfig
+    logging.basicConfig(
+        level=logging.INFO,
+        stream=open(os.devnull, "w"),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    token = make_token()
+    verifier = TokenVerifier(SECRET_KEY)
+    n = args.requests
+
+    start = time.perf_counter()
+    for _ in range(n):
+        for _ in range(2):
+            user_info, _, _ = verifier.decode(token)
+            utils.logger.info(f"JWT token verified for user {user_info.user_id}")
+    report("before: 2x uncached verify + INFO log", time.perf_counter() - start, n)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        verifier.decode(token)
+    report("after, cold: 1x uncached verify", time.perf_counter() - start, n)
+
+    verifier.verify(token)
+    start = time.perf_counter()
+    for _ in range(n):
+        verifier.verify(token)
+    report("after, warm: 1x cached verify", time.perf_counter() - start, n)
+
+
+if __name__ == "__main__":
+    main()
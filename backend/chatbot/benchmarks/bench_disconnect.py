@@ -0,0 +1,292 @@
+"""
+Client disconnect benchmark (its fake provider is also used by
+tests/test_disconnect.py)
+
+Starts the service (one uvicorn worker) against a local fake model
+provider that answers slowly: completions after --completion-seconds,
+streams one chunk every --chunk-interval. Clients then give up part way
+(a request timeout, like the frontend's axios timeout, or closing an
+event stream after a few deltas), one call per user, and the fake
+provider reports how long after the client left the service dropped the
+upstream connection and how many chunks it had generated. Finally it checks that no upstream
+slot is still held and prints the cancellation metrics
+(chatbot_upstream_cancelled, chatbot_upstream_cancelled_tokens).
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_disconnect.py
+    python benchmarks/bench_disconnect.py --requests 20 --client-timeout 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+import jwt
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = "bench-secret"
+COMPLETION_TOKENS = 200
+
+
+def completion(model: str) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "token " * COMPLETION_TOKENS},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 50, "completion_tokens": COMPLETION_TOKENS, "total_tokens": 250},
+    }).encode()
+
+
+def chunk(model: str, delta: Dict, usage: Dict = None) -> bytes:
+    event = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": None}] if delta else [],
+    }
+    if usage:
+        event["usage"] = usage
+    data = f"data: {json.dumps(event)}\n\n".encode()
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+
+class FakeUpstream:
+    """
+    Slow model provider recording, per call, when the caller closed the
+    connection and how many stream chunks had been sent by then
+    """
+
+    def __init__(self, completion_seconds: float, chunk_interval: float):
+        self.completion_seconds = completion_seconds
+        self.chunk_interval = chunk_interval
+        self.calls: List[Dict] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # Connections warmed up at startup and closed unused
+            writer.close()
+            return
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        body = json.loads(await reader.readexactly(length)) if length else {}
+        call = {
+            "message": body["messages"][-1]["content"] if body.get("messages") else "",
+            "stream": bool(body.get("stream")),
+            "closed": None,
+            "chunks": 0,
+        }
+        self.calls.append(call)
+
+        async def closed_by_peer() -> None:
+            # One call per connection: anything but EOF is unexpected
+            await reader.read()
+            call["closed"] = time.monotonic()
+
+        watcher = asyncio.create_task(closed_by_peer())
+        respond = asyncio.create_task(self.respond(body, writer, call))
+        await asyncio.wait({watcher, respond}, return_when=asyncio.FIRST_COMPLETED)
+        respond.cancel()
+        watcher.cancel()
+        writer.close()
+
+    async def respond(self, body: Dict, writer: asyncio.StreamWriter, call: Dict) -> None:
+        model = body.get("model", "gpt-4o-mini")
+        if not call["stream"]:
+            await asyncio.sleep(self.completion_seconds)
+            payload = completion(model)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload
+            )
+            await writer.drain()
+            return
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        for _ in range(COMPLETION_TOKENS):
+            await asyncio.sleep(self.chunk_interval)
+            writer.write(chunk(model, {"content": "token "}))
+            await writer.drain()
+            call["chunks"] += 1
+        usage = {"prompt_tokens": 50, "completion_tokens": COMPLETION_TOKENS, "total_tokens": 250}
+        writer.write(chunk(model, {}, usage))
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):x}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        await writer.drain()
+
+
+def auth_headers(user_id: int) -> Dict[str, str]:
+    token = jwt.encode(
+        {"user_id": user_id, "token_type": "access", "exp": int(time.time()) + 3600},
+        SECRET_KEY, algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def service_headers() -> Dict[str, str]:
+    """Service token for /internal/stats and /metrics"""
+    token = jwt.encode(
+        {"token_type": "service", "service": "bench", "exp": int(time.time()) + 3600},
+        SECRET_KEY, algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def start_service(port: int, upstream_port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "JWT_SECRET_KEY": SECRET_KEY,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1",
+        "CHAT_DATABASE_URL": "",
+        "REVOCATION_SYNC_ENABLED": "False",
+        "RATE_LIMIT_CHAT": "100000000/minute",
+        # Each call reaches the provider once: no retries, hedges or cache hits
+        "UPSTREAM_MAX_ATTEMPTS": "1",
+        "UPSTREAM_HEDGING_ENABLED": "False",
+        "RESPONSE_CACHE_ENABLED": "False",
+        "LOG_LEVEL": "WARNING",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=CHATBOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient) -> None:
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("service did not come up")
+        await asyncio.sleep(0.1)
+
+
+async def abandon_completion(
+    client: httpx.AsyncClient, headers: Dict, n: int, timeout: float
+) -> Tuple[str, float]:
+    """Send a message and give up after `timeout`; returns it and when the client left"""
+    message = f"disconnect question {n}"
+    try:
+        await client.post(
+            "/api/chat/message", json={"message": message, "use_cache": False},
+            headers=headers, timeout=timeout,
+        )
+    except httpx.TimeoutException:
+        pass
+    return message, time.monotonic()
+
+
+async def abandon_stream(
+    client: httpx.AsyncClient, headers: Dict, n: int, deltas: int
+) -> Tuple[str, float]:
+    """Stream a message and close the stream after `deltas` delta events"""
+    message = f"disconnect stream {n}"
+    body = {"message": message, "use_cache": False}
+    seen = 0
+    async with client.stream("POST", "/api/chat/message/stream", json=body, headers=headers) as response:
+        async for line in response.aiter_lines():
+            if line == "event: delta":
+                seen += 1
+                if seen >= deltas:
+                    break
+    return message, time.monotonic()
+
+
+def report(label: str, calls: List[Dict], left: List[Tuple[str, float]], chunked: bool) -> None:
+    left_at = dict(left)
+    delays = [call["closed"] - left_at[call["message"]] for call in calls if call["closed"]]
+    still_open = sum(1 for call in calls if not call["closed"])
+    chunks = f"{statistics.mean(call['chunks'] for call in calls):>7.1f}" if chunked else f"{'-':>7}"
+    print(
+        f"{label:<11} {len(calls):>6} {still_open:>10}"
+        f" {statistics.median(delays) * 1000 if delays else float('nan'):>12.1f}"
+        f" {max(delays) * 1000 if delays else float('nan'):>12.1f} {chunks}"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    upstream = FakeUpstream(args.completion_seconds, args.chunk_interval)
+    server = await asyncio.start_server(upstream.handle, "127.0.0.1", args.upstream_port)
+    service = start_service(args.port, args.upstream_port)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60) as client:
+            await wait_ready(client)
+            # One completed call of each kind, so tokens saved can be estimated
+            headers = auth_headers(args.requests + 1)
+            await client.post("/api/chat/message", json={"message": "warm up", "use_cache": False}, headers=headers)
+            await abandon_stream(client, headers, 0, COMPLETION_TOKENS + 1)
+            upstream.calls.clear()
+
+            print(
+                f"provider: completions take {args.completion_seconds:.1f}s, streams send "
+                f"{COMPLETION_TOKENS} chunks {args.chunk_interval * 1000:.0f}ms apart\n"
+            )
+            print(f"{'call':<11} {'calls':>6} {'still open':>10} {'close p50 ms':>12} "
+                  f"{'close max ms':>12} {'chunks':>7}")
+
+            left = await asyncio.gather(*(
+                abandon_completion(client, auth_headers(n + 1), n, args.client_timeout)
+                for n in range(args.requests)
+            ))
+            await asyncio.sleep(0.5)
+            report("completion", upstream.calls, left, chunked=False)
+            upstream.calls.clear()
+
+            left = await asyncio.gather(*(
+                abandon_stream(client, auth_headers(n + 1), n, args.deltas) for n in range(args.requests)
+            ))
+            await asyncio.sleep(0.5)
+            report("stream", upstream.calls, left, chunked=True)
+
+            stats = (await client.get("/internal/stats", headers=service_headers())).json()
+            admission = stats.get("admission") or {}
+            print(f"\nupstream slots in flight after the clients left: {admission.get('in_flight', 'n/a')}")
+            metrics = (await client.get("/metrics", headers=service_headers())).text
+            for line in metrics.splitlines():
+                if line.startswith(("chatbot_upstream_cancelled_total", "chatbot_upstream_cancelled_tokens_total")):
+                    print(line)
+    finally:
+        service.send_signal(signal.SIGTERM)
+        await asyncio.get_running_loop().run_in_executor(None, service.wait)
+        server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=10, help="abandoned calls of each kind")
+    parser.add_argument("--client-timeout", type=float, default=1.0,
+                        help="seconds before a client gives up on a completion")
+    parser.add_argument("--deltas", type=int, default=5, help="deltas read before closing a stream")
+    parser.add_argument("--completion-seconds", type=float, default=10.0)
+    parser.add_argument("--chunk-interval", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=8703)
+    parser.add_argument("--upstream-port", type=int, default=8704)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
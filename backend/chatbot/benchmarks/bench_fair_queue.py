@@ -0,0 +1,162 @@
+"""
+Fair-share scheduling simulation
+
+Drives the admission controller (a fixed limit of upstream slots) with
+skewed synthetic load and simulated upstream calls (exponential service
+times, no network). Three classes of users share the worker:
+  heavy        - a few users each keeping many requests outstanding
+                 (scripts, tabs left streaming), retrying when rejected
+  interactive  - many users each sending a request now and then
+  admin        - a couple of admins sending requests now and then
+and it reports, per class, requests served, rejections, share of upstream
+time and p50/p99 latency (slot wait plus call), for:
+  fifo  - one shared FIFO queue (the admission controller before fair
+          queueing: every request in the same flow, no per-user cap)
+  fair  - per-user weighted fair queueing with role weights and per-user
+          in-flight caps (ADMISSION_ROLE_WEIGHTS, ADMISSION_ROLE_MAX_IN_FLIGHT)
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_fair_queue.py
+    python benchmarks/bench_fair_queue.py --duration 20 --slots 16 --heavy-concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, AdmissionRejected  # noqa: E402
+from fair_queue import FairQueue, parse_role_settings  # noqa: E402
+
+CLASSES = ("heavy", "interactive", "admin")
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class Simulation:
+    def __init__(self, args, fair: bool):
+        self.args = args
+        self.fair = fair
+        self.controller = AdmissionController(
+            initial_limit=args.slots,
+            min_limit=args.slots,
+            max_limit=args.slots,
+            max_queue=args.max_queue,
+            max_user_queue=args.max_user_queue if fair else args.max_queue,
+            queue_timeout=args.queue_timeout,
+            # Fixed limit: isolate scheduling from the AIMD adjustment
+            latency_target=float("inf"),
+            fair_queue=FairQueue(
+                weights=parse_role_settings(args.weights),
+                max_in_flight=parse_role_settings(args.max_in_flight),
+            ) if fair else FairQueue(),
+        )
+        self.latencies = defaultdict(list)
+        self.rejected = defaultdict(int)
+        self.busy = defaultdict(float)
+        self.deadline = 0.0
+
+    async def request(self, user_class: str, user_id: int, role: str) -> bool:
+        """One request through admission and a simulated upstream call; False when rejected"""
+        start = time.perf_counter()
+        try:
+            if self.fair:
+                slot = await self.controller.acquire(user_id, role)
+            else:
+                slot = await self.controller.acquire()
+        except AdmissionRejected:
+            self.rejected[user_class] += 1
+            return False
+        service = random.expovariate(1.0 / self.args.service_ms) / 1000
+        try:
+            await asyncio.sleep(service)
+        finally:
+            slot.release()
+        self.busy[user_class] += service
+        self.latencies[user_class].append(time.perf_counter() - start)
+        return True
+
+    async def heavy_user(self, user_id: int) -> None:
+        async def worker():
+            while time.perf_counter() < self.deadline:
+                if not await self.request("heavy", user_id, "user"):
+                    await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker() for _ in range(self.args.heavy_concurrency)))
+
+    async def occasional_user(self, user_class: str, user_id: int, role: str) -> None:
+        """Poisson arrivals; requests don't wait for each other (several tabs)"""
+        pending = []
+        while True:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if time.perf_counter() >= self.deadline:
+                break
+            pending.append(asyncio.create_task(self.request(user_class, user_id, role)))
+        await asyncio.gather(*pending)
+
+    async def run(self) -> None:
+        self.deadline = time.perf_counter() + self.args.duration
+        users = [self.heavy_user(1000 + i) for i in range(self.args.heavy_users)]
+        users += [
+            self.occasional_user("interactive", 2000 + i, "user")
+            for i in range(self.args.interactive_users)
+        ]
+        users += [self.occasional_user("admin", 3000 + i, "admin") for i in range(self.args.admins)]
+        await asyncio.gather(*users)
+
+
+def report(label: str, simulation: Simulation) -> None:
+    total_busy = sum(simulation.busy.values()) or 1.0
+    for user_class in CLASSES:
+        latencies = simulation.latencies[user_class]
+        print(
+            f"{label:<5} {user_class:<12} {len(latencies):>7} {simulation.rejected[user_class]:>9}"
+            f" {simulation.busy[user_class] / total_busy * 100:>7.1f}%"
+            f" {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--service-ms", type=float, default=50.0, help="Mean upstream call time")
+    parser.add_argument("--heavy-users", type=int, default=2)
+    parser.add_argument("--heavy-concurrency", type=int, default=32)
+    parser.add_argument("--interactive-users", type=int, default=20)
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=1.0, help="Requests per second per occasional user")
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--max-user-queue", type=int, default=16)
+    parser.add_argument("--queue-timeout", type=float, default=10.0)
+    parser.add_argument("--weights", default="user=1,moderator=2,admin=4")
+    parser.add_argument("--max-in-flight", default="user=4,moderator=8,admin=16")
+    args = parser.parse_args()
+
+    capacity = args.slots / (args.service_ms / 1000)
+    offered = (args.interactive_users + args.admins) * args.rate
+    print(
+        f"{args.slots} slots x {args.service_ms:.0f}ms = {capacity:.0f} req/s; occasional users offer "
+        f"{offered:.0f} req/s, {args.heavy_users} heavy users keep "
+        f"{args.heavy_concurrency} requests each outstanding\n"
+    )
+    print(f"{'queue':<5} {'class':<12} {'served':>7} {'rejected':>9} {'upstream':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, fair in (("fifo", False), ("fair", True)):
+        random.seed(1)
+        simulation = Simulation(args, fair)
+        asyncio.run(simulation.run())
+        report(label, simulation)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Logging overhead per request benchmark
+
+Emits the log lines of one chat request (request line, JWT debug line,
+response line) and reports the time spent on the calling thread (the event
+loop's, in the service) per request, for:
+  sync      - the previous setup: logging.basicConfig stream handler and
+              f-string messages, written on the calling thread
+  queue     - logging_config: lazy %-style messages queued to the
+              background listener (LOG_FORMAT, JSON by default)
+  sampled   - the same with 10% of requests sampled (LOG_SAMPLE_RATES)
+Output goes to /dev/null. "drain" is the time the listener needs to write
+out what is still queued afterwards; "all threads" adds it, which on a
+single core is the total CPU per request (the listener takes turns with the
+caller for the GIL while it runs).
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_logging.py
+    python benchmarks/bench_logging.py --requests 50000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_config  # noqa: E402
+from utils import log_request  # noqa: E402
+
+logger = logging.getLogger("bench")
+
+
+def reset_root() -> logging.Logger:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    return root
+
+
+def sync_request(user_id: int, conversation_id: str) -> None:
+    """The log calls a request made before logging_config"""
+    log_data = {
+        "method": "POST",
+        "url": "/chat/message",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "user_id": user_id,
+    }
+    logger.info(f"API Request: {log_data}")
+    logger.debug(f"JWT token verified for user {user_id}")
+    logger.info(f"Generated response for user {user_id} in conversation {conversation_id}")
+    logger.info(f"Generated response for user {user_id}")
+
+
+def queued_request(user_id: int, conversation_id: str) -> None:
+    log_request("POST", "/chat/message", user_id)
+    logger.debug("JWT token verified for user %s", user_id)
+    logger.info("Generated response for user %s in conversation %s", user_id, conversation_id)
+
+
+def run(label: str, emit, requests: int, sample_rate: float = 1.0) -> float:
+    conversation_id = "0b7f1c2e-5d1a-4c7e-9a51-3f0d2b6e8c44"
+    start = time.perf_counter()
+    for i in range(requests):
+        token = logging_config._sampled.set(sample_rate >= 1.0 or i % int(1 / sample_rate) == 0)
+        emit(i, conversation_id)
+        logging_config._sampled.reset(token)
+    return (time.perf_counter() - start) / requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, "w")
+    print(f"{'setup':<9} {'us/request':>11} {'drain ms':>9} {'all threads us':>15}")
+
+    root = reset_root()
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter(logging_config.TEXT_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    per_request = run("sync", sync_request, args.requests)
+    print(f"{'sync':<9} {per_request * 1e6:>11.2f} {0:>9.1f} {per_request * 1e6:>15.2f}")
+
+    for label, rate in (("queue", 1.0), ("sampled", 0.1)):
+        reset_root()
+        os.environ["LOG_QUEUE_SIZE"] = str(args.requests * 4)
+        pipeline = logging_config.configure_logging()
+        pipeline.listener.handlers[0].setStream(devnull)
+        per_request = run(label, queued_request, args.requests, rate)
+        start = time.perf_counter()
+        pipeline.stop()
+        drain = time.perf_counter() - start
+        total = per_request + drain / args.requests
+        print(f"{label:<9} {per_request * 1e6:>11.2f} {drain * 1000:>9.1f} {total * 1e6:>15.2f}"
+              + (f"  ({pipeline.handler.dropped} dropped)" if pipeline.handler.dropped else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Metrics recording cost benchmark
+
+Times what one chat request records (request latency, in-flight gauge,
+upstream latency, tokens, cache lookups) in a fresh interpreter, in
+single-process mode and in multiprocess mode (memory-mapped files, as under
+gunicorn), and the cost of rendering /metrics.
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --iterations 200000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """
+import json, sys, time
+import metrics
+
+iterations = int(sys.argv[1])
+usage = {"prompt_tokens": 50, "completion_tokens": 60}
+latency = metrics.REQUEST_LATENCY.labels("POST", "/api/chat/message", "200")
+
+start = time.perf_counter()
+for _ in range(iterations):
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    metrics.record_cache_lookup("exact", False)
+    metrics.observe_upstream("gpt-4o-mini", 0.8)
+    metrics.record_tokens("gpt-4o-mini", usage)
+    metrics.REQUESTS_IN_FLIGHT.dec()
+    latency.observe(0.9)
+per_request = (time.perf_counter() - start) / iterations
+
+start = time.perf_counter()
+size = len(metrics.render_metrics())
+render = time.perf_counter() - start
+print(json.dumps({"per_request_us": per_request * 1e6, "render_ms": render * 1000, "bytes": size}))
+"""
+
+
+def sample(iterations: int, multiproc_dir: str = "") -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "PROMETHEUS_MULTIPROC_DIR"}
+    if multiproc_dir:
+        env["PROMETHEUS_MULTIPROC_DIR"] = multiproc_dir
+    output = subprocess.run(
+        [sys.executable, "-c", SAMPLE, str(iterations)],
+        cwd=CHATBOT_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'mode':<14} {'us/request':>11} {'render ms':>10} {'bytes':>8}")
+    with tempfile.TemporaryDirectory() as multiproc_dir:
+        for mode, directory in (("single", ""), ("multiprocess", multiproc_dir)):
+            result = sample(args.iterations, directory)
+            print(f"{mode:<14} {result['per_request_us']:>11.2f} "
+                  f"{result['render_ms']:>10.2f} {result['bytes']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Rate limiter overhead benchmark
+
+Measures the cost of one rate limit check for the in-process token bucket
+(sync and through the async RateLimiter used by the routes) and, with
+--url, for the shared sliding window backend.
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_rate_limit.py
+    python benchmarks/bench_rate_limit.py --users 100000 --url redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_limit import RateLimiter, SlidingWindowLimiter, TokenBucketLimiter  # noqa: E402
+
+
+def report(name: str, elapsed: float, checks: int) -> None:
+    print(f"{name:<34} {elapsed / checks * 1e6:8.3f} us/check  ({checks} checks)")
+
+
+def bench_take(users: int, checks: int) -> None:
+    limiter = TokenBucketLimiter(max_keys=users)
+    keys = [f"chat:{i}" for i in range(users)]
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.take(keys[i % users], 30, 60)
+    report("token bucket take()", time.perf_counter() - start, checks)
+
+
+async def bench_check(backend, name: str, users: int, checks: int) -> None:
+    limiter = RateLimiter(backend, {"chat": (30, 60)})
+    start = time.perf_counter()
+    for i in range(checks):
+        await limiter.check(i % users, "chat")
+    report(name, time.perf_counter() - start, checks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--url", default="", help="aiocache URL for the shared backend")
+    args = parser.parse_args()
+
+    bench_take(args.users, args.checks)
+    asyncio.run(bench_check(
+        TokenBucketLimiter(max_keys=args.users), "RateLimiter.check() (local)", args.users, args.checks
+    ))
+    if args.url:
+        asyncio.run(bench_check(
+            SlidingWindowLimiter(args.url), "RateLimiter.check() (shared)",
+            args.users, max(1, args.checks // 20),
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Worker cold start benchmark
+
+Runs each sample in a fresh interpreter, as a new worker would:
+  import  - `import main` (what test collection and the reload
+            supervisor pay; needs no secrets)
+  ready   - import plus the application lifespan startup (clients, caches,
+            connection warm-up), with the per-phase startup report
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_startup.py
+    JWT_SECRET_KEY=x OPENAI_API_KEY=x python benchmarks/bench_startup.py --ready
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SAMPLE = """
+import json, time
+start = time.perf_counter()
+import main
+print(json.dumps({"total_ms": (time.perf_counter() - start) * 1000}))
+"""
+
+READY_SAMPLE = """
+import asyncio, json, logging, time
+start = time.perf_counter()
+import main
+logging.disable(logging.CRITICAL)
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        return (time.perf_counter() - start) * 1000
+
+total = asyncio.run(run())
+print(json.dumps({"total_ms": total, **main.startup.stats()}))
+"""
+
+
+def sample(code: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=CHATBOT_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ready", action="store_true", help="also run the lifespan startup")
+    args = parser.parse_args()
+
+    results = [sample(READY_SAMPLE if args.ready else IMPORT_SAMPLE) for _ in range(args.runs)]
+    totals = [r["total_ms"] for r in results]
+    label = "import + lifespan startup" if args.ready else "import main"
+    print(f"{label:<28} median {statistics.median(totals):7.1f} ms  "
+          f"min {min(totals):7.1f} ms  ({args.runs} runs)")
+
+    if args.ready:
+        last = results[-1]
+        for section in ("imports_ms", "phases_ms"):
+            print(f"  {section}: {last[section]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Multi-worker throughput benchmark
+
+Starts the service under gunicorn (gunicorn.conf.py) with 1, 2, 4 and 8
+uvicorn workers against a local fake model provider, drives chat requests
+at a fixed concurrency for a while, and reports throughput and latency.
+Rate limits run through the shared state (limit set high enough not to
+reject), so its cost is included.
+
+Usage (from backend/chatbot):
+    python benchmarks/bench_workers.py
+    python benchmarks/bench_workers.py --workers 1 4 --concurrency 128 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+import jwt
+
+CHATBOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = "bench-secret"
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "Benchmark reply. " * 20},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 50, "completion_tokens": 60, "total_tokens": 110},
+}).encode()
+
+
+async def fake_upstream(port: int, latency: float) -> None:
+    """Minimal keep-alive HTTP server answering every request with a completion"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":")[1])
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(COMPLETION)).encode() + b"\r\n\r\n" + COMPLETION
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+def start_service(workers: int, port: int, upstream_port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "FASTAPI_HOST": "127.0.0.1",
+        "FASTAPI_PORT": str(port),
+        "JWT_SECRET_KEY": SECRET_KEY,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1",
+        "CHAT_DATABASE_URL": "",
+        "REVOCATION_SYNC_ENABLED": "False",
+        "RATE_LIMIT_CHAT": "100000000/minute",
+        "GUNICORN_LOG_LEVEL": "warning",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=CHATBOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, workers: int) -> None:
+    """Wait until requests have been answered by every worker"""
+    service_token = jwt.encode(
+        {"token_type": "service", "service": "bench", "exp": int(time.time()) + 3600},
+        SECRET_KEY, algorithm="HS256",
+    )
+    headers = {"Authorization": f"Bearer {service_token}", "Connection": "close"}
+    pids = set()
+    deadline = time.monotonic() + 60
+    while len(pids) < workers:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"only {len(pids)}/{workers} workers came up")
+        try:
+            # A new connection each time, so the kernel can hand it to any worker
+            response = await client.get("/internal/stats", headers=headers)
+            pids.add(response.json()["shared_state"]["pid"])
+        except (httpx.HTTPError, KeyError, ValueError):
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def drive(base_url: str, workers: int, concurrency: int, duration: float) -> dict:
+    token = jwt.encode(
+        {"user_id": 1, "token_type": "access", "exp": int(time.time()) + 3600},
+        SECRET_KEY, algorithm="HS256",
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await wait_ready(client, workers)
+        stop = time.monotonic() + duration
+        counter = 0
+
+        async def user() -> None:
+            nonlocal errors, counter
+            while time.monotonic() < stop:
+                counter += 1
+                body = {"message": f"benchmark question {counter}", "use_cache": False}
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/chat/message", json=body, headers=headers)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    upstream = asyncio.create_task(fake_upstream(args.upstream_port, args.upstream_latency))
+    print(f"{os.cpu_count()} CPU(s), concurrency {args.concurrency}, {args.duration}s per run, "
+          f"upstream latency {args.upstream_latency * 1000:.0f}ms")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for workers in args.workers:
+        service = start_service(workers, args.port, args.upstream_port)
+        try:
+            result = await drive(
+                f"http://127.0.0.1:{args.port}", workers, args.concurrency, args.duration
+            )
+        finally:
+            service.send_signal(signal.SIGTERM)
+            await asyncio.get_running_loop().run_in_executor(None, service.wait)
+        print(f"{workers:>7} {result['rps']:>9.1f} {result['p50']:>9.1f} "
+              f"{result['p99']:>9.1f} {result['errors']:>7}")
+    upstream.cancel()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--upstream-port", type=int, default=8702)
+    parser.add_argument("--upstream-latency", type=float, default=0.05,
+                        help="seconds the fake model provider takes per request")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
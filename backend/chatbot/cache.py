@@ -0,0 +1,215 @@
+"""
+Response cache for CodementorX Chatbot
+Exact-match cache of chat completions keyed on a canonical request hash
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """
+    Build a canonical hash for a completion request
+    `messages` is the exact prompt sent upstream (system prompt, trailing
+    context and the current message), so equal keys mean equal prompts
+    """
+    canonical = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": round(float(temperature), 4),
+            "max_tokens": int(max_tokens),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LocalCacheBackend:
+    """In-process LRU cache with per-entry TTL"""
+
+    name = "local"
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SharedCacheBackend:
+    """Cache in the node's shared state, visible to every worker process"""
+
+    name = "shared"
+
+    def __init__(self, state, ttl: int = 3600, namespace: str = "chat_response"):
+        self.state = state
+        self.ttl = ttl
+        self.namespace = namespace
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.state.cache_get(f"{self.namespace}:{key}")
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        # Size bounds are enforced by the shared state's pruning
+        self.state.cache_set(f"{self.namespace}:{key}", value, self.ttl)
+
+    async def clear(self) -> None:
+        self.state.cache_clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ttl": self.ttl}
+
+
+class AiocacheBackend:
+    """Shared cache backend (Redis/Memcached) built on aiocache"""
+
+    name = "aiocache"
+
+    def __init__(self, url: str, ttl: int = 3600, namespace: str = "chat_response"):
+        from aiocache import Cache
+        from aiocache.serializers import JsonSerializer
+
+        self.url = url
+        self.ttl = ttl
+        self._cache = Cache.from_url(url)
+        self._cache.serializer = JsonSerializer()
+        self._cache.namespace = namespace
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self._cache.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        # Size bounds are enforced by the server's eviction policy
+        await self._cache.set(key, value, ttl=self.ttl)
+
+    async def clear(self) -> None:
+        await self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"url": self.url.split("@")[-1], "ttl": self.ttl}
+
+
+class ResponseCache:
+    """Exact-match completion cache with hit/miss accounting"""
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached completion for `key`, or None on miss"""
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            # A broken shared cache must never fail the chat request
+            self.errors += 1
+            logger.warning(f"Response cache lookup failed: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a completion under `key`"""
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Response cache store failed: {e}")
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def build_response_cache(shared_state=None) -> ResponseCache:
+    """
+    Create the response cache from environment configuration
+    RESPONSE_CACHE_URL selects a shared cache; otherwise entries live in the
+    node's shared state when there is one, else in this process
+    """
+    enabled = config("RESPONSE_CACHE_ENABLED", default=True, cast=bool)
+    ttl = config("RESPONSE_CACHE_TTL", default=3600, cast=int)
+    url = config("RESPONSE_CACHE_URL", default="")
+
+    if url:
+        backend = AiocacheBackend(url, ttl=ttl)
+    elif shared_state is not None:
+        backend = SharedCacheBackend(shared_state, ttl=ttl)
+    else:
+        backend = LocalCacheBackend(
+            max_entries=config("RESPONSE_CACHE_MAX_ENTRIES", default=1024, cast=int),
+            ttl=ttl,
+        )
+
+    logger.info(f"Response cache: backend={backend.name}, enabled={enabled}")
+    return ResponseCache(backend, enabled=enabled)
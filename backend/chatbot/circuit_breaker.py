@@ -0,0 +1,299 @@
+"""
+Circuit breakers for CodementorX Chatbot
+One breaker per (provider base URL, model). It tracks attempts over a
+rolling window and opens when too many of them fail (connection errors,
+timeouts, 429 and 5xx) or are slow. While a breaker is open, requests for
+its model fail fast with 503 + Retry-After (or are routed to a fallback
+model, model_router.py) instead of each waiting out the provider's
+timeouts. Once the open period ends, the breaker is half-open:
+a few probe requests go through, and enough successes close it again
+while a failure reopens it for longer.
+
+Breakers are per worker, like the admission limit.
+"""
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from decouple import config
+
+import metrics
+from resilience import UpstreamError, classify
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values of chatbot_circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(UpstreamError):
+    """Raised instead of calling a model whose breaker is open"""
+
+    def __init__(self, model: str, retry_after: int):
+        self.model = model
+        # Not an overload signal: nothing was sent upstream
+        super().__init__(
+            f"Model {model} is temporarily unavailable, retry after {retry_after}s",
+            503,
+            retry_after=retry_after,
+        )
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker over per-second outcome buckets
+    covering the last `window` seconds
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        model: str,
+        window: float = 30.0,
+        min_calls: int = 10,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        max_open_seconds: float = 120.0,
+        half_open_probes: int = 1,
+        probe_successes: int = 2,
+    ):
+        self.upstream = upstream
+        self.model = model
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_successes = probe_successes
+
+        self.state = CLOSED
+        # [second, calls, failures, slow calls]
+        self._buckets: Deque[List[int]] = deque()
+        self._opened_at = 0.0
+        self._open_for = open_seconds
+        # Consecutive trips without closing in between; each doubles the open period
+        self._trips = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.opened = 0
+        self.rejected = 0
+        self.last_trip_reason: Optional[str] = None
+        self._set_gauge()
+
+    def allows(self) -> bool:
+        """Whether a call would be let through now (reserves nothing)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at >= self._open_for
+        return self._probes_in_flight < self.half_open_probes
+
+    def retry_after(self) -> int:
+        """Seconds until the breaker lets probes through"""
+        remaining = self._opened_at + self._open_for - time.monotonic()
+        return max(1, math.ceil(remaining))
+
+    def acquire(self) -> bool:
+        """
+        Admit one attempt; True when it is a half-open probe
+        Raises CircuitOpen when the breaker rejects it
+        """
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self._open_for:
+            self._transition(HALF_OPEN)
+        if self.state == CLOSED:
+            return False
+        if self.state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        raise self.reject()
+
+    def reject(self) -> CircuitOpen:
+        """Count a fast-failed call and return the error to raise"""
+        self.rejected += 1
+        metrics.CIRCUIT_REJECTIONS.labels(self.upstream, metrics.model_label(self.model)).inc()
+        return CircuitOpen(self.model, self.retry_after())
+
+    def record(
+        self,
+        probe: bool,
+        latency: float,
+        error: Optional[BaseException] = None,
+        cancelled: bool = False,
+    ) -> None:
+        """
+        Outcome of an admitted attempt. Only retryable errors count as
+        failures (a 400 says nothing about the model's health); a cancelled
+        attempt (deadline, losing hedge) counts only if it was already slow
+        """
+        failed = error is not None and classify(error)[0]
+        slow = latency >= self.slow_call_seconds
+        if probe:
+            # A transition in the meantime has reset the count
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if self.state != HALF_OPEN:
+                return
+            if failed or slow:
+                self._trip("probe failed" if failed else "probe slow")
+            elif not cancelled:
+                self._probe_successes += 1
+                if self._probe_successes >= self.probe_successes:
+                    self._transition(CLOSED)
+            return
+        if cancelled and not slow:
+            return
+        self._count(failed, slow)
+        if self.state == CLOSED:
+            self._check_thresholds()
+
+    def _count(self, failed: bool, slow: bool) -> None:
+        now = int(time.monotonic())
+        if not self._buckets or self._buckets[-1][0] != now:
+            self._buckets.append([now, 0, 0, 0])
+            while self._buckets[0][0] <= now - self.window:
+                self._buckets.popleft()
+        bucket = self._buckets[-1]
+        bucket[1] += 1
+        bucket[2] += failed
+        bucket[3] += slow
+
+    def _window_counts(self) -> Tuple[int, int, int]:
+        cutoff = int(time.monotonic()) - self.window
+        calls = failures = slow = 0
+        for second, bucket_calls, bucket_failures, bucket_slow in self._buckets:
+            if second > cutoff:
+                calls += bucket_calls
+                failures += bucket_failures
+                slow += bucket_slow
+        return calls, failures, slow
+
+    def _check_thresholds(self) -> None:
+        calls, failures, slow = self._window_counts()
+        if calls < self.min_calls:
+            return
+        if failures / calls >= self.failure_rate:
+            self._trip(f"{failures}/{calls} calls failed")
+        elif slow / calls >= self.slow_call_rate:
+            self._trip(f"{slow}/{calls} calls slower than {self.slow_call_seconds:.0f}s")
+
+    def _trip(self, reason: str) -> None:
+        self._trips += 1
+        self._open_for = min(self.max_open_seconds, self.open_seconds * 2 ** (self._trips - 1))
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        self.last_trip_reason = reason
+        self._transition(OPEN)
+        logger.warning(
+            "Circuit for %s on %s opened for %.0fs: %s",
+            self.model, self.upstream, self._open_for, reason,
+        )
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        self.state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == CLOSED:
+            self._trips = 0
+            self._buckets.clear()
+            logger.info("Circuit for %s on %s closed", self.model, self.upstream)
+        metrics.CIRCUIT_TRANSITIONS.labels(
+            self.upstream, metrics.model_label(self.model), state
+        ).inc()
+        self._set_gauge()
+
+    def _set_gauge(self) -> None:
+        metrics.CIRCUIT_STATE.labels(
+            self.upstream, metrics.model_label(self.model)
+        ).set(STATE_VALUES[self.state])
+
+    def stats(self) -> Dict[str, Any]:
+        calls, failures, slow = self._window_counts()
+        stats = {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "last_trip_reason": self.last_trip_reason,
+        }
+        if self.state == OPEN:
+            stats["retry_after"] = self.retry_after()
+        return stats
+
+
+class CircuitBreakers:
+    """
+    The worker's breakers, created per (base URL, model) on first use.
+    Model names come from requests, so the count is bounded: past
+    `max_breakers`, the least recently used closed breaker is dropped
+    """
+
+    def __init__(self, max_breakers: int = 64, **breaker_settings: Any):
+        self.max_breakers = max_breakers
+        self.breaker_settings = breaker_settings
+        self._breakers: "OrderedDict[Tuple[str, str], CircuitBreaker]" = OrderedDict()
+
+    def get(self, base_url: str, model: str) -> CircuitBreaker:
+        key = (urlparse(base_url).netloc or base_url, model)
+        breaker = self._breakers.get(key)
+        if breaker is not None:
+            self._breakers.move_to_end(key)
+            return breaker
+        if len(self._breakers) >= self.max_breakers:
+            for old_key, old in self._breakers.items():
+                if old.state == CLOSED:
+                    del self._breakers[old_key]
+                    break
+        breaker = self._breakers[key] = CircuitBreaker(*key, **self.breaker_settings)
+        return breaker
+
+    def check(self, base_url: str, model: str) -> CircuitBreaker:
+        """The model's breaker; raises CircuitOpen when it rejects calls"""
+        breaker = self.get(base_url, model)
+        if not breaker.allows():
+            raise breaker.reject()
+        return breaker
+
+    def states(self) -> Dict[str, str]:
+        """State per "<host> <model>", for the health endpoint"""
+        return {f"{upstream} {model}": b.state for (upstream, model), b in self._breakers.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "breakers": {
+                f"{upstream} {model}": b.stats() for (upstream, model), b in self._breakers.items()
+            },
+        }
+
+
+def build_circuit_breakers() -> Optional[CircuitBreakers]:
+    """Create the circuit breakers from environment configuration (None when disabled)"""
+    if not config("CIRCUIT_BREAKER_ENABLED", default=True, cast=bool):
+        return None
+    return CircuitBreakers(
+        window=config("CIRCUIT_WINDOW_SECONDS", default=30.0, cast=float),
+        min_calls=config("CIRCUIT_MIN_CALLS", default=10, cast=int),
+        failure_rate=config("CIRCUIT_FAILURE_RATE", default=0.5, cast=float),
+        slow_call_seconds=config("CIRCUIT_SLOW_CALL_SECONDS", default=30.0, cast=float),
+        slow_call_rate=config("CIRCUIT_SLOW_CALL_RATE", default=0.8, cast=float),
+        open_seconds=config("CIRCUIT_OPEN_SECONDS", default=15.0, cast=float),
+        max_open_seconds=config("CIRCUIT_MAX_OPEN_SECONDS", default=120.0, cast=float),
+        half_open_probes=config("CIRCUIT_HALF_OPEN_PROBES", default=1, cast=int),
+        probe_successes=config("CIRCUIT_PROBE_SUCCESSES", default=2, cast=int),
+    )
@@ -0,0 +1,185 @@
+"""
+Content-addressed context store for CodementorX Chatbot
+Keeps recently seen messages keyed by hash so clients can reference earlier
+turns by hash instead of resending full transcripts
+"""
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+def message_hash(role: str, content: str) -> str:
+    """
+    Hash clients use to reference a message: sha256 hex of "<role>\\n<content>"
+    (content with surrounding whitespace stripped, as the API stores it)
+    """
+    return hashlib.sha256(f"{role}\n{content}".encode("utf-8")).hexdigest()
+
+
+class MissingContextMessages(LookupError):
+    """Raised when referenced context hashes are not in the store"""
+
+    def __init__(self, missing_hashes: List[str]):
+        self.missing_hashes = missing_hashes
+        super().__init__(f"{len(missing_hashes)} context messages are not known to the server")
+
+
+class ContextStore:
+    """
+    Bounded LRU of messages keyed by (user_id, message hash)
+    Entries are scoped per user so a hash never resolves another user's
+    message. Bounded by entry count and total content size.
+    """
+
+    def __init__(self, max_entries: int = 20000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, str], Dict[str, str]]" = OrderedDict()
+        self._bytes = 0
+
+        self.resolved = 0
+        self.missing = 0
+        self.evictions = 0
+
+    def put(self, user_id: int, role: str, content: str) -> str:
+        """Store a message and return its hash"""
+        digest = message_hash(role, content)
+        key = (user_id, digest)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return digest
+
+        self._entries[key] = {"role": role, "content": content}
+        self._bytes += len(content)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted["content"])
+            self.evictions += 1
+        return digest
+
+    def put_many(self, user_id: int, messages: Iterable[Dict[str, str]]) -> List[str]:
+        return [self.put(user_id, m["role"], m["content"]) for m in messages]
+
+    def resolve(self, user_id: int, hashes: List[str]) -> List[Dict[str, str]]:
+        """
+        Messages for `hashes` in order
+        Raises MissingContextMessages listing every unknown hash
+        """
+        messages = []
+        missing = []
+        for digest in hashes:
+            key = (user_id, digest)
+            message = self._entries.get(key)
+            if message is None:
+                missing.append(digest)
+                continue
+            self._entries.move_to_end(key)
+            messages.append(message)
+
+        if missing:
+            self.missing += len(missing)
+            raise MissingContextMessages(missing)
+        self.resolved += len(messages)
+        return messages
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "resolved": self.resolved,
+            "missing": self.missing,
+            "evictions": self.evictions,
+        }
+
+
+class SharedContextStore:
+    """
+    Context store in the node's shared state (shared_state.py), so a hash
+    returned by one worker resolves on any other
+    Entries expire `ttl` seconds after they were last stored; size is bounded
+    by the shared state's cache pruning. Backend errors (e.g. the database
+    locked by another worker) degrade: stores are skipped and lookups miss,
+    so the client resends the message bodies.
+    """
+
+    def __init__(self, state, ttl: int = 3600):
+        self.state = state
+        self.ttl = ttl
+        self.resolved = 0
+        self.missing = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(user_id: int, digest: str) -> str:
+        return f"context:{user_id}:{digest}"
+
+    def put(self, user_id: int, role: str, content: str) -> str:
+        """Store a message and return its hash"""
+        return self.put_many(user_id, [{"role": role, "content": content}])[0]
+
+    def put_many(self, user_id: int, messages: Iterable[Dict[str, str]]) -> List[str]:
+        entries = {}
+        hashes = []
+        for m in messages:
+            digest = message_hash(m["role"], m["content"])
+            entries[self._key(user_id, digest)] = {"role": m["role"], "content": m["content"]}
+            hashes.append(digest)
+        if entries:
+            try:
+                self.state.cache_set_many(entries, self.ttl)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Context store write skipped: {e}")
+        return hashes
+
+    def resolve(self, user_id: int, hashes: List[str]) -> List[Dict[str, str]]:
+        """
+        Messages for `hashes` in order
+        Raises MissingContextMessages listing every unknown hash
+        """
+        if not hashes:
+            return []
+        try:
+            found = self.state.cache_get_many([self._key(user_id, digest) for digest in hashes])
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Context store lookup failed, treating as missing: {e}")
+            found = {}
+        missing = [digest for digest in hashes if self._key(user_id, digest) not in found]
+        if missing:
+            self.missing += len(missing)
+            raise MissingContextMessages(missing)
+        self.resolved += len(hashes)
+        return [found[self._key(user_id, digest)] for digest in hashes]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "shared",
+            "ttl": self.ttl,
+            "resolved": self.resolved,
+            "missing": self.missing,
+            "errors": self.errors,
+        }
+
+
+def build_context_store(shared_state=None):
+    """
+    Create the context store from environment configuration, in the node's
+    shared state when there is one
+    """
+    if shared_state is not None:
+        return SharedContextStore(
+            shared_state, ttl=config("CONTEXT_STORE_TTL", default=3600, cast=int)
+        )
+    return ContextStore(
+        max_entries=config("CONTEXT_STORE_MAX_ENTRIES", default=20000, cast=int),
+        max_bytes=config("CONTEXT_STORE_MAX_BYTES", default=64 * 1024 * 1024, cast=int),
+    )
@@ -0,0 +1,174 @@
+"""
+Context window management for CodementorX Chatbot
+Token counting with tiktoken and budget-aware packing of conversation context
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Total context window (prompt + completion) per model family
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-16k": 16385,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Model names come from requests: past this many, new ones share the default encoding
+MAX_ENCODING_MODELS = 32
+DEFAULT_ENCODING = "cl100k_base"
+
+# Chat format overhead (see OpenAI cookbook "How to count tokens")
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+
+class ContextBudgetExceeded(ValueError):
+    """Raised when the system prompt and current message alone exceed the budget"""
+
+    def __init__(self, required_tokens: int, budget: int):
+        self.required_tokens = required_tokens
+        self.budget = budget
+        super().__init__(
+            f"Message requires {required_tokens} prompt tokens but the budget is {budget}"
+        )
+
+
+def get_context_window(model: str) -> int:
+    """Context window for a model, matched on the longest known prefix"""
+    for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken, caching results by content hash
+    tiktoken is imported on first use; if it (or its BPE files) is
+    unavailable, a ~4 characters per token estimate is used instead
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._encodings: Dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _encoding(self, model: str):
+        if model not in self._encodings and len(self._encodings) >= MAX_ENCODING_MODELS:
+            model = DEFAULT_ENCODING
+        if model not in self._encodings:
+            try:
+                import tiktoken
+
+                try:
+                    encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable for {model}, estimating tokens: {e}")
+                encoding = None
+            self._encodings[model] = encoding
+        return self._encodings[model]
+
+    def count(self, text: str, model: str) -> int:
+        """Number of tokens in `text` for `model`"""
+        encoding = self._encoding(model)
+        encoding_name = encoding.name if encoding else "estimate"
+        key = (encoding_name, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest())
+
+        cached = self._counts.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        if encoding:
+            tokens = len(encoding.encode(text, disallowed_special=()))
+        else:
+            tokens = len(text) // 4 + 1
+
+        self._counts[key] = tokens
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+        return tokens
+
+    def message_tokens(self, message: Dict[str, str], model: str) -> int:
+        """Tokens used by a chat message including format overhead"""
+        return self.count(message["content"], model) + TOKENS_PER_MESSAGE
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._counts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def get_prompt_budget(model: str, max_tokens: int, max_prompt_tokens: int = 0) -> int:
+    """Prompt token budget: the model window minus the completion reserve,
+    capped by max_prompt_tokens (the deployment-wide MAX_PROMPT_TOKENS;
+    0 disables the cap)"""
+    budget = get_context_window(model) - max_tokens
+    if max_prompt_tokens > 0:
+        budget = min(budget, max_prompt_tokens)
+    return budget
+
+
+def pack_context(
+    counter: TokenCounter,
+    model: str,
+    system_message: Dict[str, str],
+    context: List[Dict[str, str]],
+    user_message: Dict[str, str],
+    max_tokens: int,
+    budget: Optional[int] = None,
+    pinned: Optional[List[Dict[str, str]]] = None,
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Fill the prompt budget with context, newest message first
+    `pinned` messages (e.g. a conversation summary) always follow the
+    system prompt and are never dropped
+    Returns the messages to send and packing statistics
+    """
+    if budget is None:
+        budget = get_prompt_budget(model, max_tokens)
+    pinned = pinned or []
+
+    used = (
+        counter.message_tokens(system_message, model)
+        + sum(counter.message_tokens(m, model) for m in pinned)
+        + counter.message_tokens(user_message, model)
+        + TOKENS_REPLY_PRIMING
+    )
+    if used > budget:
+        raise ContextBudgetExceeded(used, budget)
+
+    selected: List[Dict[str, str]] = []
+    for message in reversed(context):
+        tokens = counter.message_tokens(message, model)
+        if used + tokens > budget:
+            break
+        selected.append(message)
+        used += tokens
+    selected.reverse()
+
+    stats = {
+        "prompt_tokens_estimate": used,
+        "prompt_token_budget": budget,
+        "context_messages": len(selected),
+        "context_messages_dropped": len(context) - len(selected),
+    }
+    return [system_message, *pinned, *selected, user_message], stats
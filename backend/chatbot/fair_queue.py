@@ -0,0 +1,176 @@
+"""
+Weighted fair queueing for CodementorX Chatbot
+Requests waiting for an upstream slot are queued per user (a flow) and
+dispatched in order of their virtual finish time, so each backlogged user
+gets a share of the slots in proportion to their role's weight, whatever
+the number of requests they queue. A user who sends one request at a time
+is served ahead of a backlog of another user's. Each role also caps how
+many slots one user may hold at once; a user at the cap waits for one of
+their own calls to finish even while slots are free.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional, Tuple
+
+# Every request costs one unit of service: tokens are not known before the call
+REQUEST_COST = 1.0
+# A request sharing another's in-flight call (single-flight follower) takes
+# no slot, but is still charged a nominal share so duplicates are not free
+FOLLOWER_COST = 0.25
+
+
+def parse_role_settings(spec: str) -> Dict[str, float]:
+    """"user=1,moderator=2,admin=4" as {role: value}"""
+    settings = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        role, value = item.split("=", 1)
+        settings[role.strip()] = float(value)
+    return settings
+
+
+class Flow:
+    """One user's queued requests, slots held and position in virtual time"""
+
+    __slots__ = ("key", "role", "weight", "max_in_flight", "in_flight", "last_finish", "waiters")
+
+    def __init__(self, key: Hashable, role: str, weight: float, max_in_flight: int):
+        self.key = key
+        self.role = role
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        # Virtual finish time of the flow's latest request
+        self.last_finish = 0.0
+        # (virtual finish time, future) in arrival order
+        self.waiters: Deque[Tuple[float, asyncio.Future]] = deque()
+
+    def has_capacity(self) -> bool:
+        return not self.max_in_flight or self.in_flight < self.max_in_flight
+
+
+class FairQueue:
+    """Per-user queues of slot waiters, dispatched by weighted virtual finish time"""
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        max_in_flight: Optional[Dict[str, float]] = None,
+        default_role: str = "user",
+    ):
+        self.weights = weights or {}
+        self.max_in_flight = max_in_flight or {}
+        self.default_role = default_role
+
+        self._flows: Dict[Hashable, Flow] = {}
+        # Virtual time: the start tag of the latest request given a slot
+        self._virtual_time = 0.0
+        self._queued = 0
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def flow(self, key: Hashable, role: Optional[str] = None) -> Flow:
+        """The flow of user `key`, created on first use"""
+        flow = self._flows.get(key)
+        if flow is None:
+            role = role or self.default_role
+            flow = self._flows[key] = Flow(
+                key,
+                role,
+                self.weights.get(role, self.weights.get(self.default_role, 1.0)),
+                int(self.max_in_flight.get(role, self.max_in_flight.get(self.default_role, 0))),
+            )
+        return flow
+
+    def _tag(self, flow: Flow) -> Tuple[float, float]:
+        """(start, finish) virtual times for a new request of `flow`"""
+        start = max(self._virtual_time, flow.last_finish)
+        flow.last_finish = start + REQUEST_COST / flow.weight
+        return start, flow.last_finish
+
+    def admit(self, flow: Flow) -> None:
+        """Account a request given a slot without queueing"""
+        start, _ = self._tag(flow)
+        self._virtual_time = max(self._virtual_time, start)
+        flow.in_flight += 1
+
+    def charge(self, key: Hashable, cost: float = FOLLOWER_COST) -> None:
+        """
+        Account `cost` units of service served without a slot to user `key`
+        Only an active flow is charged: an idle user's next request starts
+        from the current virtual time whatever they were served before
+        """
+        flow = self._flows.get(key)
+        if flow is not None:
+            flow.last_finish = max(self._virtual_time, flow.last_finish) + cost / flow.weight
+
+    def push(self, flow: Flow) -> asyncio.Future:
+        """Queue a request of `flow`; the future completes when it gets a slot"""
+        _, finish = self._tag(flow)
+        waiter = asyncio.get_running_loop().create_future()
+        flow.waiters.append((finish, waiter))
+        self._queued += 1
+        return waiter
+
+    def remove(self, flow: Flow, waiter: asyncio.Future) -> None:
+        """Drop a waiter that gave up (timeout or cancellation)"""
+        for entry in flow.waiters:
+            if entry[1] is waiter:
+                flow.waiters.remove(entry)
+                self._queued -= 1
+                break
+        self._forget(flow)
+
+    def pop(self) -> Optional[Flow]:
+        """
+        Give a slot to the queued request with the lowest virtual finish
+        time among flows under their in-flight cap; returns its flow, or
+        None when no queued request can start
+        """
+        while True:
+            best = None
+            for flow in self._flows.values():
+                if flow.waiters and flow.has_capacity():
+                    if best is None or flow.waiters[0][0] < best.waiters[0][0]:
+                        best = flow
+            if best is None:
+                return None
+            finish, waiter = best.waiters.popleft()
+            self._queued -= 1
+            if waiter.done():
+                # Timed out or cancelled, not yet removed
+                continue
+            self._virtual_time = max(self._virtual_time, finish - REQUEST_COST / best.weight)
+            best.in_flight += 1
+            waiter.set_result(None)
+            return best
+
+    def release(self, flow: Flow) -> None:
+        """A slot held by `flow` was returned"""
+        flow.in_flight -= 1
+        self._forget(flow)
+
+    def discard(self, flow: Flow) -> None:
+        """A request of `flow` was rejected: drop the flow if it is now idle"""
+        self._forget(flow)
+
+    def _forget(self, flow: Flow) -> None:
+        # An idle user's next request starts from the current virtual time
+        if not flow.in_flight and not flow.waiters:
+            self._flows.pop(flow.key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        by_role: Dict[str, Dict[str, int]] = {}
+        for flow in self._flows.values():
+            role = by_role.setdefault(flow.role, {"users": 0, "in_flight": 0, "queued": 0})
+            role["users"] += 1
+            role["in_flight"] += flow.in_flight
+            role["queued"] += len(flow.waiters)
+        return {
+            "weights": self.weights,
+            "max_in_flight_per_user": self.max_in_flight,
+            "active_users": len(self._flows),
+            "roles": by_role,
+        }
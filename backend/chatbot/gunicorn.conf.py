@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for CodementorX Chatbot
+Multi-process serving: uvicorn workers (one event loop per core), sharing
+counters, rate limits and small caches through a SQLite database on tmpfs
+(shared_state.py), with Prometheus metrics aggregated across workers
+(metrics.py)
+
+Usage (from backend/chatbot):
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import multiprocessing
+import os
+import shutil
+
+# Server socket
+bind = f"{os.getenv('FASTAPI_HOST', '0.0.0.0')}:{os.getenv('FASTAPI_PORT', '8001')}"
+
+# Workers: one per core unless WEB_CONCURRENCY says otherwise. Chat traffic
+# is I/O bound on the model provider; extra workers add event loops for the
+# CPU work around it (JSON, token counting, caches).
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Streamed responses can run for minutes; the timeout only catches stuck workers
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# Recycle workers now and then to bound memory growth (jittered so they
+# don't all restart together)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 0))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Node-wide shared state on tmpfs, inherited by the workers through the
+# environment. Set SHARED_STATE_PATH="" to keep state per worker.
+os.environ.setdefault(
+    "SHARED_STATE_PATH",
+    f"/dev/shm/codementorx-chatbot-{os.getenv('FASTAPI_PORT', '8001')}.db",
+)
+
+# Each worker writes its metric values to files in this directory, which
+# /metrics sums; it must be set before the workers import prometheus_client
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    f"/dev/shm/codementorx-chatbot-{os.getenv('FASTAPI_PORT', '8001')}-metrics",
+)
+
+
+def on_starting(server):
+    """Start each server with empty shared state and metrics"""
+    path = os.environ.get("SHARED_STATE_PATH")
+    if path:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        server.log.info(f"Shared state at {path} for {server.cfg.workers} workers")
+
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges (in-flight requests) from /metrics"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,190 @@
+"""
+Logging pipeline for CodementorX Chatbot
+Records are put on a bounded in-process queue by the calling thread and
+formatted and written by a background listener thread, so the event loop
+never blocks on log I/O and never formats a record itself. Output is JSON
+(one object per line, extra fields included and masked with
+mask_sensitive_data as the record is written) or the plain text format.
+
+INFO and below can be sampled per route (LOG_SAMPLE_RATES): the decision is
+made once per request, so a request's lines are kept or dropped together.
+Warnings and errors are always kept.
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+from decouple import config
+from pythonjsonlogger import jsonlogger
+
+from utils import mask_sensitive_data
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+JSON_FORMAT = "%(asctime)s %(process)d %(name)s %(levelname)s %(message)s"
+
+_sampled: ContextVar[bool] = ContextVar("log_sampled", default=True)
+
+
+class SamplingFilter(logging.Filter):
+    """Drops INFO and lower records of requests that were not sampled"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or _sampled.get()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler for a listener in the same process: records are queued
+    as they are, without the message formatting QueueHandler.prepare does
+    for other processes, and dropped (and counted) when the queue is full
+    rather than blocking the caller
+    """
+
+    def __init__(self, log_queue: queue.SimpleQueue, max_size: int = 10000):
+        super().__init__(log_queue)
+        self.max_size = max_size
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Arguments are formatted later by the listener: log values, not
+        # objects that change after the call
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.max_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+class MaskingJsonFormatter(jsonlogger.JsonFormatter):
+    """JSON formatter masking sensitive fields (tokens, keys, passwords)"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._sensitive_keys: Dict[str, bool] = {}
+
+    def _is_sensitive(self, key: str) -> bool:
+        sensitive = self._sensitive_keys.get(key)
+        if sensitive is None:
+            # Same rule as mask_sensitive_data, remembered per field name
+            sensitive = mask_sensitive_data({key: None})[key] is not None
+            self._sensitive_keys[key] = sensitive
+        return sensitive
+
+    def process_log_record(self, log_record: Dict[str, Any]) -> Dict[str, Any]:
+        # Most records carry no sensitive field; only those are copied and masked
+        for key, value in log_record.items():
+            if isinstance(value, dict) or self._is_sensitive(key):
+                return mask_sensitive_data(log_record)
+        return log_record
+
+
+class LogPipeline:
+    """The root logger's queue handler and the listener writing its records"""
+
+    def __init__(self, handler: NonBlockingQueueHandler, listener: QueueListener, log_format: str):
+        self.handler = handler
+        self.listener = listener
+        self.log_format = log_format
+
+    def stop(self) -> None:
+        """Write out queued records and stop the listener thread"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.log_format,
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+        }
+
+
+def configure_logging() -> LogPipeline:
+    """
+    Route the root logger through the queue from environment configuration
+    (LOG_LEVEL, LOG_FORMAT json|text, LOG_QUEUE_SIZE)
+    """
+    log_format = config("LOG_FORMAT", default="json").lower()
+    output = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        output.setFormatter(MaskingJsonFormatter(JSON_FORMAT, json_ensure_ascii=False))
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(
+        queue.SimpleQueue(), max_size=config("LOG_QUEUE_SIZE", default=10000, cast=int)
+    )
+    handler.addFilter(SamplingFilter())
+
+    # Skip per-record lookups the formats don't use: the caller's file and
+    # line (a stack walk on every call) and thread names
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config("LOG_LEVEL", default="INFO").upper())
+    # httpx logs every upstream call at INFO; /metrics counts them instead
+    logging.getLogger("httpx").setLevel(config("LOG_HTTPX_LEVEL", default="WARNING").upper())
+
+    listener = QueueListener(handler.queue, output)
+    listener.start()
+    pipeline = LogPipeline(handler, listener, log_format)
+    # Flush what is still queued when the process exits
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+def parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    """
+    "/api/chat/message=0.1,/api/chat=0.5" as (path prefix, rate) pairs,
+    longest prefix first
+    """
+    rates = []
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        prefix, rate = item.rsplit("=", 1)
+        rates.append((prefix.strip(), min(1.0, max(0.0, float(rate)))))
+    return sorted(rates, key=lambda entry: len(entry[0]), reverse=True)
+
+
+class LogSamplingMiddleware:
+    """ASGI middleware deciding, per request, whether its INFO records are kept"""
+
+    def __init__(self, app, rates: Optional[str] = None, default_rate: Optional[float] = None):
+        self.app = app
+        self.rates = parse_sample_rates(
+            config("LOG_SAMPLE_RATES", default="") if rates is None else rates
+        )
+        self.default_rate = (
+            config("LOG_SAMPLE_RATE", default=1.0, cast=float)
+            if default_rate is None else default_rate
+        )
+
+    def _rate(self, path: str) -> float:
+        for prefix, rate in self.rates:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rate = self._rate(scope["path"])
+        token = _sampled.set(rate >= 1.0 or random.random() < rate)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _sampled.reset(token)
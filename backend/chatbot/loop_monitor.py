@@ -0,0 +1,140 @@
+"""
+Event loop lag monitor for CodementorX Chatbot
+A ticker task measures how late the event loop runs it (scheduling delay,
+the time every ready callback waits behind whatever is running), exported
+as a histogram. A watchdog thread notices when the ticker is overdue by
+more than the stall threshold and captures the event loop thread's stack
+at that moment: the code blocking the loop. Debug mode additionally turns
+on asyncio's debug mode, which logs every callback slower than the
+threshold with the source location it was scheduled from (costly; for
+investigation only).
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from decouple import config
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Measures event loop lag and records stalls with the blocking stack"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        stall_threshold: float = 0.1,
+        debug: bool = False,
+        max_stalls: int = 20,
+    ):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.debug = debug
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # When the ticker is next due; the watchdog compares against it
+        self._due = 0.0
+
+        self.samples = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.stalls = 0
+        self.recent_stalls: deque = deque(maxlen=max_stalls)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.stall_threshold
+            logger.warning(
+                f"asyncio debug mode on: callbacks over {self.stall_threshold * 1000:.0f}ms are logged"
+            )
+        self._due = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog:
+            self._watchdog.join()
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - self._due)
+            self._due = now + self.interval
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            metrics.EVENT_LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        """Watchdog thread: capture the loop's stack once per stall"""
+        reported_due = None
+        while not self._stop.wait(self.stall_threshold / 2):
+            due = self._due
+            overdue = time.monotonic() - due
+            if overdue < self.stall_threshold or due == reported_due:
+                continue
+            reported_due = due
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            self._record_stall(overdue, stack)
+
+    def _record_stall(self, overdue: float, stack: List[str]) -> None:
+        self.stalls += 1
+        metrics.EVENT_LOOP_STALLS.inc()
+        self.recent_stalls.append({
+            "at": time.time(),
+            "blocked_ms": round(overdue * 1000, 1),
+            "stack": [line.rstrip() for line in stack],
+        })
+        location = stack[-1].strip().splitlines()[0] if stack else "unknown"
+        logger.warning(
+            "Event loop blocked for at least %.0fms at %s\n%s",
+            overdue * 1000, location, "".join(stack),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "debug": self.debug,
+            "interval_ms": self.interval * 1000,
+            "stall_threshold_ms": self.stall_threshold * 1000,
+            "samples": self.samples,
+            "mean_lag_ms": round(self.total_lag / self.samples * 1000, 3) if self.samples else 0.0,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "stalls": self.stalls,
+            "recent_stalls": list(self.recent_stalls),
+        }
+
+
+def build_loop_monitor() -> Optional[LoopMonitor]:
+    """Create the loop monitor from environment configuration (None when disabled)"""
+    if not config("LOOP_MONITOR_ENABLED", default=True, cast=bool):
+        return None
+    return LoopMonitor(
+        interval=config("LOOP_MONITOR_INTERVAL_MS", default=100, cast=float) / 1000,
+        stall_threshold=config("LOOP_STALL_THRESHOLD_MS", default=100, cast=float) / 1000,
+        debug=config("LOOP_MONITOR_DEBUG", default=False, cast=bool),
+    )
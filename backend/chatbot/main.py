@@ -2,46 +2,105 @@
 FastAPI Chatbot Service
 Main application entry point with JWT integration
 """
+import logging
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from startup import StartupTimer
+
+startup = StartupTimer()
+
+# Import time of the framework and the service's own modules, in dependency
+# order, for the startup report. Importing them constructs nothing: clients,
+# caches and connections are created in lifespan() below.
+for module in ("fastapi", "models", "utils", "metrics", "timing", "services", "routes"):
+    startup.timed_import(module)
+
 from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
-import uvicorn
-import os
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
-import logging
 
-from routes import chat_router
-from utils import verify_jwt_token
+from metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, render_metrics
+from profiler import build_request_profiler
+from routes import chat_router, get_current_user, profile_request, require_internal
+from services import AIService
+from rate_limit import build_rate_limiter
+from logging_config import LogSamplingMiddleware, configure_logging
+from loop_monitor import build_loop_monitor
+from shared_state import build_shared_state
+from timing import ServerTimingMiddleware
+from utils import build_token_verifier
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Configure logging: records are formatted and written by a background
+# thread (logging_config.py), never on the event loop
+log_pipeline = configure_logging()
 logger = logging.getLogger(__name__)
 
+# CORS configuration - Updated for Docker networking
+CORS_ORIGINS = os.getenv(
+    "CORS_ALLOWED_ORIGINS", 
+    "http://localhost:5173,http://127.0.0.1:5173,http://localhost:3000,http://127.0.0.1:3000"
+).split(",")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the service's resources on startup and release them on shutdown"""
+    logger.info("🚀 FastAPI Chatbot Service starting up...")
+    logger.info(f"CORS Origins: {CORS_ORIGINS}")
+    logger.info(f"JWT Secret configured: {'✅' if os.getenv('JWT_SECRET_KEY') else '❌'}")
+    logger.info(f"OpenAI API configured: {'✅' if os.getenv('OPENAI_API_KEY') else '❌'}")
+
+    async with AsyncExitStack() as resources:
+        # Each resource's cleanup is registered as soon as it exists, so a
+        # startup failure part way still releases what was created before it
+
+        # Started first, so it also watches the rest of startup
+        app.state.loop_monitor = build_loop_monitor()
+        if app.state.loop_monitor:
+            await app.state.loop_monitor.start()
+            resources.push_async_callback(app.state.loop_monitor.close)
+
+        with startup.phase("shared_state"):
+            # Node-wide state for multi-worker serving (gunicorn.conf.py), else None
+            app.state.shared_state = build_shared_state()
+        if app.state.shared_state:
+            resources.callback(app.state.shared_state.close)
+        with startup.phase("token_verifier"):
+            app.state.token_verifier = build_token_verifier()
+        resources.push_async_callback(app.state.token_verifier.close)
+        with startup.phase("rate_limiter"):
+            app.state.rate_limiter = build_rate_limiter(app.state.shared_state)
+        with startup.phase("ai_service"):
+            app.state.ai_service = AIService(app.state.shared_state)
+        resources.push_async_callback(app.state.ai_service.close)
+        # Admin-requested sampling profiles (X-Profile: 1), None when disabled
+        app.state.profiler = build_request_profiler()
+        with startup.phase("connect"):
+            await app.state.ai_service.start()
+            await app.state.token_verifier.start()
+        startup.ready()
+
+        try:
+            yield
+        finally:
+            logger.info("🛑 FastAPI Chatbot Service shutting down...")
+
+
 # Create FastAPI app
 app = FastAPI(
     title="CodementorX Chatbot API",
     description="AI-powered chatbot service with JWT authentication",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
-# Security scheme
-security = HTTPBearer()
-
-# CORS configuration - Updated for Docker networking
-CORS_ORIGINS = os.getenv(
-    "CORS_ALLOWED_ORIGINS", 
-    "http://localhost:5173,http://127.0.0.1:5173,http://localhost:3000,http://127.0.0.1:3000"
-).split(",")
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[origin.strip() for origin in CORS_ORIGINS],
@@ -50,33 +109,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency for JWT authentication
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """
-    Dependency to verify JWT token and extract user info
-    """
-    try:
-        token = credentials.credentials
-        user_info = verify_jwt_token(token)
-        return user_info
-    except Exception as e:
-        logger.error(f"JWT verification failed: {e}")
-        raise HTTPException(
-            status_code=401,
-            detail="Invalid or expired token"
-        )
+# Per-phase timings of each request, returned as a Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
+
+# Per-route sampling of INFO logs (LOG_SAMPLE_RATES)
+app.add_middleware(LogSamplingMiddleware)
+
+# Outermost, so latency covers CORS handling and the whole response body
+app.add_middleware(MetricsMiddleware)
 
 # Health check endpoint
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint for Docker healthcheck"""
+    # An open circuit marks the upstream degraded; the service itself stays
+    # healthy (a restart would not help), so the status code is unchanged
+    breakers = request.app.state.ai_service.circuit_breakers
+    states = breakers.states() if breakers else {}
     return {
         "status": "healthy",
         "service": "CodementorX Chatbot API",
         "version": "1.0.0",
-        "environment": os.getenv("DEBUG", "False")
+        "environment": os.getenv("DEBUG", "False"),
+        "upstream": {
+            "status": "degraded" if any(state != "closed" for state in states.values()) else "ok",
+            "circuit_breakers": states,
+        },
+    }
+
+# Internal runtime statistics (not exposed under /api): service token or admin
+@app.get("/internal/stats", dependencies=[Depends(require_internal)])
+async def internal_stats(request: Request):
+    """Runtime statistics for monitoring and autoscaling"""
+    state = request.app.state
+    return {
+        **state.ai_service.get_stats(),
+        "rate_limit": state.rate_limiter.stats(),
+        **state.token_verifier.stats(),
+        "shared_state": state.shared_state.stats() if state.shared_state else {"enabled": False},
+        "profiler": state.profiler.stats() if state.profiler else {"enabled": False},
+        "logging": log_pipeline.stats(),
+        "event_loop": state.loop_monitor.stats() if state.loop_monitor else {"enabled": False},
+        "startup": startup.stats(),
     }
 
+# Prometheus metrics, summed across the node's workers (same auth as /internal/stats)
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_internal)])
+async def prometheus_metrics():
+    """Metrics in the Prometheus text exposition format"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -89,11 +171,12 @@ async def root():
         "chat_endpoints": "/api/chat/"
     }
 
-# Include chat routes with authentication
+# Include chat routes with authentication; the same get_current_user the
+# handlers depend on, so FastAPI verifies the token once per request
 app.include_router(
     chat_router,
     prefix="/api",
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_current_user), Depends(profile_request)]
 )
 
 # Exception handlers - Fixed duplicate handlers
@@ -107,7 +190,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "error": exc.detail,
             "status_code": exc.status_code,
             "path": str(request.url)
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 @app.exception_handler(Exception)
@@ -123,22 +207,9 @@ async def general_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """Startup event handler"""
-    logger.info("🚀 FastAPI Chatbot Service starting up...")
-    logger.info(f"CORS Origins: {CORS_ORIGINS}")
-    logger.info(f"JWT Secret configured: {'✅' if os.getenv('JWT_SECRET_KEY') else '❌'}")
-    logger.info(f"OpenAI API configured: {'✅' if os.getenv('OPENAI_API_KEY') else '❌'}")
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Shutdown event handler"""
-    logger.info("🛑 FastAPI Chatbot Service shutting down...")
-
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.getenv("FASTAPI_PORT", 8001))
     host = os.getenv("FASTAPI_HOST", "0.0.0.0")
     
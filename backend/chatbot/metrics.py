@@ -0,0 +1,264 @@
+"""
+Prometheus metrics for CodementorX Chatbot
+Request latency per route, upstream latency and token usage per model,
+time to first token, in-flight requests, upstream slot waits per role,
+response cache lookups, upstream retries, circuit breakers and routing,
+upstream calls cancelled by client disconnects, and event loop lag,
+exposed at /metrics
+
+Each worker records into its own values (no cross-process coordination on
+the request path). Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set by
+gunicorn.conf.py) makes them memory-mapped files that /metrics sums across
+the node's workers.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+# HTTP requests, including whole streamed responses
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Model calls take seconds; first tokens usually well under that
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+FIRST_TOKEN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+# Most requests get a slot at once; queued ones wait up to ADMISSION_QUEUE_TIMEOUT
+QUEUE_WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# A healthy loop lags well under a millisecond
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+REQUEST_LATENCY = Histogram(
+    "chatbot_http_request_duration_seconds",
+    "HTTP request latency until the response body is complete",
+    ["method", "route", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "chatbot_http_requests_in_flight",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+UPSTREAM_LATENCY = Histogram(
+    "chatbot_upstream_request_duration_seconds",
+    "Model provider call latency (whole stream for streamed calls)",
+    ["model", "outcome"],
+    buckets=UPSTREAM_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "chatbot_time_to_first_token_seconds",
+    "Time from the upstream call to its first content fragment (streamed calls)",
+    ["model"],
+    buckets=FIRST_TOKEN_BUCKETS,
+)
+TOKENS = Counter(
+    "chatbot_tokens",
+    "Tokens used by upstream completions",
+    ["model", "kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "chatbot_cache_lookups",
+    "Response cache lookups",
+    ["tier", "result"],
+)
+UPSTREAM_RETRIES = Counter(
+    "chatbot_upstream_retries",
+    "Upstream attempts retried, by the failed attempt's status or error type",
+    ["model", "reason"],
+)
+UPSTREAM_HEDGES = Counter(
+    "chatbot_upstream_hedges",
+    "Hedged upstream calls, by whether the hedge won the race",
+    ["model", "result"],
+)
+ADMISSION_WAIT = Histogram(
+    "chatbot_admission_wait_seconds",
+    "Time requests waited for an upstream slot, by the user's role",
+    ["role"],
+    buckets=QUEUE_WAIT_BUCKETS,
+)
+CIRCUIT_STATE = Gauge(
+    "chatbot_circuit_breaker_state",
+    "Circuit breaker state per upstream and model: 0 closed, 1 half-open, 2 open",
+    ["upstream", "model"],
+    multiprocess_mode="livemax",
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "chatbot_circuit_breaker_transitions",
+    "Circuit breaker state changes, by the state entered",
+    ["upstream", "model", "state"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "chatbot_circuit_breaker_rejections",
+    "Calls failed fast because the model's circuit breaker was open",
+    ["upstream", "model"],
+)
+ROUTING_DECISIONS = Counter(
+    "chatbot_routing_decisions",
+    "Requests routed, by requested model, model and endpoint used, and reason",
+    ["requested", "model", "endpoint", "reason"],
+)
+UPSTREAM_CANCELLED = Counter(
+    "chatbot_upstream_cancelled",
+    "Upstream calls cancelled before completing because the client went away, by model and call type",
+    ["model", "call"],
+)
+CANCELLED_TOKENS = Counter(
+    "chatbot_upstream_cancelled_tokens",
+    "Completion tokens of cancelled calls: generated before the cancel, and an estimate of those saved",
+    ["model", "kind"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "chatbot_event_loop_lag_seconds",
+    "Delay between when a timer was due on the event loop and when it ran",
+    buckets=LOOP_LAG_BUCKETS,
+)
+EVENT_LOOP_STALLS = Counter(
+    "chatbot_event_loop_stalls",
+    "Times the event loop was blocked past the stall threshold (loop_monitor.py)",
+)
+
+# Model names come from requests: past this many, new ones share a label
+MAX_MODEL_LABELS = 32
+_model_labels: set = set()
+
+# Running mean of completion tokens per model (this worker), the estimate
+# of what a cancelled call would have generated
+COMPLETION_TOKENS_ALPHA = 0.1
+_completion_tokens: Dict[str, float] = {}
+
+
+def model_label(model: str) -> str:
+    """`model` as a label value, bounded in number"""
+    if model in _model_labels:
+        return model
+    if len(_model_labels) < MAX_MODEL_LABELS:
+        _model_labels.add(model)
+        return model
+    return "other"
+
+
+def is_cancellation(error: Optional[BaseException]) -> bool:
+    """Whether `error` is the call being abandoned (task cancelled, stream closed early)"""
+    return isinstance(error, (asyncio.CancelledError, GeneratorExit))
+
+
+def observe_upstream(model: str, seconds: float, error: Optional[BaseException] = None) -> None:
+    if error is None:
+        outcome = "ok"
+    else:
+        outcome = "cancelled" if is_cancellation(error) else "error"
+    UPSTREAM_LATENCY.labels(model_label(model), outcome).observe(seconds)
+
+
+def observe_first_token(model: str, seconds: float) -> None:
+    TIME_TO_FIRST_TOKEN.labels(model_label(model)).observe(seconds)
+
+
+def record_tokens(model: str, token_usage: Optional[Dict[str, int]]) -> None:
+    if not token_usage:
+        return
+    label = model_label(model)
+    TOKENS.labels(label, "prompt").inc(token_usage.get("prompt_tokens") or 0)
+    completion = token_usage.get("completion_tokens") or 0
+    TOKENS.labels(label, "completion").inc(completion)
+    mean = _completion_tokens.get(model)
+    if mean is None:
+        mean = completion
+    else:
+        mean += COMPLETION_TOKENS_ALPHA * (completion - mean)
+    if model in _completion_tokens or len(_completion_tokens) < MAX_MODEL_LABELS:
+        _completion_tokens[model] = mean
+
+
+def record_cancelled(model: str, call: str, generated: int = 0, max_tokens: Optional[int] = None) -> None:
+    """
+    Count an upstream call cancelled after `generated` completion tokens.
+    Tokens saved are estimated from the model's mean completion length
+    (capped by max_tokens); nothing is estimated before one has completed
+    """
+    label = model_label(model)
+    UPSTREAM_CANCELLED.labels(label, call).inc()
+    if generated:
+        CANCELLED_TOKENS.labels(label, "generated").inc(generated)
+    expected = _completion_tokens.get(model)
+    if expected is None:
+        return
+    if max_tokens:
+        expected = min(expected, max_tokens)
+    CANCELLED_TOKENS.labels(label, "saved").inc(max(0.0, expected - generated))
+
+
+def record_cache_lookup(tier: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(tier, "hit" if hit else "miss").inc()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency per route template and status, and
+    the number of requests in flight
+    Routes are labelled by their path template (/api/chat/conversations/{conversation_id}),
+    and requests matching no route as "unmatched", so labels stay bounded
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route(self, scope: Dict[str, Any]) -> str:
+        # The router stores the matched endpoint in the scope
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            path = next(
+                (route.path for route in scope["app"].routes
+                 if getattr(route, "endpoint", None) is endpoint),
+                "unmatched",
+            )
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            REQUEST_LATENCY.labels(
+                scope["method"], self._route(scope), str(status_code)
+            ).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> bytes:
+    """Current metrics in the Prometheus text format, summed across workers"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
@@ -0,0 +1,377 @@
+"""
+Model routing for CodementorX Chatbot
+The catalog lists the models clients may request. Each model can be served
+by one or more targets, meaning one model on one OpenAI-compatible endpoint.
+Each target has its own client and connection pool. For every target the
+router tracks an EWMA of completion latency, of time to first token
+(streams) and of the error rate. A request goes to the fastest healthy
+target of the requested model. When none is healthy, or when the best one
+is expected to miss the request's latency budget, it goes to a faster
+model from the requested model's fallbacks. The decision is returned in
+the response metadata.
+
+Configuration (MODEL_ROUTER_CONFIG, JSON inline or a file path):
+    {
+      "endpoints": {
+        "openai": {"base_url": "https://api.openai.com/v1"},
+        "backup": {"base_url": "https://...", "api_key_env": "BACKUP_API_KEY"}
+      },
+      "models": [
+        {"id": "gpt-4o-mini", "name": "GPT-4o Mini", "max_tokens": 16384,
+         "targets": [{"endpoint": "openai"}, {"endpoint": "backup", "model": "mini"}],
+         "fallbacks": ["gpt-3.5-turbo"]}
+      ]
+    }
+The "default" endpoint is OPENAI_API_BASE with OPENAI_API_KEY. A model without
+"targets" is served by the first endpoint listed.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from decouple import config
+
+import metrics
+from admission import is_overload_error
+
+logger = logging.getLogger(__name__)
+
+# The catalog when MODEL_ROUTER_CONFIG is not set
+DEFAULT_MODELS = [
+    {
+        "id": "gpt-3.5-turbo",
+        "name": "GPT-3.5 Turbo",
+        "description": "Fast and efficient model for general conversations",
+        "max_tokens": 4096,
+    },
+    {
+        "id": "gpt-4o-mini",
+        "name": "GPT-4o Mini",
+        "description": "Efficient and capable model for coding and technical questions",
+        "max_tokens": 16384,
+        "fallbacks": ["gpt-3.5-turbo"],
+    },
+]
+
+
+@dataclass
+class Endpoint:
+    """An OpenAI-compatible API with its own client and connection pool"""
+    name: str
+    base_url: str
+    client: Any
+    pool: Any
+
+
+@dataclass
+class Target:
+    """One model on one endpoint, with its observed latency and error rate"""
+    endpoint: Endpoint
+    # Model name sent to the endpoint
+    model: str
+    latency: Optional[float] = None
+    first_token: Optional[float] = None
+    error_rate: float = 0.0
+    observed_at: float = 0.0
+    calls: int = 0
+    errors: int = 0
+
+    def predicted(self, stream: bool) -> Optional[float]:
+        """Expected seconds until the client sees the answer start"""
+        return self.first_token if stream and self.first_token is not None else self.latency
+
+
+@dataclass
+class ModelSpec:
+    """A catalog entry"""
+    id: str
+    name: str
+    description: str
+    max_tokens: int
+    targets: List[Target]
+    fallbacks: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Route:
+    """Where one request goes, and why"""
+    requested: str
+    # Catalog model answering: the requested one or a fallback
+    model: str
+    target: Target
+    reason: str
+    predicted: Optional[float] = None
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "requested_model": self.requested,
+            "model": self.model,
+            "endpoint": self.target.endpoint.name,
+            "reason": self.reason,
+            "predicted_ms": round(self.predicted * 1000) if self.predicted is not None else None,
+        }
+
+
+class ModelRouter:
+    """Picks a target per request from the catalog and the targets' observed performance"""
+
+    def __init__(
+        self,
+        endpoints: Dict[str, Endpoint],
+        models: List[ModelSpec],
+        breakers: Any = None,
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        error_half_life: float = 30.0,
+        explore_rate: float = 0.05,
+        latency_budget: Optional[float] = None,
+    ):
+        self.endpoints = endpoints
+        self.models = {spec.id: spec for spec in models}
+        self.default_endpoint = endpoints.get("default") or next(iter(endpoints.values()))
+        self.breakers = breakers
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.error_half_life = error_half_life
+        self.explore_rate = explore_rate
+        self.latency_budget = latency_budget
+        self.decisions: Dict[str, int] = {}
+
+    def route(self, model: str, stream: bool = False, budget: Optional[float] = None) -> Route:
+        """
+        Route a request for `model`; `budget` (seconds, else the configured
+        default) is the latency the request should not exceed
+        """
+        spec = self.models.get(model)
+        if spec is None:
+            # Not in the catalog: forwarded to the default endpoint as is
+            route = Route(model, model, Target(self.default_endpoint, model), "unlisted")
+            return self._decided(route)
+
+        target, reason = self._pick(spec, stream)
+        budget = budget or self.latency_budget
+        if target is None:
+            fallback = self._fallback(spec, stream)
+            if fallback:
+                route = Route(model, *fallback, "unavailable")
+                route.predicted = route.target.predicted(stream)
+                return self._decided(route)
+            # Nothing healthy: the first target's breaker answers for it
+            return self._decided(Route(model, model, spec.targets[0], "unavailable"))
+
+        route = Route(model, model, target, reason, target.predicted(stream))
+        if budget and route.predicted is not None and route.predicted > budget:
+            fallback = self._fallback(spec, stream, faster_than=route.predicted, budget=budget)
+            if fallback:
+                route = Route(model, *fallback, "latency_budget")
+                route.predicted = route.target.predicted(stream)
+        return self._decided(route)
+
+    def _healthy(self, target: Target) -> bool:
+        if self.breakers and not self.breakers.get(target.endpoint.base_url, target.model).allows():
+            return False
+        return self._error_rate(target) < self.max_error_rate
+
+    def _error_rate(self, target: Target) -> float:
+        # Decays while the target gets no traffic, so a recovered target is tried again
+        idle = time.monotonic() - target.observed_at
+        return target.error_rate * 0.5 ** (idle / self.error_half_life)
+
+    def _pick(self, spec: ModelSpec, stream: bool) -> Tuple[Optional[Target], str]:
+        """The fastest healthy target of `spec`, None when none is healthy"""
+        healthy = [target for target in spec.targets if self._healthy(target)]
+        if not healthy:
+            return None, "unavailable"
+        if len(spec.targets) == 1:
+            return healthy[0], "requested"
+        untried = [target for target in healthy if target.predicted(stream) is None]
+        if untried:
+            return untried[0], "untried"
+        if len(healthy) > 1 and random.random() < self.explore_rate:
+            # Keeps the estimates of the slower targets current
+            return random.choice(healthy), "explore"
+        return min(healthy, key=lambda target: target.predicted(stream)), "fastest"
+
+    def _fallback(
+        self,
+        spec: ModelSpec,
+        stream: bool,
+        faster_than: Optional[float] = None,
+        budget: Optional[float] = None,
+    ) -> Optional[Tuple[str, Target]]:
+        """
+        (model, target) from `spec`'s fallbacks: the first within `budget`,
+        else the fastest one faster than `faster_than`
+        """
+        best = None
+        for fallback_id in spec.fallbacks:
+            fallback = self.models.get(fallback_id)
+            if fallback is None:
+                continue
+            target, _ = self._pick(fallback, stream)
+            if target is None:
+                continue
+            if faster_than is None:
+                return fallback_id, target
+            predicted = target.predicted(stream)
+            if predicted is None or predicted >= faster_than:
+                continue
+            if predicted <= budget:
+                return fallback_id, target
+            if best is None or predicted < best[1].predicted(stream):
+                best = (fallback_id, target)
+        return best
+
+    def _decided(self, route: Route) -> Route:
+        self.decisions[route.reason] = self.decisions.get(route.reason, 0) + 1
+        metrics.ROUTING_DECISIONS.labels(
+            metrics.model_label(route.requested),
+            metrics.model_label(route.model),
+            route.target.endpoint.name,
+            route.reason,
+        ).inc()
+        return route
+
+    def observe(self, target: Target, seconds: Optional[float], error: Optional[BaseException] = None) -> None:
+        """
+        A finished call to `target`; the latency of a failed call is not
+        an estimate of anything. Streams pass seconds=None and report their
+        first token separately
+        """
+        failed = error is not None and is_overload_error(error)
+        target.error_rate = self._error_rate(target) * (1 - self.alpha) + self.alpha * failed
+        target.observed_at = time.monotonic()
+        target.calls += 1
+        target.errors += failed
+        if error is None and seconds is not None:
+            target.latency = self._ewma(target.latency, seconds)
+
+    def observe_first_token(self, target: Target, seconds: float) -> None:
+        target.first_token = self._ewma(target.first_token, seconds)
+
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.alpha * (sample - current)
+
+    def catalog(self) -> List[Dict[str, Any]]:
+        """The models clients may request, for /models"""
+        return [
+            {
+                "id": spec.id,
+                "name": spec.name,
+                "description": spec.description,
+                "max_tokens": spec.max_tokens,
+                "available": any(self._healthy(target) for target in spec.targets),
+            }
+            for spec in self.models.values()
+        ]
+
+    async def start(self) -> None:
+        """Warm every endpoint's connections"""
+        await asyncio.gather(*(endpoint.pool.warm() for endpoint in self.endpoints.values()))
+
+    async def close(self) -> None:
+        """Close every endpoint's client (and with it its pool)"""
+        for endpoint in self.endpoints.values():
+            await endpoint.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "decisions": dict(self.decisions),
+            "targets": {
+                f"{spec.id}@{target.endpoint.name}": {
+                    "model": target.model,
+                    "latency_ms": _ms(target.latency),
+                    "first_token_ms": _ms(target.first_token),
+                    "error_rate": round(self._error_rate(target), 3),
+                    "calls": target.calls,
+                    "errors": target.errors,
+                    "healthy": self._healthy(target),
+                }
+                for spec in self.models.values()
+                for target in spec.targets
+            },
+            "endpoints": {
+                name: endpoint.pool.stats() for name, endpoint in self.endpoints.items()
+            },
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+def build_endpoint(name: str, base_url: str, api_key: str) -> Endpoint:
+    """An endpoint's OpenAI client over its own explicitly configured connection pool"""
+    from openai import AsyncOpenAI
+    from upstream import build_upstream_pool
+
+    pool = build_upstream_pool(base_url)
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=pool.client,
+        timeout=pool.client.timeout,
+        # Retries are classified and budgeted by the upstream policy
+        max_retries=0,
+    )
+    return Endpoint(name, base_url, client, pool)
+
+
+def load_router_config(value: str) -> Dict[str, Any]:
+    """MODEL_ROUTER_CONFIG: inline JSON, or the path of a JSON file"""
+    if not value.lstrip().startswith("{"):
+        with open(value) as f:
+            value = f.read()
+    return json.loads(value)
+
+
+def build_model_router(breakers: Any = None) -> ModelRouter:
+    """Create the model router and its endpoints from environment configuration"""
+    settings = load_router_config(config("MODEL_ROUTER_CONFIG", default="{}"))
+
+    endpoint_settings = {
+        "default": {"base_url": config("OPENAI_API_BASE", default="https://api.openai.com/v1")},
+        **settings.get("endpoints", {}),
+    }
+    endpoints = {}
+    for name, endpoint in endpoint_settings.items():
+        api_key = config(endpoint.get("api_key_env", "OPENAI_API_KEY"))
+        endpoints[name] = build_endpoint(name, endpoint["base_url"], api_key)
+    first_endpoint = next(iter(settings.get("endpoints", {})), "default")
+
+    models = []
+    for entry in settings.get("models", DEFAULT_MODELS):
+        targets = []
+        for target in entry.get("targets", [{"endpoint": first_endpoint}]):
+            if target["endpoint"] not in endpoints:
+                raise ValueError(f"Model {entry['id']} targets unknown endpoint {target['endpoint']}")
+            targets.append(Target(endpoints[target["endpoint"]], target.get("model", entry["id"])))
+        models.append(ModelSpec(
+            id=entry["id"],
+            name=entry.get("name", entry["id"]),
+            description=entry.get("description", ""),
+            max_tokens=entry.get("max_tokens", 4096),
+            targets=targets,
+            fallbacks=entry.get("fallbacks", []),
+        ))
+
+    budget_ms = config("ROUTER_LATENCY_BUDGET_MS", default=0, cast=float)
+    router = ModelRouter(
+        endpoints,
+        models,
+        breakers=breakers,
+        alpha=config("ROUTER_EWMA_ALPHA", default=0.2, cast=float),
+        max_error_rate=config("ROUTER_MAX_ERROR_RATE", default=0.5, cast=float),
+        error_half_life=config("ROUTER_ERROR_HALF_LIFE", default=30.0, cast=float),
+        explore_rate=config("ROUTER_EXPLORE_RATE", default=0.05, cast=float),
+        latency_budget=budget_ms / 1000 if budget_ms > 0 else None,
+    )
+    logger.info(
+        f"Model router: {len(models)} models over {len(endpoints)} endpoint(s) "
+        f"({', '.join(endpoints)})"
+    )
+    return router
@@ -6,6 +6,9 @@ from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
+import re
+
+MESSAGE_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
 
 
 class MessageRole(str, Enum):
@@ -44,10 +47,19 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=10000, description="User message")
     conversation_id: Optional[str] = Field(default=None, description="Conversation ID for context")
     context: Optional[List[ChatMessage]] = Field(default=[], description="Previous conversation context")
+    context_hashes: Optional[List[str]] = Field(
+        default=None,
+        description="Ordered context as message hashes; `context` then only needs messages the server may not have"
+    )
     model: Optional[str] = Field(default="gpt-4o-mini", description="AI model to use")
     temperature: Optional[float] = Field(default=0.7, ge=0.0, le=2.0, description="Response creativity")
     max_tokens: Optional[int] = Field(default=1000, ge=1, le=4000, description="Maximum response tokens")
     system_prompt: Optional[str] = Field(default=None, description="Custom system prompt")
+    use_cache: Optional[bool] = Field(default=True, description="Allow serving a cached response for an identical request")
+    latency_budget_ms: Optional[int] = Field(
+        default=None, ge=100, le=120000,
+        description="Response time to aim for; a faster fallback model answers when the requested one is expected to miss it"
+    )
 
     @validator('message')
     def message_must_not_be_empty(cls, v):
@@ -61,6 +73,16 @@ class ChatRequest(BaseModel):
             return v[-50:]
         return v
 
+    @validator('context_hashes')
+    def context_hashes_valid(cls, v):
+        if v is None:
+            return v
+        v = v[-50:]  # Same limit as context
+        for digest in v:
+            if not MESSAGE_HASH_PATTERN.match(digest):
+                raise ValueError('Context hashes must be lowercase sha256 hex digests')
+        return v
+
     class Config:
         json_schema_extra = {
             "example": {
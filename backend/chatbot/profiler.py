@@ -0,0 +1,173 @@
+"""
+Opt-in sampling profiler for CodementorX Chatbot
+An admin can ask for a request to be profiled (X-Profile: 1). A background
+thread samples the event loop thread's stack at a fixed interval while the
+request runs, and the folded stacks ("frame;frame;frame count" lines, the
+input of flamegraph.pl, speedscope and similar) are stored on disk and
+served by id.
+
+The samples cover the worker's event loop thread, so requests running
+concurrently on the same worker appear in the profile too. Samples taken
+while the loop waits for I/O end in the selector and show idle time.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]+-[0-9]+-[0-9a-f]{8}$")
+
+
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds, counting folded stacks"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_duration: float = 30.0):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_duration = max_duration
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # Function granularity (first line), so a flame graph merges its lines
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+@dataclass
+class ActiveProfile:
+    """A request being profiled"""
+    profile_id: str
+    label: str
+    sampler: StackSampler
+    started: float = field(default_factory=time.perf_counter)
+
+
+class RequestProfiler:
+    """
+    Profiles one request at a time per worker (they would share samples
+    anyway) and keeps the latest `max_profiles` profiles in `directory`,
+    which the node's workers share
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        interval: float = 0.005,
+        max_duration: float = 30.0,
+        max_profiles: int = 50,
+    ):
+        self.directory = directory
+        self.interval = interval
+        self.max_duration = max_duration
+        self.max_profiles = max_profiles
+        os.makedirs(directory, exist_ok=True)
+
+        self._active: Optional[ActiveProfile] = None
+        self.profiles = 0
+        self.busy = 0
+
+    def start(self, label: str) -> Optional[ActiveProfile]:
+        """Start sampling this thread's event loop; None while another request is profiled"""
+        if self._active is not None:
+            self.busy += 1
+            return None
+        profile_id = f"{int(time.time())}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        sampler = StackSampler(threading.get_ident(), self.interval, self.max_duration)
+        sampler.start()
+        self._active = ActiveProfile(profile_id, label, sampler)
+        return self._active
+
+    def finish(self, profile: ActiveProfile) -> None:
+        """Stop sampling and store the folded stacks"""
+        profile.sampler.stop()
+        if self._active is profile:
+            self._active = None
+        elapsed = time.perf_counter() - profile.started
+        samples = sum(profile.sampler.samples.values())
+
+        path = os.path.join(self.directory, f"{profile.profile_id}.folded")
+        try:
+            with open(path, "w") as f:
+                f.write(profile.sampler.folded())
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Could not store profile {profile.profile_id}: {e}")
+            return
+        self.profiles += 1
+        logger.info(
+            f"Profiled {profile.label} as {profile.profile_id}: "
+            f"{samples} samples over {elapsed * 1000:.0f}ms"
+        )
+
+    def load(self, profile_id: str) -> Optional[str]:
+        """Folded stacks of a stored profile, None if unknown"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _prune(self) -> None:
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".folded"))
+        for name in names[:-self.max_profiles]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "directory": self.directory,
+            "interval_ms": self.interval * 1000,
+            "active": self._active.profile_id if self._active else None,
+            "profiles": self.profiles,
+            "busy": self.busy,
+        }
+
+
+def build_request_profiler() -> Optional[RequestProfiler]:
+    """Create the request profiler from environment configuration (None when disabled)"""
+    if not config("PROFILING_ENABLED", default=True, cast=bool):
+        return None
+    return RequestProfiler(
+        config("PROFILE_DIR", default="/tmp/codementorx-chatbot-profiles"),
+        interval=config("PROFILE_INTERVAL_MS", default=5, cast=float) / 1000,
+        max_duration=config("PROFILE_MAX_SECONDS", default=30, cast=float),
+        max_profiles=config("PROFILE_MAX_STORED", default=50, cast=int),
+    )
@@ -0,0 +1,254 @@
+"""
+Rate limiting for CodementorX Chatbot
+Per-user, per-action limits: an O(1) token bucket, in-process or in the
+node's shared state when running several workers, or a sliding window
+counter in a shared cache (Redis/Memcached) across nodes
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+_RATE_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(value: str) -> Tuple[int, int]:
+    """Parse "30/minute" or "100/3600" into (limit, window seconds)"""
+    limit, _, period = value.strip().partition("/")
+    period = period.strip().rstrip("s") or "minute"
+    window = _RATE_UNITS[period] if period in _RATE_UNITS else int(period)
+    return int(limit), window
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of one rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # Seconds until the limit is fully replenished
+    retry_after: float = 0.0  # Seconds until the next request would be allowed
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class TokenBucketLimiter:
+    """
+    In-process token buckets, one per key, refilled continuously at
+    limit/window tokens per second with a burst of `limit`
+    Each check is O(1); idle buckets are evicted LRU beyond max_keys
+    """
+
+    name = "local"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.checks = 0
+        self.rejected = 0
+
+    def take(self, key: str, limit: int, window: int) -> RateLimitResult:
+        """Consume one token for `key` if available"""
+        now = time.monotonic()
+        rate = limit / window
+        self.checks += 1
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(limit), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        tokens = bucket[0]
+        if tokens >= 1.0:
+            bucket[0] = tokens = tokens - 1.0
+            return RateLimitResult(True, limit, int(tokens), (limit - tokens) / rate)
+
+        self.rejected += 1
+        return RateLimitResult(
+            False, limit, 0, (limit - tokens) / rate, retry_after=(1.0 - tokens) / rate
+        )
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        return self.take(key, limit, window)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "keys": len(self._buckets),
+            "checks": self.checks,
+            "rejected": self.rejected,
+        }
+
+
+class SharedTokenBucketLimiter:
+    """
+    Token buckets in the node's shared state (shared_state.py), so every
+    worker process on the node draws from the same bucket per key
+    Backend errors fail open.
+    """
+
+    name = "shared"
+
+    def __init__(self, state):
+        self.state = state
+        self.checks = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        rate = limit / window
+        self.checks += 1
+        try:
+            allowed, tokens = self.state.take_token(key, limit, window)
+            if not allowed:
+                self.state.increment("rate_limit:rejected")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limit backend unavailable, allowing request: {e}")
+            return RateLimitResult(True, limit, limit, 0.0)
+
+        if allowed:
+            return RateLimitResult(True, limit, int(tokens), (limit - tokens) / rate)
+        self.rejected += 1
+        return RateLimitResult(
+            False, limit, 0, (limit - tokens) / rate, retry_after=(1.0 - tokens) / rate
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "node_rejected": self.state.counters("rate_limit:").get("rate_limit:rejected", 0),
+        }
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding window counter in a shared aiocache backend
+    The previous fixed window's count is weighted by its remaining overlap
+    with the sliding window, so limits hold across workers with two
+    counters per key. Backend errors fail open.
+    """
+
+    name = "aiocache"
+
+    def __init__(self, url: str, namespace: str = "rate_limit"):
+        from aiocache import Cache
+
+        self.url = url
+        self._cache = Cache.from_url(url)
+        self._cache.namespace = namespace
+        self.checks = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def hit(self, key: str, limit: int, window: int) -> RateLimitResult:
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        current_key = f"{key}:{index}"
+        self.checks += 1
+
+        try:
+            previous, current = await self._cache.multi_get([f"{key}:{index - 1}", current_key])
+            previous, current = int(previous or 0), int(current or 0)
+            weight = (window - elapsed) / window
+            count = previous * weight + current
+
+            if count + 1 > limit:
+                self.rejected += 1
+                if current + 1 > limit:
+                    retry_after = window - elapsed
+                else:
+                    # Wait until the previous window's share has decayed enough
+                    retry_after = (count + 1 - limit) / (previous / window)
+                return RateLimitResult(False, limit, 0, 2 * window - elapsed, retry_after)
+
+            if await self._cache.increment(current_key, 1) == 1:
+                await self._cache.expire(current_key, window * 2)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Rate limit backend unavailable, allowing request: {e}")
+            return RateLimitResult(True, limit, limit, 0.0)
+
+        return RateLimitResult(True, limit, max(0, int(limit - count - 1)), 2 * window - elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "url": self.url.split("@")[-1],
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+class RateLimiter:
+    """Per-action limits on top of a limiter backend"""
+
+    def __init__(self, backend, limits: Dict[str, Tuple[int, int]], enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.enabled = enabled
+
+    async def check(self, user_id: int, action: str) -> Optional[RateLimitResult]:
+        """Count one request; None when the action is not limited"""
+        if not self.enabled or action not in self.limits:
+            return None
+        limit, window = self.limits[action]
+        return await self.backend.hit(f"{action}:{user_id}", limit, window)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limits": {action: f"{limit}/{window}s" for action, (limit, window) in self.limits.items()},
+            **self.backend.stats(),
+        }
+
+
+def build_rate_limiter(shared_state=None) -> RateLimiter:
+    """
+    Create the rate limiter from environment configuration
+    RATE_LIMIT_URL selects a shared cache; otherwise buckets live in the
+    node's shared state when there is one, else in this process
+    """
+    url = config("RATE_LIMIT_URL", default="")
+    if url:
+        backend = SlidingWindowLimiter(url)
+    elif shared_state is not None:
+        backend = SharedTokenBucketLimiter(shared_state)
+    else:
+        backend = TokenBucketLimiter(
+            max_keys=config("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+        )
+    limits = {
+        "chat": parse_rate(config("RATE_LIMIT_CHAT", default="30/minute")),
+        "read": parse_rate(config("RATE_LIMIT_READ", default="120/minute")),
+        "write": parse_rate(config("RATE_LIMIT_WRITE", default="30/minute")),
+    }
+    enabled = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+    logger.info(f"Rate limiting: backend={backend.name}, enabled={enabled}")
+    return RateLimiter(backend, limits, enabled=enabled)
+
@@ -0,0 +1,373 @@
+"""
+Upstream resilience for CodementorX Chatbot
+Classified retries (connection errors, timeouts and 5xx with jittered
+exponential backoff; 429 after the provider's Retry-After), optional
+hedging (a second attempt when the first is slower than the model's recent
+p95), a per-request deadline, and a retry budget that caps retries and
+hedges to a fraction of requests so they cannot amplify an outage
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from decouple import config
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class UpstreamError(Exception):
+    """
+    An upstream call that failed for good (after any retries), with the
+    HTTP status to answer the client with: 502 for provider errors, 503
+    (with Retry-After) when the provider is overloaded, 504 on timeout
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status_code: int,
+        retry_after: Optional[int] = None,
+        overload: bool = False,
+    ):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        # Whether the failure signals an overloaded upstream (admission control)
+        self.overload = overload
+        super().__init__(message)
+
+
+def classify(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """(retryable, provider Retry-After seconds) for an upstream exception"""
+    import httpx
+    import openai  # Loaded by then (the service's client); kept off the import path
+
+    if isinstance(error, UpstreamError):
+        # Already final (e.g. an open circuit breaker)
+        return False, None
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, httpx.TransportError)):
+        return True, None
+    status_code = getattr(error, "status_code", None)
+    if status_code == 429:
+        return True, _retry_after(error)
+    if status_code is not None and status_code >= 500:
+        return True, _retry_after(error)
+    return False, None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        # HTTP-date form: fall back to backoff
+        return None
+
+
+def as_upstream_error(error: BaseException, attempts: int) -> UpstreamError:
+    """Client-facing error for a final upstream failure (no provider error text)"""
+    import openai
+
+    if isinstance(error, UpstreamError):
+        return error
+    tries = f" after {attempts} attempts" if attempts > 1 else ""
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+        upstream_error = UpstreamError(f"Model provider timed out{tries}", 504, overload=True)
+    elif getattr(error, "status_code", None) == 429:
+        retry_after = _retry_after(error)
+        upstream_error = UpstreamError(
+            f"Model provider is rate limiting requests{tries}", 503,
+            retry_after=max(1, math.ceil(retry_after or 1)), overload=True,
+        )
+    else:
+        retryable, _ = classify(error)
+        status_code = getattr(error, "status_code", None)
+        detail = f"status {status_code}" if status_code else type(error).__name__
+        upstream_error = UpstreamError(
+            f"Model provider error ({detail}){tries}", 502, overload=retryable
+        )
+    upstream_error.__cause__ = error
+    return upstream_error
+
+
+class RetryBudget:
+    """
+    Token bucket for extra attempts: every request deposits `ratio` tokens
+    (plus `min_per_second` over time, for low traffic), each retry or hedge
+    withdraws one
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._updated = time.monotonic()
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+        if self._tokens < 1.0:
+            self.exhausted += 1
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ratio": self.ratio,
+            "tokens": round(self._tokens, 2),
+            "exhausted": self.exhausted,
+        }
+
+
+class UpstreamPolicy:
+    """Runs upstream calls with retries, optional hedging and a deadline"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        deadline: float = 60.0,
+        base_backoff: float = 0.25,
+        max_backoff: float = 4.0,
+        max_retry_after: float = 10.0,
+        budget: Optional[RetryBudget] = None,
+        hedging: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+    ):
+        # Imported with the service's clients, off the module import path
+        import tenacity
+
+        self._tenacity = tenacity
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.budget = budget or RetryBudget()
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+
+        # Per model label (metrics.model_label bounds their number): latencies
+        # of hedge-eligible completions only; a stream open returns at the
+        # response headers and would pull the quantile down
+        self._latencies: Dict[str, Deque[float]] = {}
+        # Per model label: (sample count when computed, delay)
+        self._hedge_delays: Dict[str, Tuple[int, float]] = {}
+        self._samples: Dict[str, int] = {}
+
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.failures = 0
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        model: str,
+        hedge: bool = True,
+        breaker: Any = None,
+    ) -> T:
+        """
+        Await `fn()` (one upstream attempt) until it succeeds, retrying
+        retryable errors while attempts, budget and deadline allow. Each
+        attempt is admitted by and reported to `breaker` (circuit_breaker.py)
+        hedge=False for calls that must not be hedged and whose latency
+        says nothing about a completion's (stream opens)
+        Raises UpstreamError when it fails for good
+        """
+        self.calls += 1
+        self.budget.deposit()
+        retrying = self._tenacity.AsyncRetrying(
+            stop=self._tenacity.stop_after_attempt(self.max_attempts),
+            wait=self._wait,
+            retry=self._should_retry,
+            before_sleep=lambda state: self._before_retry(state, model),
+            reraise=True,
+        )
+        attempts = 0
+        try:
+            async with asyncio.timeout(self.deadline):
+                async for attempt in retrying:
+                    with attempt:
+                        attempts += 1
+                        result = await self._attempt(fn, model, hedge, breaker)
+            return result
+        except TimeoutError as e:
+            self.deadline_exceeded += 1
+            self.failures += 1
+            raise UpstreamError(
+                f"Model provider did not answer within {self.deadline:.0f}s", 504, overload=True
+            ) from e
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            raise as_upstream_error(e, attempts)
+
+    def _should_retry(self, retry_state: Any) -> bool:
+        """Retry retryable errors while attempts remain and the budget allows"""
+        error = retry_state.outcome.exception()
+        if error is None or retry_state.attempt_number >= self.max_attempts:
+            return False
+        retryable, _ = classify(error)
+        return retryable and self.budget.try_withdraw()
+
+    def _wait(self, retry_state: Any) -> float:
+        """Provider's Retry-After when given (capped), else full-jitter exponential backoff"""
+        _, retry_after = classify(retry_state.outcome.exception())
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        ceiling = min(self.max_backoff, self.base_backoff * 2 ** (retry_state.attempt_number - 1))
+        return random.uniform(0, ceiling)
+
+    def _before_retry(self, retry_state: Any, model: str) -> None:
+        self.retries += 1
+        error = retry_state.outcome.exception()
+        reason = str(getattr(error, "status_code", None) or type(error).__name__)
+        metrics.UPSTREAM_RETRIES.labels(metrics.model_label(model), reason).inc()
+        logger.warning(
+            "Retrying upstream call to %s in %.2fs (attempt %d failed: %s)",
+            model, retry_state.next_action.sleep, retry_state.attempt_number, reason,
+        )
+
+    async def _attempt(
+        self, fn: Callable[[], Awaitable[T]], model: str, hedge: bool, breaker: Any = None
+    ) -> T:
+        # Only calls that may be hedged feed the hedge delay
+        record = hedge
+        # No hedging while the breaker is probing or open
+        hedge = hedge and self.hedging and (breaker is None or breaker.state == "closed")
+        delay = self.hedge_delay(model) if hedge else None
+        if delay is None:
+            return await self._timed(fn, model, breaker, record)
+
+        first = asyncio.create_task(self._timed(fn, model, breaker, record))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self.budget.try_withdraw():
+            return await first
+
+        # Slower than the model's recent p95: race a second attempt
+        self.hedges += 1
+        second = asyncio.create_task(self._timed(fn, model, breaker, record))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        won = task is second
+                        if won:
+                            self.hedge_wins += 1
+                        metrics.UPSTREAM_HEDGES.labels(
+                            metrics.model_label(model), "won" if won else "lost"
+                        ).inc()
+                        return task.result()
+            # Both failed: report the original attempt's error
+            raise first.exception()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing attempt's error as retrieved
+                    task.exception()
+
+    async def _timed(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        model: str,
+        breaker: Any = None,
+        record: bool = True,
+    ) -> T:
+        probe = breaker.acquire() if breaker else False
+        start = time.perf_counter()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            if breaker:
+                breaker.record(probe, time.perf_counter() - start, cancelled=True)
+            raise
+        except Exception as e:
+            if breaker:
+                breaker.record(probe, time.perf_counter() - start, e)
+            raise
+        elapsed = time.perf_counter() - start
+        if breaker:
+            breaker.record(probe, elapsed)
+        if record:
+            key = metrics.model_label(model)
+            latencies = self._latencies.get(key)
+            if latencies is None:
+                latencies = self._latencies[key] = deque(maxlen=self.latency_window)
+            latencies.append(elapsed)
+            self._samples[key] = self._samples.get(key, 0) + 1
+        return result
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """The model's recent completion latency quantile, once there are enough samples"""
+        key = metrics.model_label(model)
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < self.hedge_min_samples:
+            return None
+        # Recomputed every tenth of the window's samples rather than per call
+        samples = self._samples[key]
+        cached = self._hedge_delays.get(key)
+        if cached is None or samples - cached[0] >= max(1, self.latency_window // 10):
+            ordered = sorted(latencies)
+            delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_quantile))]
+            cached = self._hedge_delays[key] = (samples, delay)
+        return cached[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "deadline_s": self.deadline,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "deadline_exceeded": self.deadline_exceeded,
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": {
+                model: round(delay * 1000, 1) for model, (_, delay) in self._hedge_delays.items()
+            },
+            "retry_budget": self.budget.stats(),
+        }
+
+
+def build_upstream_policy() -> UpstreamPolicy:
+    """Create the upstream retry/hedging policy from environment configuration"""
+    return UpstreamPolicy(
+        max_attempts=config("UPSTREAM_MAX_ATTEMPTS", default=3, cast=int),
+        deadline=config("UPSTREAM_DEADLINE", default=60.0, cast=float),
+        base_backoff=config("UPSTREAM_BACKOFF_BASE", default=0.25, cast=float),
+        max_backoff=config("UPSTREAM_BACKOFF_MAX", default=4.0, cast=float),
+        max_retry_after=config("UPSTREAM_MAX_RETRY_AFTER", default=10.0, cast=float),
+        budget=RetryBudget(
+            ratio=config("UPSTREAM_RETRY_BUDGET_RATIO", default=0.1, cast=float),
+            min_per_second=config("UPSTREAM_RETRY_BUDGET_MIN_PER_SECOND", default=1.0, cast=float),
+        ),
+        hedging=config("UPSTREAM_HEDGING_ENABLED", default=False, cast=bool),
+        hedge_quantile=config("UPSTREAM_HEDGE_QUANTILE", default=0.95, cast=float),
+    )
@@ -0,0 +1,173 @@
+"""
+Token revocation for CodementorX Chatbot
+Local copy of the Django service's revoked token list (users.RevokedToken),
+synced in the background so each check is an in-memory lookup with no
+per-request network call
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+SYNC_PATH = "/api/v1/auth/revoked-tokens/"
+
+
+class RevocationList:
+    """
+    Revoked JTIs mapped to their token's expiry
+
+    Only tokens that have not expired are kept: an expired token is
+    rejected by signature verification anyway, so entries are pruned at
+    each sync and the list is bounded by the revocations made within one
+    access token lifetime. The first sync fetches everything; later ones
+    ask only for tokens revoked since the previous sync (minus an overlap
+    for clock skew and in-flight commits).
+    """
+
+    def __init__(
+        self,
+        base_url: str = "",
+        signing_key: Optional[str] = None,
+        algorithm: str = "HS256",
+        sync_interval: float = 15.0,
+        overlap: float = 5.0,
+        timeout: float = 5.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.signing_key = signing_key
+        self.algorithm = algorithm
+        self.sync_interval = sync_interval
+        self.overlap = overlap
+        self.timeout = timeout
+
+        self._revoked: Dict[str, float] = {}
+        self._since: Optional[float] = None
+        self._client = None  # httpx.AsyncClient, created on first sync
+        self._task: Optional[asyncio.Task] = None
+
+        self.syncs = 0
+        self.sync_errors = 0
+        self.last_sync: Optional[float] = None
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url and self.signing_key)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        """Whether the token with this JTI was revoked"""
+        if not jti:
+            return False
+        expires_at = self._revoked.get(jti)
+        if expires_at is None or expires_at <= time.time():
+            return False
+        self.rejected += 1
+        return True
+
+    def add(self, jti: str, expires_at: float) -> None:
+        self._revoked[jti] = float(expires_at)
+
+    def prune(self) -> int:
+        """Drop entries whose tokens have expired"""
+        now = time.time()
+        expired = [jti for jti, expires_at in self._revoked.items() if expires_at <= now]
+        for jti in expired:
+            del self._revoked[jti]
+        return len(expired)
+
+    def _service_token(self) -> str:
+        """Short-lived token accepted by the Django IsInternalService permission"""
+        now = int(time.time())
+        return jwt.encode(
+            {"token_type": "service", "service": "chatbot", "iat": now, "exp": now + 60},
+            self.signing_key,
+            algorithm=self.algorithm,
+        )
+
+    async def sync(self) -> int:
+        """Fetch revocations from the Django service; returns the number received"""
+        if self._client is None:
+            import httpx
+
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+
+        params = {"since": f"{self._since:.3f}"} if self._since is not None else {}
+        response = await self._client.get(
+            SYNC_PATH,
+            params=params,
+            headers={"Authorization": f"Bearer {self._service_token()}"},
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        for jti, expires_at in data["revoked"]:
+            self.add(jti, expires_at)
+        self.prune()
+        self._since = float(data["server_time"]) - self.overlap
+        self.syncs += 1
+        self.last_sync = time.time()
+        return len(data["revoked"])
+
+    async def _sync_loop(self) -> None:
+        while True:
+            try:
+                received = await self.sync()
+                if received:
+                    logger.info(f"Synced {received} revoked token(s)")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving with the last known list
+                self.sync_errors += 1
+                logger.warning(f"Revoked token sync failed: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    async def start(self) -> None:
+        """Start the background sync"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "revoked": len(self._revoked),
+            "rejected": self.rejected,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "seconds_since_sync": round(time.time() - self.last_sync, 1) if self.last_sync else None,
+        }
+
+
+def build_revocation_list(signing_key: Optional[str], algorithm: str) -> RevocationList:
+    """Create the revocation list from environment configuration"""
+    base_url = ""
+    if config("REVOCATION_SYNC_ENABLED", default=True, cast=bool):
+        base_url = config("DJANGO_API_URL", default="")
+    revocation_list = RevocationList(
+        base_url=base_url,
+        signing_key=signing_key,
+        algorithm=algorithm,
+        sync_interval=config("REVOCATION_SYNC_INTERVAL", default=15.0, cast=float),
+    )
+    logger.info(
+        f"Token revocation sync: {revocation_list.base_url or 'disabled'}"
+        f" (every {revocation_list.sync_interval}s)"
+    )
+    return revocation_list
@@ -1,10 +1,13 @@
 """
-FastAPI Routes for Chatbot Service - localStorage Version
-API endpoints for chat functionality (stateless backend)
+FastAPI Routes for Chatbot Service
+API endpoints for chat functionality and server-side conversation history
 """
-from fastapi import APIRouter, HTTPException, Depends, Request, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Optional
+from starlette.requests import ClientDisconnect
+from typing import AsyncIterator, Awaitable, List, Optional, TypeVar
+import asyncio
 import logging
 
 from models import (
@@ -15,26 +18,47 @@ from models import (
     UserInfo,
     ErrorResponse
 )
-from services import ai_service
-from utils import verify_jwt_token, log_request, validate_conversation_id
+from services import AIService
+from context_window import ContextBudgetExceeded
+from context_store import MissingContextMessages
+from admission import AdmissionRejected
+from resilience import UpstreamError
+from rate_limit import RateLimitResult
+from timing import TimedRoute, current_timings, phase
+from utils import log_request, validate_conversation_id, format_sse_event
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Create router
-chat_router = APIRouter(prefix="/chat", tags=["Chat"])
+chat_router = APIRouter(prefix="/chat", tags=["Chat"], route_class=TimedRoute)
 
 # Security scheme
 security = HTTPBearer()
 
+# Logged (nginx's convention) for requests whose client left before the response
+CLIENT_CLOSED_REQUEST = 499
+
+T = TypeVar("T")
+
+# Services are created by the application lifespan (main.py) and live on app.state
+def get_ai_service(request: Request) -> AIService:
+    """Dependency returning the application's AIService"""
+    return request.app.state.ai_service
+
+
 # Dependency for JWT authentication
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInfo:
+async def get_current_user(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> UserInfo:
     """
     Dependency to verify JWT token and extract user info
     """
     try:
         token = credentials.credentials
-        user_info = verify_jwt_token(token)
+        with phase("auth"):
+            user_info = request.app.state.token_verifier.verify(token)
         return user_info
     except Exception as e:
         logger.error(f"JWT verification failed: {e}")
@@ -45,20 +69,245 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
 
 
+def rate_limit(action: str):
+    """
+    Dependency enforcing the current user's rate limit for `action`
+    Sets X-RateLimit-* headers, or raises 429 with Retry-After when exceeded
+    """
+    async def check_limit(
+        http_request: Request,
+        response: Response,
+        current_user: UserInfo = Depends(get_current_user)
+    ) -> Optional[RateLimitResult]:
+        rate_limiter = http_request.app.state.rate_limiter
+        with phase("rate_limit"):
+            result = await rate_limiter.check(current_user.user_id, action)
+        if result is None:
+            return None
+        if not result.allowed:
+            logger.warning(f"Rate limit exceeded for user {current_user.user_id} ({action})")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded, retry after {result.headers()['Retry-After']}s",
+                headers=result.headers()
+            )
+        response.headers.update(result.headers())
+        return result
+
+    return check_limit
+
+
+chat_rate_limit = rate_limit("chat")
+read_rate_limit = rate_limit("read")
+write_rate_limit = rate_limit("write")
+
+
+def require_admin(current_user: UserInfo = Depends(get_current_user)) -> UserInfo:
+    """Dependency allowing only users with the admin role"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin role required"
+        )
+    return current_user
+
+
+async def require_internal(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> None:
+    """
+    Dependency for the monitoring endpoints: allows other services
+    presenting a service token, and users with the admin role
+    """
+    if request.app.state.token_verifier.is_service_token(credentials.credentials):
+        return
+    require_admin(await get_current_user(request, credentials))
+
+
+async def profile_request(
+    request: Request,
+    current_user: UserInfo = Depends(get_current_user)
+) -> None:
+    """
+    Dependency starting a sampling profile of the request when an admin
+    sends X-Profile: 1; the response carries X-Profile-Id, and the profile
+    is stored once the response is complete (timing.ServerTimingMiddleware)
+    """
+    if request.headers.get("x-profile") != "1" or current_user.role != "admin":
+        return
+    profiler = request.app.state.profiler
+    timings = current_timings()
+    if profiler is None or timings is None or timings.profile is not None:
+        return
+    timings.profile = profiler.start(f"{request.method} {request.url.path}")
+
+
+def missing_context_error(error: MissingContextMessages) -> HTTPException:
+    """409 listing the context hashes the client must resend as full messages"""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": str(error), "missing_hashes": error.missing_hashes}
+    )
+
+
+def overloaded_error(error: AdmissionRejected) -> HTTPException:
+    """503 with Retry-After when admission control sheds the request"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def upstream_error(error: UpstreamError) -> HTTPException:
+    """502/503/504 for a failed upstream call, without the provider's error text"""
+    logger.error(f"Upstream call failed: {error} ({error.__cause__!r})")
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)} if error.retry_after else None
+    )
+
+
+async def cancel_on_disconnect(http_request: Request, work: Awaitable[T]) -> T:
+    """
+    Await `work`, cancelling it when the client disconnects first (tab
+    closed, frontend timeout) so the upstream call and its slot are given
+    up; raises ClientDisconnect then
+    """
+    task = asyncio.ensure_future(work)
+
+    async def wait_for_disconnect() -> None:
+        # The body has been read: the next message is the disconnect
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+    if task.done() and not task.cancelled():
+        return task.result()
+    # Let the call unwind (slot released, connection closed) before answering
+    await asyncio.wait({task})
+    if not task.cancelled() and task.exception() is None:
+        # Finished in the meantime
+        return task.result()
+    raise ClientDisconnect()
+
+
+def client_closed(http_request: Request, current_user: UserInfo) -> Response:
+    """Response for a request whose client has gone; nobody reads it"""
+    logger.info(
+        "Client disconnected from %s, cancelled the response for user %s",
+        http_request.url.path, current_user.user_id,
+    )
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body iterator however the response
+    ends. When the client disconnects mid-stream, Starlette cancels the send
+    loop and leaves the generator suspended until it is garbage collected,
+    and with it the upstream stream and the upstream slot
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+
+
+async def sse_response(
+    http_request: Request,
+    ai_service: AIService,
+    request: ChatRequest,
+    current_user: UserInfo,
+    limit: Optional[RateLimitResult] = None,
+    stored_context: bool = False
+) -> Response:
+    """
+    Start the AI response stream and wrap it as a text/event-stream response
+    With stored_context, a request without context continues from the
+    server-side history. Errors before the first byte map to HTTP errors;
+    errors after the stream has started are reported as an "error" event.
+    A client disconnect cancels the upstream call at any point
+    """
+    try:
+        if stored_context and not request.context and request.context_hashes is None:
+            request.context = await ai_service.get_stored_context(
+                request.conversation_id, current_user.user_id
+            )
+        events = await cancel_on_disconnect(
+            http_request, ai_service.stream_response(request, current_user)
+        )
+    except ClientDisconnect:
+        return client_closed(http_request, current_user)
+    except MissingContextMessages as e:
+        raise missing_context_error(e)
+    except AdmissionRejected as e:
+        raise overloaded_error(e)
+    except UpstreamError as e:
+        raise upstream_error(e)
+    except ContextBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error starting response stream: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate response: {str(e)}"
+        )
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in events:
+                yield format_sse_event(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"Error while streaming response: {e}")
+            yield format_sse_event("error", {"detail": "Failed to generate response"})
+        finally:
+            # Closed mid-stream (client gone): close the upstream stream now
+            await events.aclose()
+
+    return ClosingStreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+            # Returned responses bypass the dependency's header injection
+            **(limit.headers() if limit else {}),
+        },
+    )
+
+
 @chat_router.post(
     "/message",
     response_model=ChatResponse,
     status_code=status.HTTP_200_OK,
     summary="Send Chat Message",
-    description="Send a message to the AI chatbot and get a response (stateless)"
+    description="Send a message to the AI chatbot and get a response",
+    dependencies=[Depends(chat_rate_limit)]
 )
 async def send_message(
     request: ChatRequest,
-    current_user: UserInfo = Depends(get_current_user)
+    http_request: Request,
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Send a message to the AI chatbot - localStorage version (stateless)
-    Frontend manages all conversation persistence
+    Send a message to the AI chatbot
+    The exchange is persisted in the background when server-side storage is enabled;
+    the upstream call is cancelled if the client disconnects first
     """
     try:
         # Log the request
@@ -71,14 +320,26 @@ async def send_message(
                 detail="Message cannot be empty"
             )
         
-        # Generate AI response (no storage in backend)
-        response = await ai_service.generate_response(request, current_user)
-        
-        logger.info(f"Generated stateless response for user {current_user.user_id}")
-        return response
+        # Generate AI response (logged by the service)
+        return await cancel_on_disconnect(
+            http_request, ai_service.generate_response(request, current_user)
+        )
         
     except HTTPException:
         raise
+    except ClientDisconnect:
+        return client_closed(http_request, current_user)
+    except MissingContextMessages as e:
+        raise missing_context_error(e)
+    except AdmissionRejected as e:
+        raise overloaded_error(e)
+    except UpstreamError as e:
+        raise upstream_error(e)
+    except ContextBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error in send_message: {e}")
         raise HTTPException(
@@ -87,26 +348,59 @@ async def send_message(
         )
 
 
+@chat_router.post(
+    "/message/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream Chat Message",
+    description="Send a message to the AI chatbot and stream the response as Server-Sent Events"
+)
+async def stream_message(
+    request: ChatRequest,
+    http_request: Request,
+    current_user: UserInfo = Depends(get_current_user),
+    limit: Optional[RateLimitResult] = Depends(chat_rate_limit),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Streaming variant of send_message
+    Emits "delta" events with content fragments and a final "done" event
+    with the ChatResponse payload (conversation_id, model_used, token_usage)
+    """
+    log_request("POST", "/chat/message/stream", current_user.user_id)
+
+    if not request.message.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message cannot be empty"
+        )
+
+    return await sse_response(http_request, ai_service, request, current_user, limit)
+
+
 @chat_router.get(
     "/conversations",
     response_model=List[ConversationSummary],
     status_code=status.HTTP_200_OK,
     summary="Get User Conversations",
-    description="Returns empty list - localStorage version manages conversations on frontend"
+    description="List the user's stored conversations, most recent first (empty when server-side storage is disabled)",
+    dependencies=[Depends(read_rate_limit)]
 )
 async def get_conversations(
-    current_user: UserInfo = Depends(get_current_user)
+    limit: int = 50,
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Returns empty list - localStorage version manages conversations on frontend
-    Kept for API compatibility but not functional
+    Get the user's stored conversations
     """
     try:
         log_request("GET", "/chat/conversations", current_user.user_id)
-        
-        logger.info(f"get_conversations called for user {current_user.user_id} - localStorage version returns empty")
-        return []  # Frontend manages all conversations via localStorage
-        
+
+        conversations = await ai_service.get_user_conversations(
+            current_user.user_id, limit=max(1, min(limit, 200))
+        )
+        return conversations
+
     except Exception as e:
         logger.error(f"Error getting conversations: {e}")
         raise HTTPException(
@@ -120,14 +414,16 @@ async def get_conversations(
     response_model=ConversationHistory,
     status_code=status.HTTP_200_OK,
     summary="Get Conversation History",
-    description="Not functional in localStorage version - returns 404"
+    description="Get a stored conversation with its messages",
+    dependencies=[Depends(read_rate_limit)]
 )
 async def get_conversation(
     conversation_id: str,
-    current_user: UserInfo = Depends(get_current_user)
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Not functional in localStorage version - frontend manages conversation history
+    Get a stored conversation with its messages
     """
     try:
         log_request("GET", f"/chat/conversations/{conversation_id}", current_user.user_id)
@@ -139,12 +435,13 @@ async def get_conversation(
                 detail="Invalid conversation ID format"
             )
         
-        # Always return 404 since we don't store conversations on backend
-        logger.info(f"get_conversation called for {conversation_id} - localStorage version doesn't store conversations")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversations are managed in localStorage on frontend"
-        )
+        history = await ai_service.get_conversation_history(conversation_id, current_user.user_id)
+        if history is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+        return history
         
     except HTTPException:
         raise
@@ -160,14 +457,16 @@ async def get_conversation(
     "/conversations/{conversation_id}",
     status_code=status.HTTP_200_OK,
     summary="Delete Conversation",
-    description="Returns success - localStorage version manages deletion on frontend"
+    description="Delete a stored conversation and its messages",
+    dependencies=[Depends(write_rate_limit)]
 )
 async def delete_conversation(
     conversation_id: str,
-    current_user: UserInfo = Depends(get_current_user)
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Returns success - localStorage version manages deletion on frontend
+    Delete a stored conversation and its messages
     """
     try:
         log_request("DELETE", f"/chat/conversations/{conversation_id}", current_user.user_id)
@@ -179,12 +478,17 @@ async def delete_conversation(
                 detail="Invalid conversation ID format"
             )
         
-        logger.info(f"delete_conversation called for {conversation_id} - localStorage version always succeeds")
-        
+        deleted = await ai_service.delete_conversation(conversation_id, current_user.user_id)
+        if not deleted:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found"
+            )
+
+        logger.info(f"Deleted conversation {conversation_id} for user {current_user.user_id}")
         return {
-            "message": "Conversation deletion handled by frontend localStorage",
+            "message": "Conversation deleted",
             "conversation_id": conversation_id,
-            "note": "Backend doesn't store conversations in localStorage version"
         }
         
     except HTTPException:
@@ -202,16 +506,19 @@ async def delete_conversation(
     response_model=ChatResponse,
     status_code=status.HTTP_200_OK,
     summary="Continue Conversation",
-    description="Continue conversation - context provided by frontend via request"
+    description="Continue conversation - context provided by frontend via request",
+    dependencies=[Depends(chat_rate_limit)]
 )
 async def continue_conversation(
     conversation_id: str,
     request: ChatRequest,
-    current_user: UserInfo = Depends(get_current_user)
+    http_request: Request,
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Continue an existing conversation - localStorage version
-    Frontend provides all conversation context in the request
+    Continue an existing conversation
+    Uses the context in the request if provided, otherwise the stored history
     """
     try:
         log_request("POST", f"/chat/conversations/{conversation_id}/continue", current_user.user_id)
@@ -233,17 +540,34 @@ async def continue_conversation(
         # Set conversation ID in request
         request.conversation_id = conversation_id
         
-        # Frontend should have provided conversation context in request.context
-        # No need to fetch from backend since we don't store anything
+        # Fall back to server-side history when the client sends no context
+        if not request.context and request.context_hashes is None:
+            request.context = await ai_service.get_stored_context(
+                conversation_id, current_user.user_id
+            )
         
-        # Generate response using provided context
-        response = await ai_service.generate_response(request, current_user)
+        response = await cancel_on_disconnect(
+            http_request, ai_service.generate_response(request, current_user)
+        )
         
-        logger.info(f"Continued conversation {conversation_id} for user {current_user.user_id}")
+        logger.info("Continued conversation %s for user %s", conversation_id, current_user.user_id)
         return response
         
     except HTTPException:
         raise
+    except ClientDisconnect:
+        return client_closed(http_request, current_user)
+    except MissingContextMessages as e:
+        raise missing_context_error(e)
+    except AdmissionRejected as e:
+        raise overloaded_error(e)
+    except UpstreamError as e:
+        raise upstream_error(e)
+    except ContextBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error continuing conversation: {e}")
         raise HTTPException(
@@ -252,43 +576,66 @@ async def continue_conversation(
         )
 
 
+@chat_router.post(
+    "/conversations/{conversation_id}/continue/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream Continue Conversation",
+    description="Continue conversation and stream the response as Server-Sent Events"
+)
+async def stream_continue_conversation(
+    conversation_id: str,
+    request: ChatRequest,
+    http_request: Request,
+    current_user: UserInfo = Depends(get_current_user),
+    limit: Optional[RateLimitResult] = Depends(chat_rate_limit),
+    ai_service: AIService = Depends(get_ai_service)
+):
+    """
+    Streaming variant of continue_conversation
+    """
+    log_request("POST", f"/chat/conversations/{conversation_id}/continue/stream", current_user.user_id)
+
+    if not validate_conversation_id(conversation_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid conversation ID format"
+        )
+
+    if not request.message.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message cannot be empty"
+        )
+
+    request.conversation_id = conversation_id
+    return await sse_response(
+        http_request, ai_service, request, current_user, limit, stored_context=True
+    )
+
+
 @chat_router.get(
     "/models",
     status_code=status.HTTP_200_OK,
     summary="Get Available Models",
-    description="Get list of available AI models"
+    description="Get list of available AI models",
+    dependencies=[Depends(read_rate_limit)]
 )
 async def get_available_models(
-    current_user: UserInfo = Depends(get_current_user)
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
     Get list of available AI models
+    A model is available while at least one of its endpoints is healthy
     """
     try:
         log_request("GET", "/chat/models", current_user.user_id)
-        
-        # Return list of available models
-        models = [
-            {
-                "id": "gpt-3.5-turbo",
-                "name": "GPT-3.5 Turbo",
-                "description": "Fast and efficient model for general conversations",
-                "max_tokens": 4096,
-                "available": True
-            },
-            {
-                "id": "gpt-4o-mini", 
-                "name": "GPT-4o Mini",
-                "description": "Efficient and capable model for coding and technical questions",
-                "max_tokens": 16384,
-                "available": True
-            }
-        ]
+
         return {
-            "models": models,
-            "default_model": "gpt-4o-mini"
+            "models": ai_service.router.catalog(),
+            "default_model": ai_service.default_model
         }
-        
+
     except Exception as e:
         logger.error(f"Error getting models: {e}")
         raise HTTPException(
@@ -297,36 +644,73 @@ async def get_available_models(
         )
 
 
+@chat_router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Get Request Profile",
+    description="Folded stacks of a profiled request (admin only), for flame graph tools",
+)
+async def get_profile(
+    profile_id: str,
+    request: Request,
+    current_user: UserInfo = Depends(require_admin)
+):
+    """
+    Folded stacks recorded for a request sent with X-Profile: 1
+    """
+    profiler = request.app.state.profiler
+    folded = profiler.load(profile_id) if profiler else None
+    if folded is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return PlainTextResponse(folded)
+
+
 @chat_router.get(
     "/stats",
     status_code=status.HTTP_200_OK,
     summary="Get User Chat Stats",
-    description="Returns basic stats - localStorage version has limited backend stats"
+    description="Conversation and message totals for the current user",
+    dependencies=[Depends(read_rate_limit)]
 )
 async def get_chat_stats(
-    current_user: UserInfo = Depends(get_current_user)
+    current_user: UserInfo = Depends(get_current_user),
+    ai_service: AIService = Depends(get_ai_service)
 ):
     """
-    Returns basic stats - localStorage version has limited backend stats
+    Conversation and message totals for the current user
     """
     try:
         log_request("GET", "/chat/stats", current_user.user_id)
         
-        # Return basic stats since we don't store conversations
-        stats = {
+        user_stats = await ai_service.get_user_stats(current_user.user_id)
+        if user_stats is None:
+            # Server-side storage disabled: the frontend keeps the history
+            return {
+                "user_id": current_user.user_id,
+                "total_conversations": 0,
+                "total_messages": 0,
+                "recent_conversation": None,
+                "storage_type": "localStorage",
+                "note": "Detailed stats are managed by frontend localStorage"
+            }
+
+        recent = await ai_service.get_user_conversations(current_user.user_id, limit=1)
+        return {
             "user_id": current_user.user_id,
-            "total_conversations": 0,  # Frontend manages this
-            "total_messages": 0,       # Frontend manages this
-            "recent_conversation": None,
-            "storage_type": "localStorage",
-            "note": "Detailed stats are managed by frontend localStorage"
+            "total_conversations": user_stats["total_conversations"],
+            "total_messages": user_stats["total_messages"],
+            "last_activity": user_stats["last_activity"],
+            "recent_conversation": recent[0] if recent else None,
+            "storage_type": ai_service.conversation_store.backend,
         }
         
-        return stats
-        
     except Exception as e:
         logger.error(f"Error getting chat stats: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get chat stats: {str(e)}"
-        )
\ No newline at end of file
+        )
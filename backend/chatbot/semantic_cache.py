@@ -0,0 +1,213 @@
+"""
+Semantic response cache for CodementorX Chatbot
+Answers reworded repeats of a prompt: a hit needs the same content words
+in the same order, only filler words ("please", "can i" / "do i") and
+punctuation or case may differ
+
+A lexical vector score cannot decide hits: prompts asking different
+things with the same words ("Django 4.2" / "Django 2.2", POST / DELETE)
+score well above genuine rewordings. Entries are therefore looked up by
+their content words, and the score of a local hashing vectorizer (no
+network, no embedding model) is only reported. Off by default.
+"""
+import hashlib
+import logging
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^a-z0-9_+#.]+")
+
+# Words a paraphrase may add, drop or swap without changing the question
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "please", "hi", "hey", "thanks", "just", "so",
+    "i", "me", "my", "you", "can", "could", "would", "will", "do", "does",
+})
+
+# Upper edges of the similarity histogram buckets
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def content_words(text: str) -> Tuple[str, ...]:
+    """The prompt's words in order, without filler words or trailing dots"""
+    words = (word.rstrip(".") for word in normalize_prompt(text).split())
+    return tuple(word for word in words if word and word not in FILLER_WORDS)
+
+
+class HashingVectorizer:
+    """
+    Signed feature hashing of word unigrams, word bigrams and character
+    4-grams into a fixed-size, L2-normalized float32 vector
+    """
+
+    def __init__(self, dim: int = 256, char_ngram: int = 4):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = text.split()
+        features = [(w, 1.0) for w in words]
+        features += [(f"{a} {b}", 1.0) for a, b in zip(words, words[1:])]
+        n = self.char_ngram
+        padded = f" {text} "
+        features += [(padded[i:i + n], 0.5) for i in range(len(padded) - n + 1)]
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(normalize_prompt(text)):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """
+    Bounded LRU of recent prompts' completions, keyed by partition and a
+    hash of the prompt's content words, so a lookup is one dict access
+
+    Entries are partitioned by model, sampling parameters, system prompt
+    and context. The cosine similarity of the hashed vectors of the cached
+    and the asked prompt is only reported (per hit, and in the similarity
+    histogram): with equal content words it measures how much the filler
+    words differ, not whether the answer applies.
+    """
+
+    def __init__(self, capacity: int = 10000, dim: int = 256, ttl: int = 3600):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.vectorizer = HashingVectorizer(dim=dim)
+
+        # (partition, content words digest) -> (value, float16 vector, expires_at)
+        self._entries: "OrderedDict[Tuple[int, bytes], Tuple[Any, np.ndarray, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+        self.similarity_histogram = [0] * len(SIMILARITY_BUCKETS)
+
+    @staticmethod
+    def partition_key(
+        model: str,
+        system_prompt: str,
+        context: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+    ) -> int:
+        """
+        Stable non-zero int64 identifying which entries may answer a prompt
+        An answer cut off at a small max_tokens, or sampled at another
+        temperature, is not served to a request with different parameters
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(model.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(f"{max_tokens}:{temperature}".encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(system_prompt.encode("utf-8"))
+        for message in context:
+            digest.update(b"\x00")
+            digest.update(message["role"].encode("utf-8"))
+            digest.update(b"\x01")
+            digest.update(message["content"].encode("utf-8"))
+        return int.from_bytes(digest.digest(), "little", signed=True) or 1
+
+    @staticmethod
+    def _key(prompt: str, partition: int) -> Optional[Tuple[int, bytes]]:
+        words = content_words(prompt)
+        if not words:
+            return None
+        digest = hashlib.blake2b("\x00".join(words).encode("utf-8"), digest_size=16).digest()
+        return partition, digest
+
+    def lookup(self, prompt: str, partition: int) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (cached value, similarity) for a prompt with the same content words"""
+        start = time.perf_counter()
+        result = None
+
+        key = self._key(prompt, partition)
+        entry = self._entries.get(key) if key else None
+        if entry is not None:
+            value, vector, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+            else:
+                self._entries.move_to_end(key)
+                similarity = float(vector.astype(np.float32) @ self.vectorizer.transform(prompt))
+                result = (value, similarity)
+
+        self._record(result, time.perf_counter() - start)
+        return result
+
+    def add(self, prompt: str, partition: int, value: Dict[str, Any]) -> None:
+        """Index a prompt and its cached completion"""
+        key = self._key(prompt, partition)
+        if key is None:
+            return
+
+        vector = self.vectorizer.transform(prompt).astype(np.float16)
+        self._entries[key] = (value, vector, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _record(self, result: Optional[Tuple[Dict[str, Any], float]], elapsed: float) -> None:
+        self.lookup_seconds += elapsed
+        if result is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        for i, edge in enumerate(SIMILARITY_BUCKETS):
+            if result[1] <= edge:
+                self.similarity_histogram[i] += 1
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "avg_lookup_ms": round(self.lookup_seconds / lookups * 1000, 4) if lookups else 0.0,
+            # Hits only, by the similarity of the cached and the asked prompt
+            "similarity_histogram": {
+                f"le_{edge}": count
+                for edge, count in zip(SIMILARITY_BUCKETS, self.similarity_histogram)
+            },
+        }
+
+
+def build_semantic_cache() -> Optional[SemanticCache]:
+    """Create the semantic cache from environment configuration"""
+    if not config("SEMANTIC_CACHE_ENABLED", default=False, cast=bool):
+        return None
+
+    cache = SemanticCache(
+        capacity=config("SEMANTIC_CACHE_MAX_ENTRIES", default=10000, cast=int),
+        dim=config("SEMANTIC_CACHE_DIM", default=256, cast=int),
+        ttl=config("SEMANTIC_CACHE_TTL", default=3600, cast=int),
+    )
+    logger.info(f"Semantic cache: capacity={cache.capacity}")
+    return cache
@@ -1,19 +1,33 @@
 """
 AI Services for CodementorX Chatbot
-Business logic for chat functionality - localStorage version (stateless backend)
+Business logic for chat functionality, with optional server-side conversation storage
 """
 
 import os
+import time
 import uuid
 import logging
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import weakref
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, List, Dict, Any, Optional, Tuple
 
 from dotenv import load_dotenv
 from decouple import config
-from openai import AsyncOpenAI
 
-from models import ChatMessage, ChatRequest, ChatResponse, UserInfo, ConversationHistory
+from models import ChatMessage, ChatRequest, ChatResponse, MessageRole, UserInfo, ConversationHistory
+from cache import build_response_cache, make_cache_key
+from context_window import ContextBudgetExceeded, TokenCounter, get_prompt_budget, pack_context
+from summarizer import SUMMARY_FLOW, SUMMARY_ROLE, build_summarizer
+from storage import build_conversation_store
+from context_store import MissingContextMessages, build_context_store
+from singleflight import SingleFlight
+from admission import AdmissionRejected, build_admission_controller
+from resilience import UpstreamError, build_upstream_policy
+from circuit_breaker import build_circuit_breakers
+from model_router import Route, build_model_router
+import metrics
+from timing import phase, record
 
 # Load environment variables
 load_dotenv()
@@ -23,22 +37,53 @@ logger = logging.getLogger("services")
 
 
 class AIService:
-    """AI service for handling chat functionality - stateless version"""
+    """AI service for handling chat functionality"""
+
+    def __init__(self, shared_state=None):
+        # Heavy clients are imported here, during application startup
+        # (main.lifespan), so importing this module stays cheap
+        from semantic_cache import build_semantic_cache
 
-    def __init__(self):
-        # OpenAI Configuration
-        self.api_key = config("OPENAI_API_KEY")
-        self.api_base = config("OPENAI_API_BASE", default="https://api.openai.com/v1")
         self.default_model = config("AI_MODEL_NAME", default="gpt-4o-mini")
 
-        # OpenAI async client
-        self.openai_client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=self.api_base,
-        )
+        # Fail fast on a degraded model instead of waiting out timeouts
+        self.circuit_breakers = build_circuit_breakers()
+        # Model endpoints, each an OpenAI async client over its own explicitly
+        # configured connection pool, and the per-request choice among them
+        self.router = build_model_router(self.circuit_breakers)
+        self.upstream = self.router.default_endpoint.pool
+        self.openai_client = self.router.default_endpoint.client
+        self.upstream_policy = build_upstream_policy()
 
         self.system_prompt = self._get_system_prompt()
 
+        # Response caches: exact match, then near-duplicate prompts
+        self.response_cache = build_response_cache(shared_state)
+        self.semantic_cache = build_semantic_cache()
+
+        # Bounded, adaptive upstream concurrency
+        self.admission = build_admission_controller()
+
+        # Identical concurrent requests share one upstream call
+        self.single_flight = (
+            SingleFlight() if config("SINGLE_FLIGHT_ENABLED", default=True, cast=bool) else None
+        )
+
+        # Token counting for budget-aware context packing, within a
+        # deployment-wide cap on prompt tokens per request (0 disables it)
+        self.token_counter = TokenCounter()
+        self.max_prompt_tokens = config("MAX_PROMPT_TOKENS", default=8000, cast=int)
+
+        # Rolling summaries stand in for older turns that no longer fit the budget
+        self.summarizer = build_summarizer(self._complete_summary, self.default_model)
+
+        # Recently seen messages, referenced by clients via context_hashes
+        self.context_store = build_context_store(shared_state)
+
+        # Server-side conversation storage (None keeps the backend stateless)
+        self.conversation_store = build_conversation_store()
+        self.stored_context_messages = config("CHAT_STORED_CONTEXT_MESSAGES", default=50, cast=int)
+
     def _get_system_prompt(self) -> str:
         """Default system prompt for CodementorX"""
         return """You are CodementorX, an expert AI assistant specializing in software development, programming, and technology.
@@ -65,103 +110,673 @@ Guidelines:
     async def generate_response(
         self, request: ChatRequest, user: UserInfo
     ) -> ChatResponse:
-        """Generate AI response for user message - stateless version"""
+        """Generate AI response for user message"""
+        requested_at = datetime.now(timezone.utc)
         try:
             # Generate new conversation ID if not provided
             conversation_id = request.conversation_id or str(uuid.uuid4())
             
-            # Prepare messages for AI API call
-            messages = self._prepare_messages(request)
-
-            # Call OpenAI API
-            response = await self.openai_client.chat.completions.create(
-                model=request.model or self.default_model,
-                messages=messages,
-                temperature=request.temperature or 0.7,
-                max_tokens=request.max_tokens or 1000,
-            )
+            # Route first: the context is packed for the model that will answer
+            route = self._route(request)
+            with phase("context"):
+                context = self._resolve_context(request, user)
+                messages, context_stats = self._prepare_messages(request, user, context, route.model)
+            params = self._completion_params(request, messages, route)
 
-            ai_message = response.choices[0].message.content
-            
-            # Extract token usage if available
-            token_usage = (
-                {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                }
-                if response.usage
-                else None
-            )
+            # Serve identical or near-duplicate requests from cache
+            cache_key = self._cache_key(request, params)
+            with phase("cache"):
+                cached = await self._lookup_cache(request, params, cache_key)
+            if cached:
+                logger.info("Response cache hit (%s) for user %s", cached["cache_tier"], user.user_id)
+                chat_response = self._build_chat_response(
+                    request, user, conversation_id, cached["message"],
+                    cached.get("token_usage"), cached=cached, context_stats=context_stats,
+                    route=route,
+                )
+                self._record_exchange(request, user, chat_response, requested_at)
+                return chat_response
 
-            # Create response object - no storage needed, frontend handles persistence
-            chat_response = ChatResponse(
-                message=ai_message,
-                conversation_id=conversation_id,
-                model_used=request.model or self.default_model,
-                token_usage=token_usage,
-                metadata={
-                    "user_id": user.user_id,
-                    "user_email": user.email,
-                    "stateless": True  # Indicates this is localStorage version
-                },
+            # Call OpenAI API, sharing the call with identical in-flight requests.
+            # A request joining another's call takes no upstream slot (only the
+            # leader queues for admission); it is charged a nominal share in
+            # its user's fair queue instead
+            flight_key = self._flight_key(request, params, cache_key)
+            if flight_key:
+                (ai_message, token_usage), coalesced = await self.single_flight.do(
+                    flight_key,
+                    lambda: self._complete(request, user, params, cache_key, route),
+                    on_join=(
+                        (lambda: self.admission.charge_coalesced(user.user_id))
+                        if self.admission else None
+                    ),
+                )
+            else:
+                ai_message, token_usage = await self._complete(request, user, params, cache_key, route)
+                coalesced = False
+
+            chat_response = self._build_chat_response(
+                request, user, conversation_id, ai_message, token_usage,
+                context_stats=context_stats, route=route,
             )
+            chat_response.metadata["coalesced"] = coalesced
+            self._record_exchange(request, user, chat_response, requested_at)
 
             logger.info(
-                f"Generated stateless response for user {user.user_id} in conversation {conversation_id}"
+                "Generated response for user %s in conversation %s", user.user_id, conversation_id
             )
             return chat_response
 
+        except (ContextBudgetExceeded, MissingContextMessages, AdmissionRejected, UpstreamError):
+            raise
         except Exception as e:
             logger.error(f"Error generating AI response: {e}")
             raise Exception(f"Failed to generate response: {str(e)}")
 
-    def _prepare_messages(self, request: ChatRequest) -> List[Dict[str, str]]:
-        """Prepare messages for AI API call"""
-        messages = []
-        
-        # Add system prompt
-        system_prompt = request.system_prompt or self.system_prompt
-        messages.append({"role": "system", "content": system_prompt})
+    async def stream_response(
+        self, request: ChatRequest, user: UserInfo
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Start a streamed AI response for user message
+        Context packing, cache lookup and opening the upstream stream happen
+        here, so their errors surface before the HTTP response starts. The
+        returned iterator yields "delta" events with content fragments, then
+        a single "done" event with the same payload as ChatResponse
+        """
+        requested_at = datetime.now(timezone.utc)
+        conversation_id = request.conversation_id or str(uuid.uuid4())
+        route = self._route(request, stream=True)
+        with phase("context"):
+            context = self._resolve_context(request, user)
+            messages, context_stats = self._prepare_messages(request, user, context, route.model)
+        params = self._completion_params(request, messages, route)
+
+        # A cache hit is replayed as a single delta
+        cache_key = self._cache_key(request, params)
+        with phase("cache"):
+            cached = await self._lookup_cache(request, params, cache_key)
+        if cached:
+            chat_response = self._build_chat_response(
+                request, user, conversation_id, cached["message"],
+                cached.get("token_usage"), cached=cached, context_stats=context_stats,
+                route=route,
+            )
+            self._record_exchange(request, user, chat_response, requested_at)
+            return self._replay_cached(chat_response)
 
-        # Add context from previous messages (sent by frontend)
-        for msg in request.context[-10:]:  # Last 10 messages for context
-            messages.append({"role": msg.role.value, "content": msg.content})
+        # The upstream slot is held until the stream ends
+        breaker = self._circuit_breaker(route)
+        with phase("queue"):
+            slot = await self.admission.acquire(user.user_id, user.role) if self.admission else None
+        started = time.perf_counter()
+        try:
+            # Ask the provider to append a usage chunk to the stream; opening
+            # it is retried, a stream that has started is not (no hedging)
+            stream = await self.upstream_policy.call(
+                lambda: self._create(
+                    route,
+                    params,
+                    stream=True,
+                    extra_body={"stream_options": {"include_usage": True}},
+                ),
+                params["model"],
+                hedge=False,
+                breaker=breaker,
+            )
+        except BaseException as e:
+            metrics.observe_upstream(params["model"], time.perf_counter() - started, e)
+            if slot:
+                slot.release(e)
+            if metrics.is_cancellation(e):
+                metrics.record_cancelled(params["model"], "stream", 0, params["max_tokens"])
+            if isinstance(e, Exception):
+                self.router.observe(route.target, None, e)
+                if not isinstance(e, UpstreamError):
+                    logger.error(f"Error starting AI response stream: {e}")
+            raise
 
-        # Add current user message
-        messages.append({"role": "user", "content": request.message})
-        
-        return messages
+        # Until the response headers; the rest of the stream follows the Server-Timing header
+        record("upstream", time.perf_counter() - started)
+        if slot:
+            slot.mark_ready()
+        events = self._stream_events(
+            stream, request, user, conversation_id, params, cache_key, context_stats,
+            route, slot, started, requested_at,
+        )
+        if slot:
+            # Covers a response dropped before its body was iterated
+            weakref.finalize(events, slot.release)
+        return events
 
-    # NOTE: All conversation storage methods removed since we're using localStorage
-    # The frontend will handle all conversation persistence
+    async def _stream_events(
+        self,
+        stream: Any,
+        request: ChatRequest,
+        user: UserInfo,
+        conversation_id: str,
+        params: Dict[str, Any],
+        cache_key: Optional[str],
+        context_stats: Dict[str, Any],
+        route: Route,
+        slot: Any = None,
+        started: Optional[float] = None,
+        requested_at: Optional[datetime] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Forward upstream chunks as delta events, then emit the done event"""
+        started = started or time.perf_counter()
+        parts: List[str] = []
+        token_usage = None
+        error = None
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    token_usage = self._extract_token_usage(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        first_token = time.perf_counter() - started
+                        metrics.observe_first_token(params["model"], first_token)
+                        self.router.observe_first_token(route.target, first_token)
+                    parts.append(delta)
+                    yield {"event": "delta", "data": {"content": delta}}
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            metrics.observe_upstream(params["model"], time.perf_counter() - started, error)
+            if error is None or isinstance(error, Exception):
+                self.router.observe(route.target, None, error)
+            if metrics.is_cancellation(error):
+                # The client went away mid-stream; closing the response below
+                # drops the connection, which stops generation upstream
+                metrics.record_cancelled(params["model"], "stream", len(parts), params["max_tokens"])
+            if slot:
+                slot.release(error)
+            await stream.response.aclose()
+        metrics.record_tokens(params["model"], token_usage)
 
-    async def get_conversation_history(
-        self, conversation_id: str, user_id: int
-    ) -> Optional[ConversationHistory]:
+        ai_message = "".join(parts)
+        await self._store_cache(request, params, cache_key, ai_message, token_usage)
+
+        chat_response = self._build_chat_response(
+            request, user, conversation_id, ai_message, token_usage,
+            context_stats=context_stats, route=route,
+        )
+        chat_response.metadata["streamed"] = True
+        self._record_exchange(request, user, chat_response, requested_at)
+
+        logger.info(
+            "Streamed response for user %s in conversation %s", user.user_id, conversation_id
+        )
+        yield {"event": "done", "data": chat_response.model_dump(mode="json")}
+
+    async def _complete(
+        self,
+        request: ChatRequest,
+        user: UserInfo,
+        params: Dict[str, Any],
+        cache_key: Optional[str],
+        route: Route,
+    ) -> Tuple[str, Optional[Dict[str, int]]]:
+        """One upstream completion; the result is cached for later requests"""
+        try:
+            response = await self._call_upstream(route, params, user.user_id, user.role)
+        except BaseException as e:
+            if metrics.is_cancellation(e):
+                # The client went away (every client sharing the call, with single-flight)
+                metrics.record_cancelled(params["model"], "completion", 0, params["max_tokens"])
+            raise
+        ai_message = response.choices[0].message.content
+
+        # Extract token usage if available
+        token_usage = self._extract_token_usage(response.usage)
+        metrics.record_tokens(params["model"], token_usage)
+
+        await self._store_cache(request, params, cache_key, ai_message, token_usage)
+        return ai_message, token_usage
+
+    async def _complete_summary(
+        self, model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float
+    ) -> str:
+        """
+        Conversation summary completion (summarizer.py), on the same upstream
+        path as chat completions, queued in the low-priority background class
+        and never hedged
+        """
+        route = self.router.route(model, False, None)
+        params = {
+            "model": route.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        response = await self._call_upstream(route, params, SUMMARY_FLOW, SUMMARY_ROLE, hedge=False)
+        metrics.record_tokens(params["model"], self._extract_token_usage(response.usage))
+        return response.choices[0].message.content or ""
+
+    async def _call_upstream(
+        self,
+        route: Route,
+        params: Dict[str, Any],
+        flow: Any,
+        role: Optional[str],
+        hedge: bool = True,
+    ) -> Any:
         """
-        NOT USED in localStorage version - frontend manages all conversation data
-        This endpoint can be removed or return empty for backwards compatibility
+        One chat completion through admission (fair-queued as `flow` with
+        `role`'s weight), the route's circuit breaker and the retry/hedge
+        policy, observed by metrics and the router
         """
-        logger.info(f"get_conversation_history called but not implemented in localStorage version")
+        breaker = self._circuit_breaker(route)
+        queued = time.perf_counter()
+        async with self._upstream_slot(flow, role):
+            started = time.perf_counter()
+            record("queue", started - queued)
+            try:
+                response = await self.upstream_policy.call(
+                    lambda: self._create(route, params),
+                    params["model"],
+                    hedge=hedge,
+                    breaker=breaker,
+                )
+            except BaseException as e:
+                metrics.observe_upstream(params["model"], time.perf_counter() - started, e)
+                if isinstance(e, Exception):
+                    self.router.observe(route.target, None, e)
+                raise
+            elapsed = time.perf_counter() - started
+            record("upstream", elapsed)
+            metrics.observe_upstream(params["model"], elapsed)
+            self.router.observe(route.target, elapsed)
+        return response
+
+    @staticmethod
+    async def _replay_cached(chat_response: ChatResponse) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a cached response as a single delta"""
+        chat_response.metadata["streamed"] = True
+        yield {"event": "delta", "data": {"content": chat_response.message}}
+        yield {"event": "done", "data": chat_response.model_dump(mode="json")}
+
+    def _route(self, request: ChatRequest, stream: bool = False) -> Route:
+        """The model and endpoint to serve the request"""
+        budget = request.latency_budget_ms / 1000 if request.latency_budget_ms else None
+        return self.router.route(request.model or self.default_model, stream, budget)
+
+    def _completion_params(
+        self, request: ChatRequest, messages: List[Dict[str, str]], route: Route
+    ) -> Dict[str, Any]:
+        """
+        Common parameters for chat completion calls; "model" is the catalog
+        model (cache keys, metrics), _create sends the target's model name
+        """
+        return {
+            "model": route.model,
+            "messages": messages,
+            "temperature": request.temperature or 0.7,
+            "max_tokens": request.max_tokens or 1000,
+        }
+
+    def _cache_key(
+        self, request: ChatRequest, params: Dict[str, Any]
+    ) -> Optional[str]:
+        """Return the exact-match cache key, or None when caching is skipped"""
+        if request.use_cache is False:
+            self.response_cache.record_bypass()
+            return None
+        if not self.response_cache.enabled:
+            return None
+        return make_cache_key(
+            params["model"], params["messages"],
+            params["temperature"], params["max_tokens"],
+        )
+
+    def _circuit_breaker(self, route: Route):
+        """The target's circuit breaker (None when disabled); raises CircuitOpen while it is open"""
+        if not self.circuit_breakers:
+            return None
+        return self.circuit_breakers.check(route.target.endpoint.base_url, route.target.model)
+
+    @staticmethod
+    def _create(route: Route, params: Dict[str, Any], **kwargs: Any) -> Awaitable[Any]:
+        """One chat completion call to the route's endpoint"""
+        return route.target.endpoint.client.chat.completions.create(
+            **{**params, "model": route.target.model}, **kwargs
+        )
+
+    def _upstream_slot(self, flow: Any, role: Optional[str]):
+        """Admission-controlled slot for an upstream call, fair-queued per flow (a user)"""
+        return self.admission.slot(flow, role) if self.admission else nullcontext()
+
+    def _flight_key(
+        self, request: ChatRequest, params: Dict[str, Any], cache_key: Optional[str]
+    ) -> Optional[str]:
+        """Single-flight key: the canonical request hash, unless the client
+        asked for a fresh (uncached) response"""
+        if not self.single_flight or request.use_cache is False:
+            return None
+        return cache_key or make_cache_key(
+            params["model"], params["messages"],
+            params["temperature"], params["max_tokens"],
+        )
+
+    def _semantic_partition(self, params: Dict[str, Any]) -> int:
+        """Semantic cache partition: model, sampling parameters, system prompt and prior context"""
+        messages = params["messages"]
+        return self.semantic_cache.partition_key(
+            params["model"], messages[0]["content"], messages[1:-1],
+            params["max_tokens"], params["temperature"],
+        )
+
+    async def _lookup_cache(
+        self, request: ChatRequest, params: Dict[str, Any], cache_key: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Look up a cached completion, exact tier first, then semantic"""
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            metrics.record_cache_lookup("exact", cached is not None)
+            if cached:
+                return {**cached, "cache_tier": "exact"}
+
+        if self.semantic_cache and request.use_cache is not False:
+            match = self.semantic_cache.lookup(
+                request.message, self._semantic_partition(params)
+            )
+            metrics.record_cache_lookup("semantic", match is not None)
+            if match:
+                value, similarity = match
+                return {**value, "cache_tier": "semantic", "similarity": round(similarity, 4)}
+
         return None
 
-    async def get_user_conversations(self, user_id: int) -> List[Dict[str, Any]]:
+    async def _store_cache(
+        self,
+        request: ChatRequest,
+        params: Dict[str, Any],
+        cache_key: Optional[str],
+        ai_message: str,
+        token_usage: Optional[Dict[str, int]],
+    ) -> None:
+        """Store a fresh completion in both cache tiers"""
+        if request.use_cache is False or not ai_message:
+            return
+
+        value = {"message": ai_message, "token_usage": token_usage}
+        if cache_key:
+            await self.response_cache.set(cache_key, value)
+        if self.semantic_cache:
+            self.semantic_cache.add(
+                request.message, self._semantic_partition(params), value
+            )
+
+    @staticmethod
+    def _extract_token_usage(usage: Any) -> Optional[Dict[str, int]]:
+        """Convert provider usage object to a plain dict"""
+        if not usage:
+            return None
+        if isinstance(usage, dict):
+            # Stream usage chunks arrive as untyped extras on older SDKs
+            return {
+                "prompt_tokens": usage.get("prompt_tokens", 0),
+                "completion_tokens": usage.get("completion_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+            }
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+        }
+
+    def _build_chat_response(
+        self,
+        request: ChatRequest,
+        user: UserInfo,
+        conversation_id: str,
+        ai_message: str,
+        token_usage: Optional[Dict[str, int]],
+        cached: Optional[Dict[str, Any]] = None,
+        context_stats: Optional[Dict[str, Any]] = None,
+        route: Optional[Route] = None,
+    ) -> ChatResponse:
+        """Build the ChatResponse returned to the frontend"""
+        metadata = {
+            "user_id": user.user_id,
+            "user_email": user.email,
+            "stateless": self.conversation_store is None,
+            "cache_hit": cached is not None,
+        }
+        if cached:
+            metadata["cache_tier"] = cached["cache_tier"]
+            if "similarity" in cached:
+                metadata["cache_similarity"] = cached["similarity"]
+        if context_stats:
+            metadata.update(context_stats)
+        if route:
+            metadata["routing"] = route.metadata()
+
+        return ChatResponse(
+            message=ai_message,
+            conversation_id=conversation_id,
+            model_used=route.model if route else request.model or self.default_model,
+            token_usage=token_usage,
+            metadata=metadata,
+        )
+
+    def _resolve_context(self, request: ChatRequest, user: UserInfo) -> List[Dict[str, str]]:
         """
-        NOT USED in localStorage version - frontend manages all conversation data
-        This endpoint can be removed or return empty for backwards compatibility
+        Conversation context as plain dicts
+        With context_hashes, bodies sent in `context` are stored first and
+        the hashes are resolved in order; otherwise `context` is used as is
         """
-        logger.info(f"get_user_conversations called but not implemented in localStorage version")
-        return []
+        context = [{"role": msg.role.value, "content": msg.content} for msg in request.context]
+        if request.context_hashes is None:
+            return context
 
-    async def delete_conversation(self, conversation_id: str, user_id: int) -> bool:
+        self.context_store.put_many(user.user_id, context)
+        return self.context_store.resolve(user.user_id, request.context_hashes)
+
+    def _prepare_messages(
+        self,
+        request: ChatRequest,
+        user: UserInfo,
+        context: List[Dict[str, str]],
+        model: str,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        NOT USED in localStorage version - frontend manages all conversation data
-        This endpoint can be removed or return True for backwards compatibility
+        Prepare messages for AI API call
+        The context is packed newest-first into the prompt token budget of
+        `model` (the routed model, which may be a fallback with a smaller
+        window), reserving max_tokens for the completion. Only when older
+        turns would be dropped are they folded into the conversation's
+        running summary, which is pinned after the system prompt
         """
-        logger.info(f"delete_conversation called but not implemented in localStorage version")
-        return True
+        system_message = {"role": "system", "content": request.system_prompt or self.system_prompt}
+        user_message = {"role": "user", "content": request.message}
+        max_tokens = request.max_tokens or 1000
+        budget = get_prompt_budget(model, max_tokens, self.max_prompt_tokens)
+
+        messages, stats = pack_context(
+            self.token_counter, model, system_message, context, user_message,
+            max_tokens=max_tokens, budget=budget,
+        )
+        if not self.summarizer or not stats["context_messages_dropped"]:
+            return messages, stats
+
+        condensed = self.summarizer.condense(
+            user.user_id, request.conversation_id, context, stats["context_messages_dropped"]
+        )
+        if not condensed.summary_message:
+            return messages, stats
+        try:
+            summarized_messages, summarized_stats = pack_context(
+                self.token_counter,
+                model,
+                system_message,
+                condensed.context,
+                user_message,
+                max_tokens=max_tokens,
+                budget=budget,
+                pinned=[condensed.summary_message],
+            )
+        except ContextBudgetExceeded:
+            # No room left for the summary itself
+            return messages, stats
+
+        summary_tokens = self.token_counter.message_tokens(condensed.summary_message, model)
+        summarized_tokens = sum(
+            self.token_counter.message_tokens(m, model)
+            for m in context[:condensed.summarized_messages]
+        )
+        summarized_stats.update({
+            "summary_source": condensed.source,
+            "summarized_messages": condensed.summarized_messages,
+            "summary_tokens_saved": summarized_tokens - summary_tokens,
+        })
+        return summarized_messages, summarized_stats
+
+    def _record_exchange(
+        self,
+        request: ChatRequest,
+        user: UserInfo,
+        chat_response: ChatResponse,
+        requested_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        Remember the user message and AI reply: in the context store, so the
+        client can reference them by hash next turn, and in conversation
+        storage (queued, non-blocking), the user message stamped with when
+        the request started
+        """
+        if not chat_response.message:
+            return
+
+        chat_response.metadata["message_hash"] = self.context_store.put(
+            user.user_id, "user", request.message
+        )
+        chat_response.metadata["reply_hash"] = self.context_store.put(
+            user.user_id, "assistant", chat_response.message.strip()
+        )
+
+        if self.conversation_store:
+            self.conversation_store.enqueue_exchange(
+                user.user_id,
+                chat_response.conversation_id,
+                request.message,
+                chat_response.message,
+                chat_response.model_used,
+                chat_response.token_usage,
+                requested_at,
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Runtime statistics for internal monitoring"""
+        return {
+            "response_cache": self.response_cache.stats(),
+            "token_counter": self.token_counter.stats(),
+            "summarizer": self.summarizer.stats() if self.summarizer else {"enabled": False},
+            "semantic_cache": (
+                self.semantic_cache.stats() if self.semantic_cache else {"enabled": False}
+            ),
+            "admission": self.admission.stats() if self.admission else {"enabled": False},
+            "single_flight": (
+                self.single_flight.stats() if self.single_flight else {"enabled": False}
+            ),
+            "context_store": self.context_store.stats(),
+            "upstream_pool": self.upstream.stats(),
+            "router": self.router.stats(),
+            "upstream_policy": self.upstream_policy.stats(),
+            "circuit_breakers": (
+                self.circuit_breakers.stats() if self.circuit_breakers else {"enabled": False}
+            ),
+            "conversation_store": (
+                self.conversation_store.stats() if self.conversation_store else {"enabled": False}
+            ),
+        }
+
+    async def start(self) -> None:
+        """Connect storage, start its background writer and warm upstream connections"""
+        if self.conversation_store:
+            await self.conversation_store.start()
+        await self.router.start()
+
+    async def close(self) -> None:
+        """Release background work and upstream connections"""
+        if self.summarizer:
+            await self.summarizer.close()
+        if self.conversation_store:
+            await self.conversation_store.close()
+        # Closes the endpoints' upstream pools as well
+        await self.router.close()
+
+    # Conversation storage - each returns the stateless default when
+    # CHAT_DATABASE_URL is not configured
+
+    async def get_conversation_history(
+        self, conversation_id: str, user_id: int, limit: Optional[int] = None
+    ) -> Optional[ConversationHistory]:
+        """Stored conversation with its messages (the latest `limit` when given)"""
+        if not self.conversation_store:
+            return None
+
+        stored = await self.conversation_store.get_conversation(user_id, conversation_id, limit)
+        if stored is None:
+            return None
+
+        conversation, messages = stored
+        # Stored rows were validated on the way in; skip re-validation so
+        # long assistant replies are not rejected by the request limits
+        return ConversationHistory(
+            conversation_id=conversation["id"],
+            messages=[
+                ChatMessage.model_construct(
+                    role=MessageRole(m["role"]),
+                    content=m["content"],
+                    timestamp=m["created_at"],
+                    metadata={"model": m["model"], "token_usage": m["token_usage"]} if m["model"] else None,
+                )
+                for m in messages
+            ],
+            created_at=conversation["created_at"],
+            updated_at=conversation["updated_at"],
+            title=conversation["title"],
+            metadata={"message_count": conversation["message_count"]},
+        )
+
+    async def get_stored_context(self, conversation_id: str, user_id: int) -> List[ChatMessage]:
+        """Recent stored messages to use as context when the client sends none"""
+        history = await self.get_conversation_history(
+            conversation_id, user_id, limit=self.stored_context_messages
+        )
+        return history.messages if history else []
+
+    async def get_user_conversations(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        """User's conversations, most recently updated first"""
+        if not self.conversation_store:
+            return []
+
+        conversations = await self.conversation_store.list_conversations(user_id, limit)
+        return [
+            {
+                "conversation_id": c["id"],
+                "title": c["title"],
+                "message_count": c["message_count"],
+                "created_at": c["created_at"],
+                "updated_at": c["updated_at"],
+                "preview": c["preview"],
+            }
+            for c in conversations
+        ]
+
+    async def delete_conversation(self, conversation_id: str, user_id: int) -> bool:
+        """Delete a stored conversation; False if it does not exist"""
+        if not self.conversation_store:
+            return True
+        return await self.conversation_store.delete_conversation(user_id, conversation_id)
 
+    async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Conversation totals for a user, None when storage is disabled"""
+        if not self.conversation_store:
+            return None
+        return await self.conversation_store.get_user_stats(user_id)
 
-# Global AI service instance
-ai_service = AIService()
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Node-local shared state for CodementorX Chatbot
+Counters, token buckets and a small TTL cache shared by every worker
+process on a node, in one SQLite database on tmpfs (/dev/shm), so running
+several workers needs no external cache server
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    full_at REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at);
+"""
+
+# Each statement is atomic on its own, so every operation is one round trip
+_TAKE_TOKEN = """
+INSERT INTO buckets (key, tokens, updated, full_at, allowed)
+VALUES (:key, :limit - 1, :now, :now + 1 / :rate, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = MIN(:limit, tokens + (:now - updated) * :rate)
+             - (MIN(:limit, tokens + (:now - updated) * :rate) >= 1),
+    allowed = MIN(:limit, tokens + (:now - updated) * :rate) >= 1,
+    full_at = :now + (:limit - MIN(:limit, tokens + (:now - updated) * :rate)
+                      + (MIN(:limit, tokens + (:now - updated) * :rate) >= 1)) / :rate,
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+_INCREMENT = """
+INSERT INTO counters (key, value) VALUES (?, ?)
+ON CONFLICT (key) DO UPDATE SET value = value + excluded.value
+RETURNING value
+"""
+
+
+class SharedState:
+    """
+    SQLite-backed state shared between processes
+
+    Every operation is a single short statement (tens of microseconds on
+    tmpfs), run inline on the event loop; the busy timeout bounds how long
+    a worker can wait on another's write. Idle buckets and expired cache
+    entries are pruned every `prune_every` writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_cache_entries: int = 50000,
+        busy_timeout: float = 0.05,
+        prune_every: int = 1000,
+    ):
+        self.path = path
+        self.max_cache_entries = max_cache_entries
+        self.prune_every = prune_every
+        self._writes = 0
+
+        # Workers start together: allow a longer wait while setting up
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.executescript(_SCHEMA)
+        self._db.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+
+        self.operations = 0
+        self.errors = 0
+
+    # Counters
+
+    def increment(self, key: str, amount: int = 1) -> int:
+        """Add `amount` to a node-wide counter and return its new value"""
+        self.operations += 1
+        value = self._db.execute(_INCREMENT, (key, amount)).fetchone()[0]
+        self._wrote()
+        return value
+
+    def counters(self, prefix: str = "") -> Dict[str, int]:
+        rows = self._db.execute(
+            "SELECT key, value FROM counters WHERE substr(key, 1, length(?)) = ?",
+            (prefix, prefix),
+        )
+        return dict(rows.fetchall())
+
+    # Token buckets
+
+    def take_token(self, key: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Consume one token from the bucket for `key`; returns (allowed, tokens left)"""
+        self.operations += 1
+        tokens, allowed = self._db.execute(
+            _TAKE_TOKEN,
+            {"key": key, "limit": limit, "rate": limit / window, "now": time.time()},
+        ).fetchone()
+        self._wrote()
+        return bool(allowed), tokens
+
+    # Cache
+
+    def cache_get(self, key: str) -> Optional[Any]:
+        self.operations += 1
+        row = self._db.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def cache_set(self, key: str, value: Any, ttl: float) -> None:
+        self.operations += 1
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, default=str), time.time() + ttl),
+        )
+        self._wrote()
+
+    def cache_get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Values for the keys that are present and unexpired"""
+        self.operations += 1
+        rows = self._db.execute(
+            f"SELECT key, value FROM cache WHERE key IN ({','.join('?' * len(keys))})"
+            " AND expires_at > ?",
+            (*keys, time.time()),
+        )
+        return {key: json.loads(value) for key, value in rows.fetchall()}
+
+    def cache_set_many(self, items: Dict[str, Any], ttl: float) -> None:
+        """Store several values in one transaction"""
+        self.operations += 1
+        expires_at = time.time() + ttl
+        with self._db:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value, default=str), expires_at) for key, value in items.items()],
+            )
+        self._wrote()
+
+    def cache_clear(self) -> None:
+        self._db.execute("DELETE FROM cache")
+
+    # Maintenance
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """Drop full (idle) buckets, expired cache entries and the oldest beyond the bound"""
+        now = time.time()
+        try:
+            self._db.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            self._db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_cache_entries,),
+            )
+        except sqlite3.OperationalError as e:
+            # Another worker holds the lock; the next prune catches up
+            self.errors += 1
+            logger.debug(f"Shared state prune skipped: {e}")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        buckets, entries = self._db.execute(
+            "SELECT (SELECT COUNT(*) FROM buckets), (SELECT COUNT(*) FROM cache)"
+        ).fetchone()
+        return {
+            "enabled": True,
+            "path": self.path,
+            "pid": os.getpid(),
+            "operations": self.operations,
+            "errors": self.errors,
+            "buckets": buckets,
+            "cache_entries": entries,
+        }
+
+
+def build_shared_state() -> Optional[SharedState]:
+    """
+    Open the node's shared state from SHARED_STATE_PATH
+    Empty (the default for a single process) keeps all state in-process;
+    gunicorn.conf.py sets it when running several workers
+    """
+    path = config("SHARED_STATE_PATH", default="")
+    if not path:
+        return None
+    state = SharedState(
+        path,
+        max_cache_entries=config("SHARED_STATE_MAX_CACHE_ENTRIES", default=50000, cast=int),
+    )
+    logger.info(f"Shared state: {path}")
+    return state
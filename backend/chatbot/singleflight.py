@@ -0,0 +1,77 @@
+"""
+Single-flight request coalescing for CodementorX Chatbot
+Concurrent calls with the same key share one in-flight upstream call
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Call:
+    """An in-flight call and the number of callers awaiting it"""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving while it is
+    in flight await the same result (or exception). Each caller waits on
+    the shared task through asyncio.shield, so a cancelled caller only
+    stops waiting; the call itself is cancelled once no caller is left.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        on_join: Optional[Callable[[], None]] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Return (result, shared); `shared` is True when another caller started
+        the call. `on_join` is called when joining an in-flight call
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.create_task(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            if on_join:
+                on_join()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                logger.debug(f"All callers left single-flight call {key[:12]}, cancelling")
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.followers
+        return {
+            "enabled": True,
+            "in_flight": len(self._calls),
+            "upstream_calls": self.leaders,
+            "coalesced": self.followers,
+            "coalescing_ratio": round(self.followers / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,83 @@
+"""
+Startup timing for CodementorX Chatbot
+Import time of the service's modules and duration of each lifespan phase,
+reported once the application is ready to serve
+"""
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started (Linux only), None elsewhere"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Records import and startup phase durations for one worker"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports: Dict[str, float] = {}
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self.process_age_at_ready: Optional[float] = None
+
+    def timed_import(self, name: str) -> ModuleType:
+        """
+        Import a module, recording the time it took
+        Import modules in dependency order: a module already imported by an
+        earlier one costs nothing, so each entry is that module's own share
+        """
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports[name] = time.perf_counter() - start
+        return module
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def ready(self) -> None:
+        """Mark the application ready and log the startup report"""
+        self.ready_after = time.perf_counter() - self.started
+        self.process_age_at_ready = process_age()
+
+        imports = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.imports.items())
+        phases = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        logger.info(f"Startup imports: {imports}")
+        logger.info(f"Startup phases: {phases}")
+        process = (
+            f", {self.process_age_at_ready * 1000:.0f}ms since process start"
+            if self.process_age_at_ready is not None else ""
+        )
+        logger.info(f"Ready in {self.ready_after * 1000:.0f}ms after app import{process}")
+
+    def stats(self) -> Dict[str, Any]:
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "imports_ms": {name: ms(seconds) for name, seconds in self.imports.items()},
+            "phases_ms": {name: ms(seconds) for name, seconds in self.phases.items()},
+            "ready_ms": ms(self.ready_after),
+            "process_age_at_ready_ms": ms(self.process_age_at_ready),
+        }
@@ -0,0 +1,578 @@
+"""
+Conversation storage for CodementorX Chatbot
+Server-side conversation/message persistence on Postgres (asyncpg pool) or
+SQLite (aiosqlite, for local development and tests). Writes are queued and
+flushed in batches by a background task, off the response path.
+"""
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from decouple import config
+
+from utils import create_conversation_summary, truncate_text
+
+logger = logging.getLogger(__name__)
+
+# Kept identical to the chat tables in backend/database/init.sql
+POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    user_id INTEGER NOT NULL,
+    id VARCHAR(100) NOT NULL,
+    title VARCHAR(200),
+    preview TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_user_updated
+    ON chat_conversations (user_id, updated_at DESC);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    conversation_id VARCHAR(100) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    model VARCHAR(100),
+    token_usage JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id, conversation_id)
+        REFERENCES chat_conversations (user_id, id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation
+    ON chat_messages (user_id, conversation_id, id);
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    user_id INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    preview TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_user_updated
+    ON chat_conversations (user_id, updated_at DESC);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    model TEXT,
+    token_usage TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation
+    ON chat_messages (user_id, conversation_id, id);
+"""
+
+
+@dataclass
+class StoredMessage:
+    """A message queued for persistence"""
+    role: str
+    content: str
+    created_at: datetime
+    model: Optional[str] = None
+    token_usage: Optional[Dict[str, int]] = None
+
+
+@dataclass
+class ConversationBatch:
+    """Pending messages for one conversation, merged from the write queue"""
+    user_id: int
+    conversation_id: str
+    messages: List[StoredMessage] = field(default_factory=list)
+
+    @property
+    def title(self) -> str:
+        return create_conversation_summary(
+            [{"role": m.role, "content": m.content} for m in self.messages]
+        )
+
+    @property
+    def preview(self) -> str:
+        return truncate_text(" ".join(self.messages[-1].content.split()), 200)
+
+
+class ConversationStore(ABC):
+    """
+    Base conversation store: batching write queue and background writer
+    Subclasses implement the database-specific operations
+    """
+
+    backend = "base"
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.25, max_queue: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._pending: Deque[Tuple[int, str, List[StoredMessage]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._writer: Optional[asyncio.Task] = None
+
+        self.messages_written = 0
+        self.batches_written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    async def start(self) -> None:
+        await self._connect()
+        await self._ensure_schema()
+        self._writer = asyncio.create_task(self._writer_loop())
+        logger.info(f"Conversation store ready ({self.backend})")
+
+    async def close(self) -> None:
+        if self._writer:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+        await self.flush()
+        await self._disconnect()
+
+    def enqueue_exchange(
+        self,
+        user_id: int,
+        conversation_id: str,
+        user_message: str,
+        assistant_message: str,
+        model: str,
+        token_usage: Optional[Dict[str, int]] = None,
+        requested_at: Optional[datetime] = None,
+    ) -> None:
+        """Queue a user/assistant exchange for the background writer (never blocks)"""
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            logger.warning(f"Conversation write queue full, dropped exchange for {conversation_id}")
+            return
+
+        now = datetime.now(timezone.utc)
+        self._pending.append((
+            user_id,
+            conversation_id,
+            [
+                StoredMessage("user", user_message, requested_at or now),
+                StoredMessage("assistant", assistant_message, now, model, token_usage),
+            ],
+        ))
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write everything queued so far (used before reads for read-your-writes)"""
+        while self._pending:
+            await self._write_pending()
+
+    async def _writer_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Give concurrent requests a moment to join the batch
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _write_pending(self) -> None:
+        async with self._write_lock:
+            items = list(islice(self._pending, self.batch_size))
+            if not items:
+                return
+
+            batches: Dict[Tuple[int, str], ConversationBatch] = {}
+            for user_id, conversation_id, messages in items:
+                batch = batches.setdefault(
+                    (user_id, conversation_id), ConversationBatch(user_id, conversation_id)
+                )
+                batch.messages.extend(messages)
+
+            try:
+                await self._write_batch(list(batches.values()))
+                self.batches_written += 1
+                self.messages_written += sum(len(b.messages) for b in batches.values())
+            except Exception as e:
+                # Dropped rather than retried: the live response was already served
+                self.write_errors += 1
+                logger.error(f"Failed to persist {len(items)} conversation exchanges: {e}")
+
+            # Items leave the queue only once written (or failed), so a
+            # cancelled write is retried by the final flush in close()
+            for _ in items:
+                self._pending.popleft()
+
+    async def list_conversations(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self._fetch_conversations(user_id, limit)
+
+    async def get_conversation(
+        self, user_id: int, conversation_id: str, limit: Optional[int] = None
+    ) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Conversation row and its messages (oldest first, at most `limit` latest)"""
+        await self.flush()
+        return await self._fetch_conversation(user_id, conversation_id, limit)
+
+    async def delete_conversation(self, user_id: int, conversation_id: str) -> bool:
+        await self.flush()
+        return await self._delete(user_id, conversation_id)
+
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        await self.flush()
+        return await self._user_stats(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "queued": len(self._pending),
+            "messages_written": self.messages_written,
+            "batches_written": self.batches_written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+        }
+
+    # Database-specific operations
+    @abstractmethod
+    async def _connect(self) -> None:
+        """Open the database connection or pool"""
+
+    @abstractmethod
+    async def _disconnect(self) -> None:
+        """Close the database connection or pool"""
+
+    @abstractmethod
+    async def _ensure_schema(self) -> None:
+        """Create the tables and indexes if missing"""
+
+    @abstractmethod
+    async def _write_batch(self, batches: List[ConversationBatch]) -> None:
+        """Upsert the conversations and insert their messages in one transaction"""
+
+    @abstractmethod
+    async def _fetch_conversations(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """The user's conversation summaries, most recently updated first"""
+
+    @abstractmethod
+    async def _fetch_conversation(self, user_id: int, conversation_id: str, limit: Optional[int]):
+        """(conversation, its latest `limit` messages or all when None), or None when missing"""
+
+    @abstractmethod
+    async def _delete(self, user_id: int, conversation_id: str) -> bool:
+        """Delete a conversation and its messages; False when it does not exist"""
+
+    @abstractmethod
+    async def _user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Conversation and message counts for the user"""
+
+
+class PostgresConversationStore(ConversationStore):
+    """Conversation store on Postgres through an asyncpg connection pool"""
+
+    backend = "postgres"
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pool = None
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        self._pool = await asyncpg.create_pool(
+            self.dsn, min_size=self.min_size, max_size=self.max_size
+        )
+
+    async def _disconnect(self) -> None:
+        if self._pool:
+            await self._pool.close()
+
+    async def _ensure_schema(self) -> None:
+        async with self._pool.acquire() as conn:
+            await conn.execute(POSTGRES_SCHEMA)
+
+    async def _write_batch(self, batches: List[ConversationBatch]) -> None:
+        async with self._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.executemany(
+                    """
+                    INSERT INTO chat_conversations
+                        (user_id, id, title, preview, message_count, created_at, updated_at)
+                    VALUES ($1, $2, $3, $4, $5, $6, $7)
+                    ON CONFLICT (user_id, id) DO UPDATE SET
+                        preview = EXCLUDED.preview,
+                        message_count = chat_conversations.message_count + EXCLUDED.message_count,
+                        updated_at = EXCLUDED.updated_at
+                    """,
+                    [
+                        (
+                            b.user_id, b.conversation_id, b.title, b.preview, len(b.messages),
+                            b.messages[0].created_at, b.messages[-1].created_at,
+                        )
+                        for b in batches
+                    ],
+                )
+                await conn.executemany(
+                    """
+                    INSERT INTO chat_messages
+                        (user_id, conversation_id, role, content, model, token_usage, created_at)
+                    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+                    """,
+                    [
+                        (
+                            b.user_id, b.conversation_id, m.role, m.content, m.model,
+                            json.dumps(m.token_usage) if m.token_usage else None, m.created_at,
+                        )
+                        for b in batches
+                        for m in b.messages
+                    ],
+                )
+
+    async def _fetch_conversations(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, title, preview, message_count, created_at, updated_at
+                FROM chat_conversations
+                WHERE user_id = $1
+                ORDER BY updated_at DESC
+                LIMIT $2
+                """,
+                user_id, limit,
+            )
+        return [dict(row) for row in rows]
+
+    async def _fetch_conversation(self, user_id: int, conversation_id: str, limit: Optional[int]):
+        async with self._pool.acquire() as conn:
+            conversation = await conn.fetchrow(
+                """
+                SELECT id, title, preview, message_count, created_at, updated_at
+                FROM chat_conversations
+                WHERE user_id = $1 AND id = $2
+                """,
+                user_id, conversation_id,
+            )
+            if conversation is None:
+                return None
+            rows = await conn.fetch(
+                """
+                SELECT role, content, model, token_usage, created_at FROM (
+                    SELECT id, role, content, model, token_usage, created_at
+                    FROM chat_messages
+                    WHERE user_id = $1 AND conversation_id = $2
+                    ORDER BY id DESC
+                    LIMIT $3
+                ) latest
+                ORDER BY id
+                """,
+                user_id, conversation_id, limit,
+            )
+        messages = [dict(row) for row in rows]
+        for message in messages:
+            if message["token_usage"]:
+                message["token_usage"] = json.loads(message["token_usage"])
+        return dict(conversation), messages
+
+    async def _delete(self, user_id: int, conversation_id: str) -> bool:
+        async with self._pool.acquire() as conn:
+            result = await conn.execute(
+                "DELETE FROM chat_conversations WHERE user_id = $1 AND id = $2",
+                user_id, conversation_id,
+            )
+        return result.endswith(" 1")
+
+    async def _user_stats(self, user_id: int) -> Dict[str, Any]:
+        async with self._pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT COUNT(*) AS total_conversations,
+                       COALESCE(SUM(message_count), 0) AS total_messages,
+                       MAX(updated_at) AS last_activity
+                FROM chat_conversations
+                WHERE user_id = $1
+                """,
+                user_id,
+            )
+        return dict(row)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation store on SQLite through aiosqlite (development and tests)"""
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._db = None
+
+    async def _connect(self) -> None:
+        import aiosqlite
+
+        self._db = await aiosqlite.connect(self.path)
+        self._db.row_factory = aiosqlite.Row
+        await self._db.execute("PRAGMA journal_mode=WAL")
+
+    async def _disconnect(self) -> None:
+        if self._db:
+            await self._db.close()
+
+    async def _ensure_schema(self) -> None:
+        await self._db.executescript(SQLITE_SCHEMA)
+        await self._db.commit()
+
+    async def _write_batch(self, batches: List[ConversationBatch]) -> None:
+        try:
+            await self._db.executemany(
+                """
+                INSERT INTO chat_conversations
+                    (user_id, id, title, preview, message_count, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, id) DO UPDATE SET
+                    preview = excluded.preview,
+                    message_count = chat_conversations.message_count + excluded.message_count,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (
+                        b.user_id, b.conversation_id, b.title, b.preview, len(b.messages),
+                        b.messages[0].created_at.isoformat(), b.messages[-1].created_at.isoformat(),
+                    )
+                    for b in batches
+                ],
+            )
+            await self._db.executemany(
+                """
+                INSERT INTO chat_messages
+                    (user_id, conversation_id, role, content, model, token_usage, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        b.user_id, b.conversation_id, m.role, m.content, m.model,
+                        json.dumps(m.token_usage) if m.token_usage else None,
+                        m.created_at.isoformat(),
+                    )
+                    for b in batches
+                    for m in b.messages
+                ],
+            )
+            await self._db.commit()
+        except Exception:
+            await self._db.rollback()
+            raise
+
+    @staticmethod
+    def _conversation_row(row) -> Dict[str, Any]:
+        conversation = dict(row)
+        conversation["created_at"] = datetime.fromisoformat(conversation["created_at"])
+        conversation["updated_at"] = datetime.fromisoformat(conversation["updated_at"])
+        return conversation
+
+    async def _fetch_conversations(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        cursor = await self._db.execute(
+            """
+            SELECT id, title, preview, message_count, created_at, updated_at
+            FROM chat_conversations
+            WHERE user_id = ?
+            ORDER BY updated_at DESC
+            LIMIT ?
+            """,
+            (user_id, limit),
+        )
+        return [self._conversation_row(row) for row in await cursor.fetchall()]
+
+    async def _fetch_conversation(self, user_id: int, conversation_id: str, limit: Optional[int]):
+        cursor = await self._db.execute(
+            """
+            SELECT id, title, preview, message_count, created_at, updated_at
+            FROM chat_conversations
+            WHERE user_id = ? AND id = ?
+            """,
+            (user_id, conversation_id),
+        )
+        conversation = await cursor.fetchone()
+        if conversation is None:
+            return None
+        cursor = await self._db.execute(
+            """
+            SELECT role, content, model, token_usage, created_at FROM (
+                SELECT id, role, content, model, token_usage, created_at
+                FROM chat_messages
+                WHERE user_id = ? AND conversation_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+            ) ORDER BY id
+            """,
+            (user_id, conversation_id, limit if limit is not None else -1),
+        )
+        messages = []
+        for row in await cursor.fetchall():
+            message = dict(row)
+            message["created_at"] = datetime.fromisoformat(message["created_at"])
+            if message["token_usage"]:
+                message["token_usage"] = json.loads(message["token_usage"])
+            messages.append(message)
+        return self._conversation_row(conversation), messages
+
+    async def _delete(self, user_id: int, conversation_id: str) -> bool:
+        await self._db.execute(
+            "DELETE FROM chat_messages WHERE user_id = ? AND conversation_id = ?",
+            (user_id, conversation_id),
+        )
+        cursor = await self._db.execute(
+            "DELETE FROM chat_conversations WHERE user_id = ? AND id = ?",
+            (user_id, conversation_id),
+        )
+        await self._db.commit()
+        return cursor.rowcount > 0
+
+    async def _user_stats(self, user_id: int) -> Dict[str, Any]:
+        cursor = await self._db.execute(
+            """
+            SELECT COUNT(*) AS total_conversations,
+                   COALESCE(SUM(message_count), 0) AS total_messages,
+                   MAX(updated_at) AS last_activity
+            FROM chat_conversations
+            WHERE user_id = ?
+            """,
+            (user_id,),
+        )
+        stats = dict(await cursor.fetchone())
+        if stats["last_activity"]:
+            stats["last_activity"] = datetime.fromisoformat(stats["last_activity"])
+        return stats
+
+
+def build_conversation_store() -> Optional[ConversationStore]:
+    """
+    Create the conversation store from CHAT_DATABASE_URL
+    postgresql://... uses Postgres, sqlite:///path uses SQLite, and an
+    empty value keeps the service stateless (frontend localStorage only)
+    """
+    url = config("CHAT_DATABASE_URL", default="")
+    if not url:
+        return None
+
+    options = {
+        "batch_size": config("CHAT_DB_BATCH_SIZE", default=100, cast=int),
+        "flush_interval": config("CHAT_DB_FLUSH_INTERVAL", default=0.25, cast=float),
+    }
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresConversationStore(
+            url,
+            min_size=config("CHAT_DB_POOL_MIN", default=1, cast=int),
+            max_size=config("CHAT_DB_POOL_MAX", default=10, cast=int),
+            **options,
+        )
+    if url.startswith("sqlite://"):
+        return SQLiteConversationStore(url[len("sqlite:///"):] or ":memory:", **options)
+
+    raise ValueError(f"Unsupported CHAT_DATABASE_URL scheme: {url.split(':', 1)[0]}")
@@ -0,0 +1,264 @@
+"""
+Rolling conversation summaries for CodementorX Chatbot
+Folds the older turns that no longer fit the prompt budget into a compact
+running summary, so long chats keep their gist instead of losing it
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from decouple import config
+
+from utils import create_conversation_summary, truncate_text
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a technical conversation between a user "
+    "and CodementorX, a programming assistant. Merge the previous summary with the "
+    "new messages into one concise summary. Keep decisions, code identifiers, "
+    "versions, errors and open questions. Write plain prose, at most 200 words."
+)
+
+# Per-message cap on text sent to the summarization model
+MAX_FOLD_MESSAGE_CHARS = 2000
+
+# Admission flow and role of summary calls: all of them share one flow in
+# the low-weight background class, behind users' requests
+SUMMARY_FLOW = "summaries"
+SUMMARY_ROLE = "background"
+
+# complete(model, messages, max_tokens, temperature) -> completion text
+SummaryCompletion = Callable[[str, List[Dict[str, str]], int, float], Awaitable[str]]
+
+
+def message_digests(messages: List[Dict[str, str]]) -> List[bytes]:
+    """
+    Running hash of the conversation up to and including each message
+    A digest matches only when every earlier message is unchanged, so a
+    summary anchored on it still describes the context that precedes it
+    """
+    digests = []
+    prefix = b""
+    for message in messages:
+        current = hashlib.blake2b(
+            f"{message['role']}\x00{message['content']}".encode("utf-8"), digest_size=12
+        ).digest()
+        prefix = hashlib.blake2b(prefix + current, digest_size=12).digest()
+        digests.append(prefix)
+    return digests
+
+
+@dataclass
+class SummaryEntry:
+    """Summary of a conversation up to and including the anchor message"""
+    anchor: bytes
+    text: str
+
+
+@dataclass
+class CondensedContext:
+    """Result of folding older context into a summary"""
+    summary_message: Optional[Dict[str, str]]
+    context: List[Dict[str, str]]
+    summarized_messages: int = 0
+    source: Optional[str] = None
+
+
+class ConversationSummarizer:
+    """
+    Running summary cache keyed by user and conversation_id (the id comes
+    from the client), and anchored on the hash of the conversation up to
+    the last summarized message. Summaries are produced by the model in background
+    tasks off the request path, through `complete` (the service's upstream
+    path); until one is ready, an extractive summary is used instead.
+    """
+
+    def __init__(
+        self,
+        complete: SummaryCompletion,
+        model: str,
+        fold_batch: int = 4,
+        max_summary_tokens: int = 300,
+        max_conversations: int = 1000,
+        max_concurrency: int = 2,
+    ):
+        self.complete = complete
+        self.model = model
+        self.fold_batch = fold_batch
+        self.max_summary_tokens = max_summary_tokens
+        self.max_conversations = max_conversations
+
+        self._entries: "OrderedDict[Tuple[Hashable, str], List[SummaryEntry]]" = OrderedDict()
+        self._pending: Set[Tuple[Hashable, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        self.cache_hits = 0
+        self.extractive_fallbacks = 0
+        self.summaries_generated = 0
+        self.summary_failures = 0
+
+    def condense(
+        self,
+        user_id: Hashable,
+        conversation_id: Optional[str],
+        context: List[Dict[str, str]],
+        overflow: int,
+    ) -> CondensedContext:
+        """
+        Replace older turns with the cached running summary
+        `overflow` is the number of oldest messages that do not fit the
+        prompt budget; context that fits is returned unchanged. Schedules a
+        background fold when enough unsummarized turns have accumulated;
+        never waits on the model
+        """
+        if not conversation_id or not context or overflow <= 0:
+            return CondensedContext(None, context)
+
+        key = (user_id, conversation_id)
+        digests = message_digests(context)
+        positions = {d: i for i, d in enumerate(digests)}
+
+        # Latest summary whose anchor is still present in the context
+        entry, start = None, 0
+        for candidate in reversed(self._entries.get(key, [])):
+            if candidate.anchor in positions:
+                entry, start = candidate, positions[candidate.anchor] + 1
+                break
+
+        # Messages past the boundary fit the budget and are sent verbatim
+        boundary = min(overflow, len(context))
+        uncovered = context[start:boundary] if boundary > start else []
+
+        if entry:
+            self.cache_hits += 1
+            self._entries.move_to_end(key)
+            if len(uncovered) >= self.fold_batch:
+                self._schedule_fold(key, entry.text, uncovered, digests[boundary - 1])
+            return CondensedContext(
+                self._summary_message(entry.text), context[start:], start, "model"
+            )
+
+        # No model summary yet: fold in the background, answer with an
+        # extractive summary of the older turns now
+        self._schedule_fold(key, None, uncovered, digests[boundary - 1])
+        self.extractive_fallbacks += 1
+        return CondensedContext(
+            self._summary_message(self._extractive_summary(uncovered)),
+            context[boundary:],
+            boundary,
+            "extractive",
+        )
+
+    @staticmethod
+    def _summary_message(text: str) -> Dict[str, str]:
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{text}"}
+
+    @staticmethod
+    def _extractive_summary(messages: List[Dict[str, str]]) -> str:
+        """Non-LLM fallback: topic plus the start of the latest earlier turns, both sides"""
+        topic = create_conversation_summary(messages, max_length=200)
+        lines = [
+            f"- {m['role'].capitalize()}: "
+            f"{truncate_text(' '.join(m['content'].split()), 150 if m['role'] == 'user' else 400)}"
+            for m in messages
+        ]
+        return "\n".join([f"Topic: {topic}", "Earlier messages:", *lines[-8:]])
+
+    def _schedule_fold(
+        self,
+        key: Tuple[Hashable, str],
+        previous: Optional[str],
+        messages: List[Dict[str, str]],
+        anchor: bytes,
+    ) -> None:
+        if key in self._pending or not messages:
+            return
+        self._pending.add(key)
+        # In a fresh context: the call's queue and upstream times are not the request's
+        task = asyncio.create_task(
+            self._fold(key, previous, messages, anchor), context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fold(
+        self,
+        key: Tuple[Hashable, str],
+        previous: Optional[str],
+        messages: List[Dict[str, str]],
+        anchor: bytes,
+    ) -> None:
+        """Merge the previous summary and new turns into a new summary"""
+        transcript = "\n\n".join(
+            f"{m['role'].upper()}: {truncate_text(m['content'], MAX_FOLD_MESSAGE_CHARS)}"
+            for m in messages
+        )
+        prompt = f"Previous summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+
+        try:
+            async with self._semaphore:
+                text = await self.complete(
+                    self.model,
+                    [
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": prompt},
+                    ],
+                    self.max_summary_tokens,
+                    0.2,
+                )
+            text = (text or "").strip()
+            if text:
+                self._store(key, SummaryEntry(anchor, text))
+                self.summaries_generated += 1
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"Conversation summary failed for {key[1]}: {e}")
+        finally:
+            self._pending.discard(key)
+
+    def _store(self, key: Tuple[Hashable, str], entry: SummaryEntry) -> None:
+        # Keep the two latest summaries so a client that is one turn
+        # behind can still reuse one
+        entries = self._entries.setdefault(key, [])
+        entries.append(entry)
+        del entries[:-2]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_conversations:
+            self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        """Cancel in-flight summarization tasks"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "conversations": len(self._entries),
+            "pending": len(self._pending),
+            "cache_hits": self.cache_hits,
+            "extractive_fallbacks": self.extractive_fallbacks,
+            "summaries_generated": self.summaries_generated,
+            "summary_failures": self.summary_failures,
+        }
+
+
+def build_summarizer(
+    complete: SummaryCompletion, default_model: str
+) -> Optional[ConversationSummarizer]:
+    """Create the conversation summarizer from environment configuration"""
+    if not config("SUMMARY_ENABLED", default=True, cast=bool):
+        return None
+
+    return ConversationSummarizer(
+        complete,
+        model=config("SUMMARY_MODEL", default=default_model),
+        max_summary_tokens=config("SUMMARY_MAX_TOKENS", default=300, cast=int),
+    )
@@ -0,0 +1,11 @@
+"""
+Shared test setup: the service modules live in backend/chatbot, and
+configuration is read from the environment when they are imported
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
@@ -0,0 +1,74 @@
+"""Admission and fair queueing: followers are charged, rejected callers leave no state"""
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from fair_queue import FairQueue
+from singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_follower_charge_delays_the_users_next_request():
+    queue = FairQueue()
+    for user in (1, 2):
+        queue.admit(queue.flow(user))
+    # User 1 also had a request served by another user's in-flight call
+    queue.charge(1)
+
+    queue.push(queue.flow(1))
+    queue.push(queue.flow(2))
+    assert queue.pop().key == 2
+    assert queue.pop().key == 1
+
+
+@pytest.mark.asyncio
+async def test_single_flight_followers_charged_through_admission():
+    admission = AdmissionController()
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def call():
+        async with admission.slot(1):
+            await release.wait()
+            return "answer"
+
+    leader = asyncio.create_task(flight.do("key", call, on_join=lambda: admission.charge_coalesced(1)))
+    await asyncio.sleep(0)
+    followers = [
+        asyncio.create_task(flight.do("key", call, on_join=lambda: admission.charge_coalesced(1)))
+        for _ in range(3)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(leader, *followers)
+    assert [shared for _, shared in results] == [False, True, True, True]
+    stats = admission.stats()
+    assert stats["admitted"] == 1
+    assert stats["coalesced"] == 3
+
+
+@pytest.mark.asyncio
+async def test_rejected_and_timed_out_callers_leave_no_flow():
+    admission = AdmissionController(initial_limit=1, max_limit=1, max_queue=1, queue_timeout=0.05)
+    held = await admission.acquire(1)
+    waiting = asyncio.create_task(admission.acquire(2))
+    await asyncio.sleep(0)
+
+    # Queue full: user 3 is rejected
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire(3)
+    # User 2 times out
+    with pytest.raises(AdmissionRejected):
+        await waiting
+    # Per-user queue bound
+    admission.max_queue = 8
+    admission.max_user_queue = 0
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire(4)
+
+    assert admission.stats()["fair_queue"]["active_users"] == 1
+    held.release()
+    assert admission.stats()["fair_queue"]["active_users"] == 0
+    assert admission.stats()["in_flight"] == 0
@@ -0,0 +1,49 @@
+"""The shared context store degrades to misses when the shared state is locked"""
+import sqlite3
+
+import pytest
+
+from context_store import MissingContextMessages, SharedContextStore, message_hash
+from shared_state import SharedState
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = SharedState(str(tmp_path / "state.db"))
+    yield state
+    state.close()
+
+
+def test_messages_resolve_across_stores(state):
+    hashes = SharedContextStore(state).put_many(1, [{"role": "user", "content": "hi"}])
+    assert SharedContextStore(state).resolve(1, hashes) == [{"role": "user", "content": "hi"}]
+
+
+def test_locked_database_skips_writes_and_misses(state, tmp_path):
+    store = SharedContextStore(state)
+    # Another worker holding the write lock past the busy timeout
+    other = sqlite3.connect(str(tmp_path / "state.db"), isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        assert store.put(1, "user", "hi") == message_hash("user", "hi")
+    finally:
+        other.rollback()
+        other.close()
+    assert store.errors == 1
+
+    with pytest.raises(MissingContextMessages) as missing:
+        store.resolve(1, [message_hash("user", "hi")])
+    assert missing.value.missing_hashes == [message_hash("user", "hi")]
+
+
+def test_failed_lookup_is_a_miss(state, monkeypatch):
+    store = SharedContextStore(state)
+    digest = store.put(1, "user", "hi")
+
+    def locked(keys):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(state, "cache_get_many", locked)
+    with pytest.raises(MissingContextMessages):
+        store.resolve(1, [digest])
+    assert store.errors == 1
@@ -0,0 +1,12 @@
+"""Token counting: per-model state stays bounded whatever models are requested"""
+import context_window
+from context_window import TokenCounter
+
+
+def test_encodings_bounded_by_model_names(monkeypatch):
+    monkeypatch.setattr(context_window, "MAX_ENCODING_MODELS", 4)
+    counter = TokenCounter()
+    for i in range(50):
+        assert counter.count("hello world", f"client-model-{i}") > 0
+    # Four requested models plus the shared default
+    assert len(counter._encodings) <= 5
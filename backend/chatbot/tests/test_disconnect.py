@@ -0,0 +1,138 @@
+"""
+Client disconnects cancel upstream work: the service runs under uvicorn
+against the benchmark's slow fake provider (benchmarks/bench_disconnect.py),
+and clients give up on a completion and on a stream part way
+"""
+import asyncio
+import os
+import socket
+import time
+
+import httpx
+import jwt
+import pytest
+import pytest_asyncio
+from prometheus_client import REGISTRY
+
+from benchmarks.bench_disconnect import FakeUpstream
+
+MODEL = "gpt-4o-mini"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def auth_headers(user_id: int) -> dict:
+    token = jwt.encode(
+        {"user_id": user_id, "token_type": "access", "exp": int(time.time()) + 3600},
+        os.environ["JWT_SECRET_KEY"], algorithm="HS256",
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def cancelled(call: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "chatbot_upstream_cancelled_total", {"model": MODEL, "call": call}
+    )
+    return value or 0.0
+
+
+async def eventually(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+@pytest_asyncio.fixture
+async def service(monkeypatch):
+    """(base URL, fake provider, app) with the service serving on a free port"""
+    import uvicorn
+
+    upstream = FakeUpstream(completion_seconds=10.0, chunk_interval=0.02)
+    upstream_server = await asyncio.start_server(upstream.handle, "127.0.0.1", 0)
+    upstream_port = upstream_server.sockets[0].getsockname()[1]
+
+    for name, value in {
+        "OPENAI_API_BASE": f"http://127.0.0.1:{upstream_port}/v1",
+        "CHAT_DATABASE_URL": "",
+        "REVOCATION_SYNC_ENABLED": "False",
+        "RATE_LIMIT_CHAT": "100000/minute",
+        # One upstream call per request: no retries, hedges, cache hits or warm-up
+        "UPSTREAM_MAX_ATTEMPTS": "1",
+        "UPSTREAM_HEDGING_ENABLED": "False",
+        "UPSTREAM_WARM_CONNECTIONS": "0",
+        "RESPONSE_CACHE_ENABLED": "False",
+        "SUMMARY_ENABLED": "False",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    import main
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    server.install_signal_handlers = lambda: None
+    serving = asyncio.create_task(server.serve())
+    assert await eventually(lambda: server.started, timeout=10.0)
+    try:
+        yield f"http://127.0.0.1:{port}", upstream, main.app
+    finally:
+        server.should_exit = True
+        await serving
+        upstream_server.close()
+
+
+def in_flight(app) -> int:
+    return app.state.ai_service.admission.stats()["in_flight"]
+
+
+@pytest.mark.asyncio
+async def test_completion_cancelled_when_client_times_out(service):
+    base_url, upstream, app = service
+    before = cancelled("completion")
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        with pytest.raises(httpx.TimeoutException):
+            await client.post(
+                "/api/chat/message",
+                json={"message": "abandoned question", "use_cache": False},
+                headers=auth_headers(1),
+                timeout=0.5,
+            )
+
+    # Well before the provider's 10s answer
+    assert await eventually(lambda: upstream.calls and upstream.calls[0]["closed"])
+    assert await eventually(lambda: in_flight(app) == 0)
+    assert cancelled("completion") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_stream_cancelled_when_client_closes_it(service):
+    base_url, upstream, app = service
+    before = cancelled("stream")
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=10) as client:
+        deltas = 0
+        async with client.stream(
+            "POST",
+            "/api/chat/message/stream",
+            json={"message": "abandoned stream", "use_cache": False},
+            headers=auth_headers(2),
+        ) as response:
+            assert response.status_code == 200
+            async for line in response.aiter_lines():
+                if line == "event: delta":
+                    deltas += 1
+                    if deltas == 3:
+                        break
+
+    assert await eventually(lambda: upstream.calls and upstream.calls[0]["closed"])
+    # The provider stopped generating long before the end of the stream
+    assert upstream.calls[0]["chunks"] < 100
+    assert await eventually(lambda: in_flight(app) == 0)
+    assert cancelled("stream") == before + 1
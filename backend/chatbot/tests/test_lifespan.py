@@ -0,0 +1,36 @@
+"""Startup releases what it created when a later step fails"""
+import sqlite3
+
+import pytest
+from fastapi import FastAPI
+
+
+@pytest.mark.asyncio
+async def test_startup_failure_releases_created_resources(monkeypatch, tmp_path):
+    monkeypatch.setenv("SHARED_STATE_PATH", str(tmp_path / "state.db"))
+    monkeypatch.setenv("REVOCATION_SYNC_ENABLED", "False")
+    monkeypatch.setenv("UPSTREAM_WARM_CONNECTIONS", "0")
+    import main
+    from services import AIService
+
+    closed = []
+    close = AIService.close
+
+    async def unreachable(self):
+        raise ConnectionError("conversation database unreachable")
+
+    async def tracked_close(self):
+        closed.append(self)
+        await close(self)
+
+    monkeypatch.setattr(AIService, "start", unreachable)
+    monkeypatch.setattr(AIService, "close", tracked_close)
+
+    app = FastAPI()
+    with pytest.raises(ConnectionError):
+        async with main.lifespan(app):
+            pass
+
+    assert closed == [app.state.ai_service]
+    with pytest.raises(sqlite3.ProgrammingError):
+        app.state.shared_state.stats()
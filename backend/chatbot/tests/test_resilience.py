@@ -0,0 +1,53 @@
+"""Upstream policy: the hedge delay tracks completion latency only"""
+import asyncio
+
+import pytest
+
+import metrics
+from resilience import UpstreamPolicy
+
+
+def policy():
+    return UpstreamPolicy(hedging=True, hedge_min_samples=5, latency_window=20)
+
+
+async def call_taking(upstream, seconds, hedge=True, model="gpt-4o-mini"):
+    async def fn():
+        await asyncio.sleep(seconds)
+        return "ok"
+
+    return await upstream.call(fn, model, hedge=hedge)
+
+
+@pytest.mark.asyncio
+async def test_stream_opens_do_not_change_hedge_delay():
+    upstream = policy()
+    for _ in range(10):
+        await call_taking(upstream, 0.05)
+    delay = upstream.hedge_delay("gpt-4o-mini")
+    assert delay is not None and delay >= 0.05
+
+    # Stream opens return at the response headers, much sooner
+    for _ in range(40):
+        await call_taking(upstream, 0, hedge=False)
+    assert upstream.hedge_delay("gpt-4o-mini") == delay
+    assert upstream.hedges == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_completion_is_hedged():
+    upstream = policy()
+    for _ in range(10):
+        await call_taking(upstream, 0.01)
+    assert await call_taking(upstream, 0.3) == "ok"
+    assert upstream.hedges == 1
+
+
+@pytest.mark.asyncio
+async def test_latency_state_bounded_by_model_names():
+    upstream = policy()
+    for i in range(metrics.MAX_MODEL_LABELS + 20):
+        await call_taking(upstream, 0, model=f"client-model-{i}")
+    # Past the label cap, new names share the "other" entry
+    assert len(upstream._latencies) <= metrics.MAX_MODEL_LABELS + 1
+    assert len(upstream._samples) <= metrics.MAX_MODEL_LABELS + 1
@@ -0,0 +1,50 @@
+"""Route error mapping and access checks"""
+import os
+import time
+
+import jwt
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from models import ChatRequest, UserInfo
+from routes import require_internal, sse_response
+from utils import TokenVerifier
+
+USER = UserInfo(user_id=1, email="u@x.com")
+
+
+class StorageDown:
+    async def get_stored_context(self, conversation_id, user_id):
+        raise ConnectionError("conversation database unreachable")
+
+    def stream_response(self, request, user):
+        raise AssertionError("stream started without context")
+
+
+@pytest.mark.asyncio
+async def test_stored_context_failure_maps_to_http_error():
+    request = ChatRequest(message="and then?", conversation_id="c1")
+    with pytest.raises(HTTPException) as error:
+        await sse_response(None, StorageDown(), request, USER, stored_context=True)
+    assert error.value.status_code == 500
+    assert "unreachable" in error.value.detail
+
+
+def test_monitoring_endpoints_need_a_service_or_admin_token():
+    secret = os.environ["JWT_SECRET_KEY"]
+    app = FastAPI()
+    app.state.token_verifier = TokenVerifier(secret)
+    app.get("/internal/stats", dependencies=[Depends(require_internal)])(lambda: {"ok": True})
+    client = TestClient(app)
+
+    def get(claims=None):
+        if claims is None:
+            return client.get("/internal/stats").status_code
+        token = jwt.encode({"exp": int(time.time()) + 60, **claims}, secret, algorithm="HS256")
+        return client.get("/internal/stats", headers={"Authorization": f"Bearer {token}"}).status_code
+
+    assert get() in (401, 403)
+    assert get({"user_id": 1, "token_type": "access"}) == 403
+    assert get({"user_id": 1, "token_type": "access", "role": "admin"}) == 200
+    assert get({"token_type": "service", "service": "monitoring"}) == 200
@@ -0,0 +1,48 @@
+"""The prompt is packed for the model the router picked, not the one requested"""
+from types import SimpleNamespace
+
+import pytest
+
+from context_window import get_prompt_budget
+from models import ChatMessage, ChatRequest, UserInfo
+
+
+@pytest.fixture
+def ai_service(monkeypatch):
+    monkeypatch.setenv("SUMMARY_ENABLED", "False")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    # Budgets are the model windows, as when MAX_PROMPT_TOKENS is raised
+    monkeypatch.setenv("MAX_PROMPT_TOKENS", "0")
+    from services import AIService
+
+    return AIService()
+
+
+@pytest.mark.asyncio
+async def test_fallback_gets_prompt_packed_for_its_window(ai_service):
+    sent = {}
+
+    async def create(route, params, **kwargs):
+        sent.update(params)
+        message = SimpleNamespace(content="answer")
+        usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    ai_service._create = create
+    # gpt-4o-mini (128k) is down: the router falls back to gpt-3.5-turbo (16k)
+    base_url = ai_service.router.default_endpoint.base_url
+    ai_service.circuit_breakers.get(base_url, "gpt-4o-mini")._trip("test")
+
+    context = [
+        ChatMessage(role="user" if i % 2 == 0 else "assistant", content="lorem ipsum " * 800)
+        for i in range(40)
+    ]
+    request = ChatRequest(message="and now?", model="gpt-4o-mini", context=context, use_cache=False)
+    response = await ai_service.generate_response(request, UserInfo(user_id=1, email="u@x.com"))
+
+    assert response.model_used == "gpt-3.5-turbo"
+    counter = ai_service.token_counter
+    prompt_tokens = sum(counter.message_tokens(m, "gpt-3.5-turbo") for m in sent["messages"])
+    assert prompt_tokens <= get_prompt_budget("gpt-3.5-turbo", sent["max_tokens"])
+    # Some context still fits
+    assert len(sent["messages"]) > 2
@@ -0,0 +1,90 @@
+"""Semantic cache: near-miss prompts must not share answers, rewordings do"""
+import pytest
+
+from semantic_cache import SemanticCache, build_semantic_cache
+
+# Same wording, different question: the vectorizer scores these above 0.9
+NEAR_MISSES = [
+    (
+        "I'm upgrading a large project and need to know how to configure database connection "
+        "pooling and persistent connections with CONN_MAX_AGE in Django 4.2, including any "
+        "settings that changed in this version",
+        "I'm upgrading a large project and need to know how to configure database connection "
+        "pooling and persistent connections with CONN_MAX_AGE in Django 2.2, including any "
+        "settings that changed in this version",
+    ),
+    (
+        "In Python, I have a list called items that has 5 elements and I want to split it into "
+        "chunks of equal size and process each chunk in a separate thread, how do I do that",
+        "In Python, I have a list called items that has 20 elements and I want to split it into "
+        "chunks of equal size and process each chunk in a separate thread, how do I do that",
+    ),
+    (
+        "Write a Django REST framework viewset action that handles a POST request to create an "
+        "order for the authenticated user, validates the payload with a serializer and returns "
+        "the object with status 201",
+        "Write a Django REST framework viewset action that handles a DELETE request to destroy an "
+        "order for the authenticated user, validates the payload with a serializer and returns "
+        "the object with status 204",
+    ),
+    ("convert a list to a dict in python", "convert a dict to a list in python"),
+]
+
+PARAPHRASES = [
+    ("How do I reverse a list in Python?", "how can i reverse a list in python"),
+    ("What is a Python decorator", "what is a python decorator?"),
+]
+
+PARTITION = SemanticCache.partition_key("gpt-4o-mini", "system", [])
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_miss_prompts_do_not_hit(cached, asked):
+    cache = SemanticCache(capacity=16)
+    cache.add(cached, PARTITION, {"message": "answer"})
+    assert cache.lookup(asked, PARTITION) is None
+
+
+@pytest.mark.parametrize("cached, asked", PARAPHRASES)
+def test_reworded_prompt_hits(cached, asked):
+    cache = SemanticCache(capacity=16)
+    cache.add(cached, PARTITION, {"message": "answer"})
+    match = cache.lookup(asked, PARTITION)
+    assert match is not None
+    assert match[0] == {"message": "answer"}
+
+
+def test_rewording_found_behind_a_closer_near_miss():
+    near_miss, asked = NEAR_MISSES[0]
+    rewording = f"Hey, so {asked} please"
+    cache = SemanticCache(capacity=16)
+    vector = cache.vectorizer.transform
+    # The near-miss scores higher than the cached rewording
+    assert vector(near_miss) @ vector(asked) > vector(rewording) @ vector(asked)
+
+    cache.add(near_miss, PARTITION, {"message": "django 4.2"})
+    cache.add(rewording, PARTITION, {"message": "django 2.2"})
+    value, similarity = cache.lookup(asked, PARTITION)
+    assert value == {"message": "django 2.2"}
+    assert sum(cache.stats()["similarity_histogram"].values()) == 1
+
+
+def test_lru_bound():
+    cache = SemanticCache(capacity=2)
+    for prompt in ("first question", "second question", "third question"):
+        cache.add(prompt, PARTITION, {"message": prompt})
+    assert cache.lookup("first question", PARTITION) is None
+    assert cache.lookup("third question", PARTITION) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_partition_depends_on_sampling_parameters():
+    base = SemanticCache.partition_key("gpt-4o-mini", "system", [], 1000, 0.7)
+    assert base == SemanticCache.partition_key("gpt-4o-mini", "system", [], 1000, 0.7)
+    assert base != SemanticCache.partition_key("gpt-4o-mini", "system", [], 50, 0.7)
+    assert base != SemanticCache.partition_key("gpt-4o-mini", "system", [], 1000, 0.2)
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("SEMANTIC_CACHE_ENABLED", raising=False)
+    assert build_semantic_cache() is None
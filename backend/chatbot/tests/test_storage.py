@@ -0,0 +1,125 @@
+"""Conversation storage: backend contract, SQLite round trip and schema parity with init.sql"""
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+from models import ChatRequest, UserInfo
+from storage import POSTGRES_SCHEMA, ConversationStore, SQLiteConversationStore
+
+INIT_SQL = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "database", "init.sql"
+)
+
+
+def statements(sql):
+    """DDL statements touching the chat tables, comments and whitespace removed"""
+    sql = re.sub(r"--[^\n]*", "", sql)
+    found = []
+    for statement in sql.split(";"):
+        statement = " ".join(statement.split())
+        if re.search(r"\bchat_(conversations|messages)\b", statement) and not statement.startswith("GRANT"):
+            found.append(statement)
+    return found
+
+
+def test_incomplete_backend_fails_at_construction():
+    class PartialStore(ConversationStore):
+        async def _connect(self):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_backends_implement_the_contract():
+    SQLiteConversationStore(":memory:")
+
+
+def test_postgres_schema_matches_init_sql():
+    with open(INIT_SQL) as f:
+        assert statements(f.read()) == statements(POSTGRES_SCHEMA)
+
+
+@pytest_asyncio.fixture
+async def store():
+    store = SQLiteConversationStore(":memory:", flush_interval=60)
+    await store.start()
+    try:
+        yield store
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_round_trip(store):
+    asked = datetime.now(timezone.utc) - timedelta(seconds=5)
+    usage = {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+    store.enqueue_exchange(1, "conv", "How do I reverse a list?", "Use reversed().", "gpt-4o-mini",
+                           usage, requested_at=asked)
+    store.enqueue_exchange(1, "conv", "And a string?", "Slice it: s[::-1].", "gpt-4o-mini")
+    store.enqueue_exchange(1, "other", "Hello", "Hi!", "gpt-4o-mini")
+    store.enqueue_exchange(2, "conv", "Not yours", "Indeed.", "gpt-4o-mini")
+    assert store.stats()["queued"] == 4
+
+    # Reads flush the queue first
+    conversations = await store.list_conversations(1)
+    assert store.stats()["queued"] == 0
+    assert {c["id"] for c in conversations} == {"conv", "other"}
+    conv = next(c for c in conversations if c["id"] == "conv")
+    assert conv["message_count"] == 4
+    assert conv["preview"] == "Slice it: s[::-1]."
+
+    conversation, messages = await store.get_conversation(1, "conv")
+    assert conversation["id"] == "conv"
+    assert [(m["role"], m["content"]) for m in messages] == [
+        ("user", "How do I reverse a list?"),
+        ("assistant", "Use reversed()."),
+        ("user", "And a string?"),
+        ("assistant", "Slice it: s[::-1]."),
+    ]
+    assert messages[0]["created_at"] == asked
+    assert messages[1]["token_usage"] == usage
+    assert messages[1]["model"] == "gpt-4o-mini"
+    _, latest = await store.get_conversation(1, "conv", limit=2)
+    assert [m["content"] for m in latest] == ["And a string?", "Slice it: s[::-1]."]
+
+    stats = await store.get_user_stats(1)
+    assert stats["total_conversations"] == 2
+    assert stats["total_messages"] == 6
+
+    assert await store.delete_conversation(1, "conv") is True
+    assert await store.get_conversation(1, "conv") is None
+    assert await store.delete_conversation(1, "conv") is False
+    # Another user's conversation with the same id is untouched
+    assert await store.get_conversation(2, "conv") is not None
+    assert (await store.get_user_stats(1))["total_messages"] == 2
+
+
+@pytest.mark.asyncio
+async def test_user_message_stamped_when_the_request_started(monkeypatch, store):
+    monkeypatch.setenv("SUMMARY_ENABLED", "False")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    from services import AIService
+
+    ai_service = AIService()
+    ai_service.conversation_store = store
+
+    async def create(route, params, **kwargs):
+        await asyncio.sleep(0.2)
+        message = SimpleNamespace(content="answer")
+        usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    ai_service._create = create
+    started = datetime.now(timezone.utc)
+    request = ChatRequest(message="question", conversation_id="conv", use_cache=False)
+    await ai_service.generate_response(request, UserInfo(user_id=1, email="u@x.com"))
+
+    _, (question, answer) = await store.get_conversation(1, "conv")
+    assert question["created_at"] - started < timedelta(seconds=0.1)
+    assert answer["created_at"] - question["created_at"] >= timedelta(seconds=0.2)
@@ -0,0 +1,128 @@
+"""Conversation summaries: only for context past the budget, reused for the same user and an unchanged prefix"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from models import ChatMessage, ChatRequest, UserInfo
+from summarizer import SUMMARY_FLOW, SUMMARY_ROLE, ConversationSummarizer
+
+USER = UserInfo(user_id=1, email="u@x.com")
+
+
+async def complete(model, messages, max_tokens, temperature):
+    return "model summary"
+
+
+def conversation(turns, edit=None):
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": f"answer {i}"})
+    if edit is not None:
+        messages[edit] = {"role": "user", "content": "edited question"}
+    return messages
+
+
+async def summarized(summarizer, user_id, conversation_id, context, overflow=8):
+    """Condense once so a model summary is folded in the background"""
+    summarizer.condense(user_id, conversation_id, context, overflow)
+    await asyncio.gather(*summarizer._tasks)
+    return summarizer.condense(user_id, conversation_id, context, overflow)
+
+
+@pytest.fixture
+def summarizer():
+    return ConversationSummarizer(complete, "gpt-4o-mini")
+
+
+def test_context_that_fits_is_not_summarized(summarizer):
+    context = conversation(6)
+    condensed = summarizer.condense(1, "conv", context, 0)
+    assert condensed.summary_message is None
+    assert condensed.context == context
+    assert not summarizer._tasks
+
+
+@pytest.mark.asyncio
+async def test_extractive_summary_keeps_assistant_replies(summarizer):
+    condensed = summarizer.condense(1, "conv", conversation(6), 4)
+    assert condensed.source == "extractive"
+    assert condensed.context == conversation(6)[4:]
+    assert "Assistant: answer 1" in condensed.summary_message["content"]
+    await asyncio.gather(*summarizer._tasks)
+
+
+@pytest.mark.asyncio
+async def test_summary_reused_by_same_user(summarizer):
+    condensed = await summarized(summarizer, 1, "conv", conversation(6))
+    assert condensed.source == "model"
+
+
+@pytest.mark.asyncio
+async def test_summary_not_shared_across_users(summarizer):
+    await summarized(summarizer, 1, "conv", conversation(6))
+    condensed = summarizer.condense(2, "conv", conversation(6), 8)
+    assert condensed.source == "extractive"
+
+
+@pytest.mark.asyncio
+async def test_edited_history_invalidates_summary(summarizer):
+    await summarized(summarizer, 1, "conv", conversation(6))
+    # Same anchor message and neighbour, different earlier turn
+    condensed = summarizer.condense(1, "conv", conversation(6, edit=2), 8)
+    assert condensed.source == "extractive"
+
+
+@pytest.fixture
+def ai_service(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    from services import AIService
+
+    return AIService()
+
+
+def chat_request(turns, words):
+    context = [
+        ChatMessage(role="user" if i % 2 == 0 else "assistant", content=f"turn {i} " + "code " * words)
+        for i in range(turns * 2)
+    ]
+    return ChatRequest(message="and now?", conversation_id="conv", context=context)
+
+
+def test_short_chat_sent_in_full(ai_service):
+    request = chat_request(5, 20)
+    context = [{"role": m.role.value, "content": m.content} for m in request.context]
+    messages, stats = ai_service._prepare_messages(request, USER, context, "gpt-4o-mini")
+    assert messages[1:-1] == context
+    assert "summary_source" not in stats
+    assert not ai_service.summarizer._tasks
+
+
+@pytest.mark.asyncio
+async def test_summary_calls_go_through_admission(ai_service):
+    acquired = []
+    slot = ai_service.admission.slot
+
+    def tracked_slot(flow, role=None, timeout=None):
+        acquired.append((flow, role))
+        return slot(flow, role, timeout)
+
+    async def create(route, params, **kwargs):
+        message = SimpleNamespace(content="model summary")
+        usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1, total_tokens=2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    ai_service.admission.slot = tracked_slot
+    ai_service._create = create
+    # 40 turns of ~400 tokens each overflow the 8000 token default budget
+    request = chat_request(20, 400)
+    context = [{"role": m.role.value, "content": m.content} for m in request.context]
+    messages, stats = ai_service._prepare_messages(request, USER, context, "gpt-4o-mini")
+    assert stats["summary_source"] == "extractive"
+    assert stats["summary_tokens_saved"] > 0
+    await asyncio.gather(*ai_service.summarizer._tasks)
+
+    assert acquired == [(SUMMARY_FLOW, SUMMARY_ROLE)]
+    assert ai_service.summarizer.summaries_generated == 1
+    assert ai_service.admission.stats()["in_flight"] == 0
@@ -0,0 +1,136 @@
+"""
+Per-request phase timing for CodementorX Chatbot
+Durations of the phases of a request (authentication, body parsing and
+validation, context packing, cache lookup, admission queue, upstream call,
+serialization), collected through a context variable and returned in a
+Server-Timing header
+"""
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from decouple import config
+from fastapi.routing import APIRoute
+
+
+class RequestTimings:
+    """Phase durations of one request, summed per phase name"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # End of the last phase, to time the gaps between dependencies and handler
+        self.mark = self.start
+        self.returned_at: Optional[float] = None
+        self.phases: Dict[str, float] = {}
+        # Set when the request is being profiled (profiler.RequestProfiler)
+        self.profile: Any = None
+
+    def record(self, name: str, seconds: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def header(self, now: float) -> str:
+        """Server-Timing value: each phase, then the total until the response started"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.phases.items()]
+        entries.append(f"total;dur={(now - self.start) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record(name: str, seconds: float) -> None:
+    """Add a measured duration to the current request's timings, if any"""
+    timings = _current.get()
+    if timings is not None:
+        timings.record(name, seconds)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time a block as a phase of the current request (a no-op outside one)"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.mark = time.perf_counter()
+        timings.record(name, timings.mark - start)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route recording "parse" (request body read and validation, which FastAPI
+    runs after the dependencies) and "serialize" (response model validation
+    and rendering) around the endpoint
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    # functools.wraps keeps the signature FastAPI reads the parameters from
+    @functools.wraps(endpoint)
+    async def timed(*args: Any, **kwargs: Any) -> Any:
+        timings = _current.get()
+        if timings is not None:
+            timings.record("parse", time.perf_counter() - timings.mark)
+        result = await endpoint(*args, **kwargs)
+        if timings is not None:
+            timings.returned_at = time.perf_counter()
+        return result
+
+    return timed
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that starts the timings of each request and adds the
+    Server-Timing header when the response starts (for streamed responses,
+    phases until the first byte). Finishes the request's profile, if one
+    was started, once the response body is complete.
+    """
+
+    def __init__(self, app, enabled: Optional[bool] = None):
+        self.app = app
+        self.enabled = (
+            config("SERVER_TIMING_ENABLED", default=True, cast=bool) if enabled is None else enabled
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                if timings.returned_at is not None:
+                    timings.record("serialize", now - timings.returned_at)
+                headers = list(message.get("headers", []))
+                if self.enabled:
+                    headers.append((b"server-timing", timings.header(now).encode("latin-1")))
+                if timings.profile is not None:
+                    headers.append((b"x-profile-id", timings.profile.profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if timings.profile is not None:
+                scope["app"].state.profiler.finish(timings.profile)
+
@@ -0,0 +1,223 @@
+"""
+Upstream HTTP transport for CodementorX Chatbot
+One shared, pre-warmed connection pool to the model provider with explicit
+limits and per-phase timeouts, instrumented for pool statistics
+"""
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict
+
+import httpx
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that reports when it has been fully read or closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._on_close()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that counts requests against its connection pool
+    A request "waits" when it arrives with every connection busy and the
+    pool at max_connections; it then queues for up to the pool timeout.
+    """
+
+    def __init__(self, limits: httpx.Limits, http2: bool):
+        self._transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+        self.max_connections = limits.max_connections
+        self.http2 = http2
+
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waits = 0
+        self.pool_timeouts = 0
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+
+    def _connections(self) -> list:
+        pool = getattr(self._transport, "_pool", None)
+        return list(pool.connections) if pool is not None else []
+
+    def _pool_exhausted(self) -> bool:
+        connections = self._connections()
+        if self.max_connections is None or len(connections) < self.max_connections:
+            return False
+        return not any(connection.is_available() for connection in connections)
+
+    def _tracer(self) -> Callable:
+        """httpcore trace hook counting new connections and their setup time"""
+        started = 0.0
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal started
+            if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+                started = time.perf_counter()
+            elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+                self.connect_seconds += time.perf_counter() - started
+                if event_name == "connection.connect_tcp.complete":
+                    self.connections_opened += 1
+
+        return trace
+
+    def _done(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self._pool_exhausted():
+            self.waits += 1
+        request.extensions.setdefault("trace", self._tracer())
+
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as e:
+            self.in_flight -= 1
+            if isinstance(e, httpx.PoolTimeout):
+                self.pool_timeouts += 1
+            raise
+        response.stream = _TrackedStream(response.stream, self._done)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self._connections()
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "http2": self.http2,
+            "max_connections": self.max_connections,
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests": self.requests,
+            "waits": self.waits,
+            "pool_timeouts": self.pool_timeouts,
+            "connections_opened": self.connections_opened,
+            "connect_ms_total": round(self.connect_seconds * 1000, 1),
+        }
+
+
+class UpstreamPool:
+    """Shared httpx client for the model provider"""
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        write_timeout: float = 10.0,
+        pool_timeout: float = 5.0,
+        warm_connections: int = 2,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.warm_connections = warm_connections
+        self.warmed = 0
+
+        self.transport = PooledTransport(
+            httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            http2=http2,
+        )
+        self.client = httpx.AsyncClient(
+            transport=self.transport,
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=read_timeout,
+                write=write_timeout,
+                pool=pool_timeout,
+            ),
+        )
+
+    async def warm(self) -> None:
+        """
+        Open connections before the first request (DNS, TCP and TLS setup)
+        Any response, even 401, leaves a warm connection in the pool; one is
+        enough over HTTP/2, which multiplexes requests
+        """
+        count = 1 if self.transport.http2 else self.warm_connections
+        if count <= 0:
+            return
+
+        async def touch() -> bool:
+            try:
+                response = await self.client.get(f"{self.base_url}/models")
+                await response.aclose()
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"Upstream connection warm-up failed: {e!r}")
+                return False
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(touch() for _ in range(count)))
+        self.warmed = sum(results)
+        logger.info(
+            f"Warmed {self.warmed}/{count} upstream connection(s) "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"warmed": self.warmed, **self.transport.stats()}
+
+
+def build_upstream_pool(base_url: str) -> UpstreamPool:
+    """Create the upstream connection pool from environment configuration"""
+    http2 = config("UPSTREAM_HTTP2", default=True, cast=bool)
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("UPSTREAM_HTTP2 requires the h2 package, using HTTP/1.1")
+            http2 = False
+
+    pool = UpstreamPool(
+        base_url,
+        max_connections=config("UPSTREAM_MAX_CONNECTIONS", default=100, cast=int),
+        max_keepalive_connections=config("UPSTREAM_MAX_KEEPALIVE", default=20, cast=int),
+        keepalive_expiry=config("UPSTREAM_KEEPALIVE_EXPIRY", default=60.0, cast=float),
+        http2=http2,
+        connect_timeout=config("UPSTREAM_CONNECT_TIMEOUT", default=5.0, cast=float),
+        read_timeout=config("UPSTREAM_READ_TIMEOUT", default=60.0, cast=float),
+        write_timeout=config("UPSTREAM_WRITE_TIMEOUT", default=10.0, cast=float),
+        pool_timeout=config("UPSTREAM_POOL_TIMEOUT", default=5.0, cast=float),
+        warm_connections=config("UPSTREAM_WARM_CONNECTIONS", default=2, cast=int),
+    )
+    logger.info(
+        f"Upstream pool: http2={http2}, max_connections={pool.transport.max_connections}"
+    )
+    return pool
@@ -4,67 +4,214 @@ JWT token verification and helper functions
 """
 import os
 import jwt
+import json
+import hashlib
 import logging
 import re
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from models import UserInfo
+from rate_limit import TokenBucketLimiter
+from revocation import RevocationList, build_revocation_list
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# JWT Configuration
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+# JWT Configuration (the secret is read when the token verifier is built)
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 
-if not JWT_SECRET_KEY:
-    raise ValueError("JWT_SECRET_KEY environment variable is required")
+# Identity claim schema versions understood here (users/tokens.py in the
+# Django service); 0 is a token issued before claims were versioned,
+# which carries user_id only
+SUPPORTED_CLAIMS_VERSIONS = {0, 1}
 
+# Backs check_rate_limit
+_local_rate_limiter = TokenBucketLimiter()
 
-def verify_jwt_token(token: str) -> UserInfo:
+
+class VerifiedTokenCache:
     """
-    Verify JWT token and extract user information
-    Compatible with Django REST Framework SimpleJWT tokens
+    Bounded LRU of verified tokens keyed by SHA-256 digest, holding the
+    user info and JTI. Each entry expires exactly at the token's `exp`, so a
+    cached token is never accepted after jwt.decode would have rejected it
     """
-    try:
-        # Decode the JWT token
-        payload = jwt.decode(
-            token,
-            JWT_SECRET_KEY,
-            algorithms=[JWT_ALGORITHM],
-            options={"verify_exp": True}
-        )
-        
-        # Extract user information from payload
-        user_id = payload.get("user_id")
-        if not user_id:
-            raise ValueError("Invalid token: missing user_id")
-        
-        # Create UserInfo object
-        user_info = UserInfo(
-            user_id=int(user_id),
-            email=payload.get("email", ""),
-            username=payload.get("username", ""),
-            full_name=payload.get("full_name", ""),
-            role=payload.get("role", "user"),
-            is_verified=payload.get("is_verified", False)
-        )
-        
-        logger.info(f"JWT token verified for user {user_id}")
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[float, UserInfo, Optional[str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Optional[Tuple[UserInfo, Optional[str]]]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, user_info, jti = entry
+        if expires_at <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return user_info, jti
+
+    def set(self, digest: bytes, expires_at: float, user_info: UserInfo, jti: Optional[str] = None) -> None:
+        self._entries[digest] = (expires_at, user_info, jti)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TokenVerifier:
+    """
+    Verifies bearer tokens issued by the Django service, with the
+    verified-token cache and the synced revocation list
+    """
+
+    def __init__(
+        self,
+        secret_key: str,
+        algorithm: str = "HS256",
+        cache: Optional[VerifiedTokenCache] = None,
+        revocation_list: Optional[RevocationList] = None,
+    ):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.cache = cache or VerifiedTokenCache()
+        self.revocation_list = revocation_list or RevocationList()
+
+    def decode(self, token: str) -> Tuple[UserInfo, Optional[float], Optional[str]]:
+        """
+        Verify JWT signature and expiry, returning user info and the `exp` and
+        `jti` claims
+        Compatible with Django REST Framework SimpleJWT tokens; identity claims
+        are embedded by the Django service (users/tokens.py)
+        """
+        try:
+            # Decode the JWT token
+            payload = jwt.decode(
+                token,
+                self.secret_key,
+                algorithms=[self.algorithm],
+                options={"verify_exp": True}
+            )
+
+            # Refresh tokens carry the same claims but must not authenticate requests
+            if payload.get("token_type", "access") != "access":
+                raise ValueError("Invalid token: not an access token")
+
+            # Extract user information from payload
+            user_id = payload.get("user_id")
+            if not user_id:
+                raise ValueError("Invalid token: missing user_id")
+
+            claims_version = payload.get("claims_version", 0)
+            if claims_version not in SUPPORTED_CLAIMS_VERSIONS:
+                raise ValueError(f"Invalid token: unsupported claims version {claims_version}")
+
+            # Identity comes entirely from the token's claims (no user lookup)
+            user_info = UserInfo(
+                user_id=int(user_id),
+                email=payload.get("email", ""),
+                username=payload.get("username", ""),
+                full_name=payload.get("full_name", ""),
+                role=payload.get("role", "user"),
+                is_verified=payload.get("is_verified", False)
+            )
+
+            logger.debug("JWT token verified for user %s", user_id)
+            return user_info, payload.get("exp"), payload.get("jti")
+
+        except jwt.ExpiredSignatureError:
+            logger.warning("JWT token has expired")
+            raise ValueError("Token has expired")
+
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Invalid JWT token: {e}")
+            raise ValueError(f"Invalid token: {str(e)}")
+
+        except Exception as e:
+            logger.error(f"JWT verification error: {e}")
+            raise ValueError(f"Token verification failed: {str(e)}")
+
+    def verify(self, token: str) -> UserInfo:
+        """
+        Verify JWT token and extract user information
+        Tokens verified before are served from the verified-token cache until
+        their `exp`; tokens without `exp` are never cached. Revocation is checked
+        on every call, cached or not.
+        """
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = self.cache.get(digest)
+        if cached is not None:
+            user_info, jti = cached
+        else:
+            user_info, expires_at, jti = self.decode(token)
+            if expires_at is not None:
+                self.cache.set(digest, float(expires_at), user_info, jti)
+
+        if self.revocation_list.is_revoked(jti):
+            logger.warning(f"Revoked token presented for user {user_info.user_id}")
+            raise ValueError("Token has been revoked")
         return user_info
-        
-    except jwt.ExpiredSignatureError:
-        logger.warning("JWT token has expired")
-        raise ValueError("Token has expired")
-    
-    except jwt.InvalidTokenError as e:
-        logger.warning(f"Invalid JWT token: {e}")
-        raise ValueError(f"Invalid token: {str(e)}")
-    
-    except Exception as e:
-        logger.error(f"JWT verification error: {e}")
-        raise ValueError(f"Token verification failed: {str(e)}")
+
+    def is_service_token(self, token: str) -> bool:
+        """
+        Whether `token` is a service token from another CodementorX service:
+        token_type "service", signed with the shared key and carrying `exp`
+        (the chatbot mints the same for the Django IsInternalService check)
+        """
+        try:
+            payload = jwt.decode(
+                token,
+                self.secret_key,
+                algorithms=[self.algorithm],
+                options={"require": ["exp"]}
+            )
+        except jwt.InvalidTokenError:
+            return False
+        return payload.get("token_type") == "service"
+
+    async def start(self) -> None:
+        await self.revocation_list.start()
+
+    async def close(self) -> None:
+        await self.revocation_list.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "verified_tokens": self.cache.stats(),
+            "revocation": self.revocation_list.stats(),
+        }
+
+
+def build_token_verifier() -> TokenVerifier:
+    """Create the token verifier from environment configuration"""
+    secret_key = os.getenv("JWT_SECRET_KEY")
+    if not secret_key:
+        raise ValueError("JWT_SECRET_KEY environment variable is required")
+
+    return TokenVerifier(
+        secret_key,
+        JWT_ALGORITHM,
+        cache=VerifiedTokenCache(max_entries=int(os.getenv("JWT_CACHE_MAX_ENTRIES", "10000"))),
+        # Tokens revoked in the Django service (e.g. on logout), synced in the background
+        revocation_list=build_revocation_list(secret_key, JWT_ALGORITHM),
+    )
 
 
 def extract_bearer_token(authorization_header: str) -> str:
@@ -194,33 +341,38 @@ def create_error_response(message: str, detail: Optional[str] = None, status_cod
 def log_request(method: str, url: str, user_id: Optional[int] = None, ip: Optional[str] = None):
     """
     Log API request for monitoring
+    Fields are passed as record extras: the message is formatted, and the
+    fields masked, only if the record is written (logging_config.py)
     """
-    log_data = {
-        "method": method,
-        "url": url,
-        "timestamp": format_datetime(datetime.now(timezone.utc))
-    }
-    
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    log_data = {"method": method, "url": url}
     if user_id:
         log_data["user_id"] = user_id
-    
     if ip:
         log_data["ip"] = ip
-    
-    logger.info(f"API Request: {log_data}")
+    logger.info("API Request: %s %s", method, url, extra=log_data)
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    Format a Server-Sent Events frame with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 def check_rate_limit(user_id: int, action: str = "chat", limit: int = 100, window: int = 3600) -> Dict[str, Any]:
     """
-    Simple rate limiting check (would need Redis implementation for production)
+    Token bucket rate limit check in this process (see rate_limit.py for the
+    configured, optionally shared, limiter used by the API routes)
     Returns dict with 'allowed' boolean and 'remaining' count
     """
-    # This is a placeholder - in production, you'd implement this with Redis
-    # For now, always return allowed with dummy remaining count
+    result = _local_rate_limiter.take(f"{action}:{user_id}", limit, window)
     return {
-        "allowed": True,
-        "remaining": limit - 1,
-        "reset_time": datetime.now(timezone.utc).timestamp() + window
+        "allowed": result.allowed,
+        "remaining": result.remaining,
+        "reset_time": datetime.now(timezone.utc).timestamp() + result.reset_after,
+        "retry_after": result.retry_after,
     }
 
 
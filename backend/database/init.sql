@@ -24,4 +24,40 @@ BEGIN
     NEW.updated_at = CURRENT_TIMESTAMP;
     RETURN NEW;
 END;
-$$ language 'plpgsql';
\ No newline at end of file
+$$ language 'plpgsql';
+
+-- Chatbot conversation storage: same DDL as POSTGRES_SCHEMA in
+-- backend/chatbot/storage.py, which also applies it on startup. No
+-- updated_at trigger: the service writes the last message's timestamp
+CREATE TABLE IF NOT EXISTS chat_conversations (
+    user_id INTEGER NOT NULL,
+    id VARCHAR(100) NOT NULL,
+    title VARCHAR(200),
+    preview TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_conversations_user_updated
+    ON chat_conversations (user_id, updated_at DESC);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    conversation_id VARCHAR(100) NOT NULL,
+    role VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    model VARCHAR(100),
+    token_usage JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id, conversation_id)
+        REFERENCES chat_conversations (user_id, id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_conversation
+    ON chat_messages (user_id, conversation_id, id);
+
+GRANT ALL PRIVILEGES ON chat_conversations, chat_messages TO codementorx_user;
+GRANT ALL PRIVILEGES ON SEQUENCE chat_messages_id_seq TO codementorx_user;
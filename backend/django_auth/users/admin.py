@@ -5,7 +5,7 @@ Professional admin interface with search, filters, and actions
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
-from .models import User
+from .models import User, RevokedToken
 
 
 @admin.register(User)
@@ -198,4 +198,14 @@ class UserAdmin(BaseUserAdmin):
             request,
             f'{updated} user(s) successfully demoted to user.'
         )
-    demote_to_user.short_description = 'Demote selected users to regular user'
\ No newline at end of file
+    demote_to_user.short_description = 'Demote selected users to regular user'
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    """
+    Revoked tokens are recorded on logout and pruned once expired
+    """
+    list_display = ('jti', 'revoked_at', 'expires_at')
+    search_fields = ('jti',)
+    readonly_fields = ('jti', 'revoked_at', 'expires_at')
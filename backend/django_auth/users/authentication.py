@@ -0,0 +1,22 @@
+"""
+JWT authentication for CodementorX
+Rejects access tokens revoked before their expiry (see RevokedToken)
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .models import RevokedToken
+
+
+class RevocationAwareJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that also checks the revoked token list"""
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if RevokedToken.objects.filter(jti=token.get('jti')).exists():
+            raise InvalidToken({
+                'detail': _('Token has been revoked'),
+                'messages': [],
+            })
+        return token
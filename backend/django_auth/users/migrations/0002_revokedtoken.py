@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "jti",
+                    models.CharField(
+                        help_text="JWT ID of the revoked token",
+                        max_length=255,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "expires_at",
+                    models.DateTimeField(
+                        db_index=True, help_text="When the revoked token expires"
+                    ),
+                ),
+                (
+                    "revoked_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        db_index=True,
+                        help_text="When the token was revoked",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Revoked Token",
+                "verbose_name_plural": "Revoked Tokens",
+                "db_table": "revoked_tokens",
+                "ordering": ["-revoked_at"],
+            },
+        ),
+    ]
@@ -2,6 +2,8 @@
 Custom User Model with additional fields for JWT Authentication
 Extends AbstractUser for maximum flexibility
 """
+from datetime import datetime, timezone as dt_timezone
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
@@ -123,4 +125,52 @@ class User(AbstractUser):
     def save(self, *args, **kwargs):
         """Override save to ensure email is lowercase"""
         self.email = self.email.lower().strip()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class RevokedToken(models.Model):
+    """
+    JWT revoked before its expiry (e.g. on logout)
+    Rows are only useful until the token would have expired anyway, so
+    expired rows are pruned whenever a token is revoked
+    """
+    jti = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="JWT ID of the revoked token"
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        help_text="When the revoked token expires"
+    )
+    revoked_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        help_text="When the token was revoked"
+    )
+
+    class Meta:
+        db_table = 'revoked_tokens'
+        verbose_name = 'Revoked Token'
+        verbose_name_plural = 'Revoked Tokens'
+        ordering = ['-revoked_at']
+
+    def __str__(self):
+        return self.jti
+
+    @classmethod
+    def revoke(cls, token):
+        """Record a SimpleJWT token as revoked and prune expired rows"""
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        cls.objects.get_or_create(jti=token['jti'], defaults={'expires_at': expires_at})
+        cls.prune()
+
+    @classmethod
+    def prune(cls):
+        """Delete rows whose tokens have expired"""
+        return cls.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+    @classmethod
+    def active(cls):
+        """Revocations of tokens that have not expired yet"""
+        return cls.objects.filter(expires_at__gt=timezone.now())
@@ -2,6 +2,8 @@
 Custom Permissions for Role-Based Access Control
 Implements admin, moderator, and user-level permissions
 """
+import jwt
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -63,4 +65,26 @@ class IsActiveUser(permissions.BasePermission):
             request.user and 
             request.user.is_authenticated and 
             request.user.is_active
-        )
\ No newline at end of file
+        )
+
+
+class IsInternalService(permissions.BasePermission):
+    """
+    Allow other CodementorX services presenting a short-lived service token:
+    a JWT with token_type "service", signed with the shared JWT signing key.
+    Use with authentication_classes = [] since it is not a user token.
+    """
+    def has_permission(self, request, view):
+        scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return False
+        try:
+            payload = jwt.decode(
+                token,
+                settings.SIMPLE_JWT['SIGNING_KEY'],
+                algorithms=[settings.SIMPLE_JWT['ALGORITHM']],
+                options={'require': ['exp']},
+            )
+        except jwt.InvalidTokenError:
+            return False
+        return payload.get('token_type') == 'service'
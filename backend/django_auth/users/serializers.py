@@ -3,10 +3,14 @@ Django REST Framework Serializers for User Authentication
 Handles registration, login, profile management, and password reset
 """
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from .models import User
+from .tokens import IdentityRefreshToken
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -261,4 +265,39 @@ class ResetPasswordSerializer(serializers.Serializer):
         except ValidationError as e:
             raise serializers.ValidationError({"new_password": e.messages})
         
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class IdentityTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Serializer for token refresh
+    Re-reads the user so the new access token carries current identity
+    claims (role, verification status, name) rather than those at login
+    """
+    token_class = IdentityRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None or not user.is_active:
+            raise InvalidToken('User not found or inactive')
+
+        refresh.set_identity_claims(user)
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # Blacklist app not installed
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
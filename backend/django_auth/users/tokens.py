@@ -0,0 +1,42 @@
+"""
+Custom JWT tokens for CodementorX
+Access tokens carry the user's identity claims so other services (the
+FastAPI chatbot) can identify the user without calling back to Django
+"""
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# Version of the identity claim schema embedded in tokens. Bump it when a
+# claim is renamed, removed or changes meaning; consumers reject versions
+# they don't know.
+CLAIMS_VERSION = 1
+
+
+def identity_claims(user):
+    """Identity claims embedded in tokens issued for `user`"""
+    return {
+        'email': user.email,
+        'username': user.username,
+        'full_name': user.get_full_name(),
+        'role': user.role,
+        'is_verified': user.is_verified,
+        'claims_version': CLAIMS_VERSION,
+    }
+
+
+class IdentityRefreshToken(RefreshToken):
+    """
+    Refresh token carrying identity claims
+    SimpleJWT copies refresh token claims into the access tokens it mints,
+    so access tokens get the same claims
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_identity_claims(user)
+        return token
+
+    def set_identity_claims(self, user):
+        """(Re)write identity claims from the current user record"""
+        for claim, value in identity_claims(user).items():
+            self[claim] = value
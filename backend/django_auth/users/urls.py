@@ -12,6 +12,7 @@ urlpatterns = [
     path('login/', views.UserLoginView.as_view(), name='user_login'),
     path('logout/', views.UserLogoutView.as_view(), name='user_logout'),
     path('token/refresh/', views.CustomTokenRefreshView.as_view(), name='token_refresh'),
+    path('revoked-tokens/', views.RevokedTokenListView.as_view(), name='revoked_tokens'),
     
     # User profile endpoints
     path('profile/', views.UserProfileView.as_view(), name='user_profile'),
@@ -6,6 +6,7 @@ from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.contrib.auth.tokens import default_token_generator
@@ -15,18 +16,23 @@ from django.conf import settings
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.template.loader import render_to_string
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiResponse
+from datetime import datetime, timezone as dt_timezone
 import logging
 
-from .models import User
+from .models import User, RevokedToken
+from .permissions import IsInternalService
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
     UserProfileSerializer,
     PasswordChangeSerializer,
     ForgotPasswordSerializer,
-    ResetPasswordSerializer
+    ResetPasswordSerializer,
+    IdentityTokenRefreshSerializer
 )
+from .tokens import IdentityRefreshToken
 
 logger = logging.getLogger(__name__)
 
@@ -64,8 +70,8 @@ class UserRegistrationView(generics.CreateAPIView):
         if serializer.is_valid():
             user = serializer.save()
             
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            # Generate JWT tokens carrying the user's identity claims
+            refresh = IdentityRefreshToken.for_user(user)
             access_token = refresh.access_token
             
             # Update last login IP
@@ -116,8 +122,8 @@ class UserLoginView(APIView):
         if serializer.is_valid():
             user = serializer.validated_data['user']
             
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            # Generate JWT tokens carrying the user's identity claims
+            refresh = IdentityRefreshToken.for_user(user)
             access_token = refresh.access_token
             
             # Update last login info
@@ -148,13 +154,14 @@ class UserLoginView(APIView):
 class UserLogoutView(APIView):
     """
     User Logout API
-    Blacklists the refresh token
+    Blacklists the refresh token and revokes the access token used for the
+    request, so it stops working here and in the chatbot service
     """
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         summary="User Logout",
-        description="Logout user and blacklist refresh token",
+        description="Logout user, blacklist refresh token and revoke access token",
         responses={
             200: OpenApiResponse(description="Logout successful"),
             400: OpenApiResponse(description="Invalid token"),
@@ -165,7 +172,13 @@ class UserLogoutView(APIView):
             refresh_token = request.data.get("refresh_token")
             if refresh_token:
                 token = RefreshToken(refresh_token)
+                user_id = getattr(request.user, api_settings.USER_ID_FIELD)
+                if str(token.get(api_settings.USER_ID_CLAIM)) != str(user_id):
+                    raise ValueError("Refresh token belongs to another user")
                 token.blacklist()
+
+            if request.auth is not None:
+                RevokedToken.revoke(request.auth)
             
             logger.info(f"User logged out: {request.user.email}")
             
@@ -173,11 +186,52 @@ class UserLogoutView(APIView):
                 'message': 'Logout successful'
             }, status=status.HTTP_200_OK)
         except Exception as e:
+            logger.warning(f"Logout failed for {request.user.email}: {e}")
             return Response({
                 'error': 'Invalid token'
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class RevokedTokenListView(APIView):
+    """
+    Revoked Token Sync API
+    Unexpired revoked JTIs for other services' local revocation lists;
+    `since` (unix time) returns only tokens revoked after it
+    """
+    authentication_classes = []
+    permission_classes = [IsInternalService]
+
+    @extend_schema(
+        summary="Revoked Tokens",
+        description="Unexpired revoked token IDs with their expiry (service token required)",
+        responses={
+            200: OpenApiResponse(description="Revoked tokens as [jti, exp] pairs"),
+            400: OpenApiResponse(description="Invalid since parameter"),
+        }
+    )
+    def get(self, request):
+        server_time = timezone.now()
+        revoked = RevokedToken.active()
+
+        since = request.query_params.get('since')
+        if since:
+            try:
+                since = datetime.fromtimestamp(float(since), tz=dt_timezone.utc)
+            except (ValueError, OverflowError, OSError):
+                return Response({
+                    'error': 'Invalid since parameter'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            revoked = revoked.filter(revoked_at__gt=since)
+
+        return Response({
+            'server_time': server_time.timestamp(),
+            'revoked': [
+                [jti, int(expires_at.timestamp())]
+                for jti, expires_at in revoked.order_by().values_list('jti', 'expires_at')
+            ],
+        }, status=status.HTTP_200_OK)
+
+
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
     User Profile API
@@ -382,7 +436,10 @@ class ResetPasswordView(APIView):
 class CustomTokenRefreshView(TokenRefreshView):
     """
     Custom JWT Token Refresh View with logging
+    Issues access tokens with identity claims refreshed from the user record
     """
+    serializer_class = IdentityTokenRefreshSerializer
+
     @extend_schema(
         summary="Refresh JWT Token",
         description="Refresh access token using refresh token",